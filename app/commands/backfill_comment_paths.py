@@ -0,0 +1,58 @@
+# app/commands/backfill_comment_paths.py
+"""
+Fill ``comments.path`` for rows created before materialized paths existed.
+
+The column itself is added by migration v0000; run ``python -m
+app.commands.migrate`` first.
+
+    python -m app.commands.backfill_comment_paths [--batch-size 5000]
+"""
+import argparse
+
+from sqlalchemy import bindparam, select, update
+
+from app.database import engine
+from app.models import post, user  # noqa: F401  注册关联的映射类
+from app.models.comment import Comment, path_segment
+
+
+def compute_paths(rows) -> dict:
+    """Map comment id to path; parents are resolved before their replies"""
+    parents = dict(rows)
+    paths = {}
+
+    def resolve(comment_id):
+        chain = []
+        # 父评论已不存在时按顶层评论处理
+        while comment_id in parents and comment_id not in paths:
+            chain.append(comment_id)
+            comment_id = parents.get(comment_id)
+        prefix = paths.get(comment_id, "")
+        for node in reversed(chain):
+            prefix += path_segment(node)
+            paths[node] = prefix
+
+    for comment_id in parents:
+        resolve(comment_id)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        paths = compute_paths(conn.execute(select(Comment.id, Comment.parent_id)).all())
+
+    comments = Comment.__table__
+    stmt = update(comments).where(comments.c.id == bindparam("comment_id")).values(path=bindparam("new_path"))
+    items = [{"comment_id": comment_id, "new_path": path} for comment_id, path in paths.items()]
+    for start in range(0, len(items), args.batch_size):
+        with engine.begin() as conn:
+            conn.execute(stmt, items[start:start + args.batch_size])
+    print(f"backfilled {len(items)} comment paths")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# app/commands/check_query_budgets.py
+"""
+Assert the query budget of every route against a throwaway database.
+
+Runs the app in-process on an in-memory SQLite database with
+QUERY_BUDGET_MODE=raise, the response cache disabled and the principal cache
+off, so each request takes its most expensive path. The fixture spreads posts
+and comments over many authors and nests replies, so a per-row query would
+blow the budget. Fails (exit status 1) when a route has no ``@query_budget``,
+is not exercised here, answers with an unexpected status, or goes over budget;
+the latter prints the offending statements with their call sites.
+
+    python -m app.commands.check_query_budgets [--verbose]
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["METRICS_ENABLED"] = "true"
+os.environ["SERVER_TIMING_ENABLED"] = "true"
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["PRINCIPAL_CACHE_SIZE"] = "0"
+os.environ["SEARCH_INDEX_PATH"] = ""
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx  # noqa: E402
+from fastapi.routing import APIRoute  # noqa: E402
+
+from app.commands.route_fixture import STREAM_SECONDS, build_fixture, requests, resolve  # noqa: E402
+from app.main import app, lifespan  # noqa: E402
+from app.utils.query_budget import QueryBudgetExceeded, route_budget  # noqa: E402
+
+
+async def run(verbose: bool) -> list[str]:
+    failures = []
+    routes = {(method, route.path): route for route in app.routes if isinstance(route, APIRoute)
+              for method in route.methods}
+    for (method, path), route in routes.items():
+        if getattr(route.endpoint, "query_budget", None) is None:
+            failures.append(f"{method} {path} declares no @query_budget")
+
+    exercised = set()
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        fixture = await build_fixture(client)
+        for method, url, kwargs, expected in requests(fixture):
+            route = resolve(routes, method, url)
+            if route is not None:
+                exercised.add((method, route.path))
+            try:
+                if expected is None:
+                    # 推送流不会自行结束：查询都在响应开始前完成，到时取消即可
+                    response = await asyncio.wait_for(client.request(method, url, **kwargs), STREAM_SECONDS)
+                    failures.append(f"{method} {url} answered {response.status_code} instead of streaming")
+                    continue
+                response = await client.request(method, url, **kwargs)
+            except QueryBudgetExceeded as exc:
+                failures.append(str(exc))
+                continue
+            except asyncio.TimeoutError:
+                if verbose:
+                    print(f"{method:<7} {route.path:<40} (stream) / {route_budget({'route': route})}")
+                continue
+            if response.status_code != expected:
+                failures.append(f"{method} {url} answered {response.status_code}, expected {expected}: "
+                                f"{response.text[:200]}")
+            if verbose:
+                match = re.search(r'desc="(\d+) queries"', response.headers.get("server-timing", ""))
+                print(f"{method:<7} {route.path if route else url:<40} "
+                      f"{match and match.group(1)} / {route_budget({'route': route})}")
+
+    failures.extend(f"{method} {path} is not exercised by this check"
+                    for method, path in sorted(set(routes) - exercised))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print statements used against each budget")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args.verbose))
+    for failure in failures:
+        print(f"FAIL {failure}\n", file=sys.stderr)
+    print(f"{len(failures)} failures" if failures else "all routes within their query budgets")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# app/commands/check_query_plans.py
+"""
+Fail on full table scans and filesorts in the SQL every route runs.
+
+Runs the app in-process on a throwaway SQLite file, the local stand-in
+database, seeds it past ``--min-rows`` rows in the main tables and sends the
+same requests as check_query_budgets, with the response and principal caches
+off. Each statement a request executes is recorded with its parameters and
+replayed under EXPLAIN QUERY PLAN. A plan step that scans a table of at least
+``--min-rows`` rows without an index, or sorts rows of such a table through a
+temporary B-tree (SQLite's filesort), fails the check and prints the
+statement and its plan. Routes that read whole tables by design are listed in
+ALLOWED_SCANS.
+
+    python -m app.commands.check_query_plans [--min-rows 1000] [--verbose]
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from collections import defaultdict
+from contextvars import ContextVar
+
+DIRECTORY = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DIRECTORY}/plans.db"
+os.environ["QUERY_BUDGET_MODE"] = "off"
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["PRINCIPAL_CACHE_SIZE"] = "0"
+os.environ["SEARCH_INDEX_PATH"] = ""
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx  # noqa: E402
+from fastapi.routing import APIRoute  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+
+from app.commands.route_fixture import STREAM_SECONDS, build_fixture, requests, resolve  # noqa: E402
+from app.database import Base, async_engine, engine  # noqa: E402
+from app.main import app, lifespan  # noqa: E402
+from benchmarks.seed import seed  # noqa: E402
+
+# 整表读取本就是这些接口的目的
+ALLOWED_SCANS = {
+    ("GET", "/admin/export"): {"users", "posts", "comments"},
+}
+# 计划中的全表扫描：SCAN 表名 [AS 别名]，不带 USING INDEX
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+# 按主键或唯一键取少量行后的排序不算 filesort
+KEY_LOOKUP = re.compile(r"^SEARCH (\w+)(?: AS \w+)? USING (INTEGER PRIMARY KEY|(COVERING )?INDEX sqlite_autoindex)")
+PLAN_STEP = re.compile(r"^(SCAN|SEARCH) (\w+)")
+
+current_route = ContextVar("current_route", default=None)
+
+
+def table_sizes(conn) -> dict[str, int]:
+    return {table.name: conn.scalar(select(func.count()).select_from(table)) for table in Base.metadata.sorted_tables}
+
+
+def plan_problems(conn, statement: str, parameters, sizes: dict, min_rows: int, allowed: set) -> tuple[list, list]:
+    """(problems, plan lines) for one recorded statement"""
+    cursor = conn.connection.dbapi_connection.cursor()
+    plan = [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    problems = []
+    large = {step[2] for step in map(PLAN_STEP.match, plan) if step and sizes.get(step[2], 0) >= min_rows
+             and not KEY_LOOKUP.match(step.string)}
+    for detail in plan:
+        scan = FULL_SCAN.match(detail)
+        if scan and sizes.get(scan[1], 0) >= min_rows and scan[1] not in allowed:
+            problems.append(f"full scan of {scan[1]} ({sizes[scan[1]]} rows)")
+        if detail.startswith("USE TEMP B-TREE") and large - allowed:
+            problems.append(f"{detail.lower()} over {', '.join(sorted(large - allowed))}")
+    return problems, plan
+
+
+async def run(min_rows: int, verbose: bool) -> list[str]:
+    failures = []
+    recorded = defaultdict(list)
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        route = current_route.get()
+        verb = statement.lstrip()[:6].upper()
+        # INSERT ... VALUES 不读表（多行 VALUES 的参数也无法按单行重放）
+        if route is not None and (verb in ("SELECT", "UPDATE", "DELETE")
+                                  or verb == "INSERT" and " SELECT " in statement.upper()):
+            recorded[route].append((statement, parameters[0] if executemany else parameters))
+
+    routes = {(method, route.path): route for route in app.routes if isinstance(route, APIRoute)
+              for method in route.methods}
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        # 每帖的评论数取够，使评论表远超阈值
+        await seed(users=max(min_rows // 5, 20), posts=min_rows * 2, comments_per_post=5)
+        fixture = await build_fixture(client)
+        for method, url, kwargs, expected in requests(fixture):
+            route = resolve(routes, method, url)
+            key = (method, route.path if route else url)
+            token = current_route.set(key)
+            try:
+                if expected is None:
+                    await asyncio.wait_for(client.request(method, url, **kwargs), STREAM_SECONDS)
+                    continue
+                response = await client.request(method, url, **kwargs)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                current_route.reset(token)
+            if response.status_code != expected:
+                failures.append(f"{method} {url} answered {response.status_code}, expected {expected}: "
+                                f"{response.text[:200]}")
+
+    with engine.connect() as conn:
+        sizes = table_sizes(conn)
+        if verbose:
+            print("rows: " + ", ".join(f"{name} {count}" for name, count in sizes.items()))
+        for (method, path), statements in recorded.items():
+            checked = set()
+            for statement, parameters in statements:
+                if statement in checked:
+                    continue
+                checked.add(statement)
+                problems, plan = plan_problems(conn, statement, parameters, sizes, min_rows,
+                                               ALLOWED_SCANS.get((method, path), set()))
+                if problems:
+                    failures.append(f"{method} {path}: {'; '.join(problems)}\n  {' '.join(statement.split())[:400]}\n"
+                                    + "\n".join(f"    {line}" for line in plan))
+            if verbose:
+                print(f"{method:<7} {path:<40} {len(checked)} statements")
+    engine.dispose()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-rows", type=int, default=1000, help="tables smaller than this may be scanned")
+    parser.add_argument("--verbose", action="store_true", help="print table sizes and statements per route")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args.min_rows, args.verbose))
+    for failure in failures:
+        print(f"FAIL {failure}\n", file=sys.stderr)
+    print(f"{len(failures)} failures" if failures else "no full scans or filesorts over large tables")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
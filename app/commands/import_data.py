@@ -0,0 +1,93 @@
+# app/commands/import_data.py
+"""
+Bulk load users, posts and comments from NDJSON or CSV into this schema.
+
+Rows are written with Core ``insert()`` executemany, one transaction per
+batch, skipping the API's per-row bcrypt, commit and refresh. Every row gets a
+new id; the source ids are remapped through ``import_id_map``, which is written
+in the same transaction as the rows. A rerun after an interruption therefore
+skips what was committed and carries on, and ``--source`` keeps the ids of
+different legacy boards apart.
+
+* NDJSON lines carry ``type`` (user/post/comment), as written by export_data.
+* A CSV file holds one kind, named by the file (users.csv) or ``kind=path``.
+* Users need ``password_hash`` (bcrypt, kept as is); a plain ``password``
+  column is hashed row by row and is slow. A user whose email already exists
+  is mapped onto that account.
+* Comment paths, post comment counters, last activity and the authors'
+  user_stats are computed as the services would. Replies may come before
+  their parents.
+
+    python -m app.commands.import_data users.csv posts.csv comments.csv [--source legacy]
+    python -m app.commands.import_data forum.ndjson.gz
+
+Afterwards rebuild the search index (rebuild_search_index) before the app
+starts; hot scores are refreshed here.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.database import async_engine, create_schema
+from app.models import post, user  # noqa: F401  注册关联的映射类
+from app.services.import_service import IMPORT_BATCH_SIZE, IMPORT_KINDS, BulkImporter, read_records
+from app.services.post_activity import hot_score_updater
+
+PROGRESS_INTERVAL = 5
+
+
+def split_spec(spec: str) -> tuple[str | None, str]:
+    kind, separator, path = spec.partition("=")
+    return (kind, path) if separator and kind in IMPORT_KINDS else (None, spec)
+
+
+def progress_printer():
+    last = time.perf_counter()
+
+    def report(importer: BulkImporter):
+        nonlocal last
+        if time.perf_counter() - last >= PROGRESS_INTERVAL:
+            last = time.perf_counter()
+            print(f"  {dict(importer.imported)} ({importer.rate():,.0f} rows/s)", file=sys.stderr)
+    return report
+
+
+async def run(args) -> BulkImporter:
+    importer = BulkImporter(args.source, args.batch_size, progress_printer())
+    try:
+        await create_schema()
+        await importer.prepare()
+        for spec in args.files:
+            kind, path = split_spec(spec)
+            print(f"reading {path}", file=sys.stderr)
+            for record_kind, record in read_records(path, kind):
+                await importer.add(record_kind, record)
+        await importer.finish()
+        if importer.imported["posts"] or importer.imported["comments"]:
+            await hot_score_updater.refresh()
+    finally:
+        await async_engine.dispose()
+    return importer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", metavar="[KIND=]PATH")
+    parser.add_argument("--source", default="legacy", help="name of the data source the ids belong to")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+
+    importer = asyncio.run(run(args))
+    elapsed = time.perf_counter() - importer.started
+    for kind in IMPORT_KINDS:
+        print(f"{kind}: {importer.imported[kind]} imported, {importer.merged[kind]} merged by email, "
+              f"{importer.skipped[kind]} already imported")
+    for reason, count in importer.rejected.most_common():
+        print(f"rejected {count}: {reason}")
+    print(f"{sum(importer.imported.values())} rows in {elapsed:.1f}s ({importer.rate():,.0f} rows/s)")
+    sys.exit(1 if importer.rejected else 0)
+
+
+if __name__ == "__main__":
+    main()
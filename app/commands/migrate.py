@@ -0,0 +1,36 @@
+# app/commands/migrate.py
+"""
+Apply the versioned schema migrations in app/migrations.
+
+Run it before deploying code that depends on a migration; versions already
+recorded in ``schema_migrations`` are skipped, so it is safe to rerun.
+
+    python -m app.commands.migrate [--list] [--to VERSION]
+"""
+import argparse
+
+from app.database import engine
+from app.migrations import applied_versions, migrations, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--list", action="store_true", help="show every migration and whether it is applied")
+    parser.add_argument("--to", type=int, help="stop after this version")
+    args = parser.parse_args()
+
+    if args.list:
+        done = applied_versions(engine)
+        for version, name, module in migrations():
+            summary = (module.__doc__ or "").strip().splitlines()[0]
+            print(f"{'x' if version in done else ' '} v{version:04d}_{name}: {summary}")
+        return
+
+    applied = upgrade(engine, args.to)
+    for name in applied:
+        print(f"applied {name}")
+    print(f"{len(applied)} migrations applied" if applied else "schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# app/commands/rebuild_search_index.py
+"""
+Rebuild the search index snapshot from the posts and comments tables.
+
+Rows are streamed in batches, so memory stays bounded by the index itself.
+Run it while the app is stopped (or point --path at a new file and swap it
+in); the app loads the snapshot on its next start.
+
+    python -m app.commands.rebuild_search_index [--path search_index.pkl]
+"""
+import argparse
+import asyncio
+import time
+
+from app.database import async_engine
+from app.models import post, user  # noqa: F401  注册关联的映射类
+from app.services.search_index import SEARCH_INDEX_PATH, search_index
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=SEARCH_INDEX_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    await search_index.rebuild()
+    await search_index.save(args.path)
+    await async_engine.dispose()
+    stats = search_index.stats()
+    print(f"Indexed {stats['documents']} documents ({stats['terms']} terms) "
+          f"in {time.perf_counter() - started:.1f}s -> {args.path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
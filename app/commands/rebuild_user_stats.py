@@ -0,0 +1,76 @@
+# app/commands/rebuild_user_stats.py
+"""
+Recompute ``user_stats`` from the posts and comments tables in bulk.
+
+The app keeps the table current incrementally; this fills it for existing
+data after migration v0000 has added the table, and repairs any drift. One
+grouped query per table counts each user's posts, the views of those posts
+and their comments (including rows still queued for deletion: the deletion
+purger subtracts them as it removes them), and only the users whose row
+differs are rewritten.
+Writes that land while the grouped queries run can be overwritten, so run it
+when the forum is quiet or run it twice.
+
+    python -m app.commands.rebuild_user_stats [--batch-size 5000]
+"""
+import argparse
+
+from sqlalchemy import delete, func, insert, select
+
+from app.database import engine
+from app.models import post, user  # noqa: F401  注册关联的映射类
+from app.models.comment import Comment
+from app.models.post import Post
+from app.models.user_stats import UserStats
+from app.services.user_stats import STAT_COLUMNS
+
+
+def compute_stats(conn) -> dict[int, tuple]:
+    """(post_count, comment_count, view_count) per user, from one grouped query per table"""
+    stats = {}
+    rows = conn.execute(
+        select(Post.user_id, func.count(), func.sum(func.coalesce(Post.view_count, 0))).group_by(Post.user_id)
+    )
+    for user_id, posts, views in rows:
+        stats[user_id] = (posts, 0, int(views or 0))
+    rows = conn.execute(select(Comment.user_id, func.count()).group_by(Comment.user_id))
+    for user_id, comments in rows:
+        posts, _, views = stats.get(user_id, (0, 0, 0))
+        stats[user_id] = (posts, comments, views)
+    return stats
+
+
+def find_drift(conn) -> list[dict]:
+    """Rows to write so that user_stats matches the source tables; stored users with no activity left get zeros"""
+    actual = compute_stats(conn)
+    stored = {row[0]: tuple(row[1:]) for row in conn.execute(
+        select(UserStats.user_id, *(UserStats.__table__.c[name] for name in STAT_COLUMNS))
+    )}
+    drift = []
+    for user_id in sorted(actual.keys() | stored.keys()):
+        counts = actual.get(user_id, (0, 0, 0))
+        if stored.get(user_id) != counts:
+            drift.append({"user_id": user_id, **dict(zip(STAT_COLUMNS, counts))})
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        drift = find_drift(conn)
+
+    table = UserStats.__table__
+    for start in range(0, len(drift), args.batch_size):
+        batch = drift[start:start + args.batch_size]
+        # 先删后插，不依赖各数据库的 upsert 语法
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.user_id.in_([row["user_id"] for row in batch])))
+            conn.execute(insert(table), batch)
+    print(f"rebuilt stats of {len(drift)} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# app/commands/repair_post_activity.py
+"""
+Reconcile the denormalized activity columns on ``posts`` with the source tables.
+
+Recounts comments per post (leaving out those queued for deletion), resets
+``last_activity_at`` to the latest comment (or the post itself), rewrites the
+rows that drifted, and finally recomputes hot scores. The columns are added
+by migration v0000: run ``python -m app.commands.migrate`` first, then this
+command to fill them in.
+
+    python -m app.commands.repair_post_activity [--batch-size 5000]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.database import engine, async_engine
+from app.models import post, user  # noqa: F401  注册关联的映射类
+from app.models.comment import Comment
+from app.models.post import Post
+from app.services.deletion_purger import comment_visible
+from app.services.post_activity import hot_score_updater
+
+def find_drift(conn) -> list[dict]:
+    """Posts whose stored counters differ from what the comments table says"""
+    stats = select(
+        Comment.post_id,
+        func.count().label("actual_count"),
+        func.max(Comment.created_at).label("last_comment_at"),
+    ).filter(comment_visible()).group_by(Comment.post_id).subquery()
+    rows = conn.execute(
+        select(Post.id, Post.comment_count, Post.last_activity_at, Post.created_at,
+               stats.c.actual_count, stats.c.last_comment_at)
+        .outerjoin(stats, stats.c.post_id == Post.id)
+    )
+
+    drift = []
+    for row in rows:
+        count = row.actual_count or 0
+        last_activity_at = max(filter(None, (row.last_comment_at, row.created_at)), default=None)
+        if row.comment_count != count or row.last_activity_at != last_activity_at:
+            drift.append({"post_id": row.id, "count": count, "last_activity_at": last_activity_at})
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        drift = find_drift(conn)
+
+    posts = Post.__table__
+    stmt = update(posts).where(posts.c.id == bindparam("post_id")).values(
+        comment_count=bindparam("count"),
+        last_activity_at=bindparam("last_activity_at"),
+        # 帖子详情中含评论数，同评论写入一样递增 comments_version，使其 ETag 与缓存键失效
+        comments_version=posts.c.comments_version + 1,
+        updated_at=posts.c.updated_at,
+    )
+    for start in range(0, len(drift), args.batch_size):
+        with engine.begin() as conn:
+            conn.execute(stmt, drift[start:start + args.batch_size])
+    print(f"repaired {len(drift)} posts")
+
+    async def rescore():
+        try:
+            return await hot_score_updater.refresh()
+        finally:
+            await async_engine.dispose()
+
+    print(f"rescored {asyncio.run(rescore())} posts")
+
+
+if __name__ == "__main__":
+    main()
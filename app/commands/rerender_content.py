@@ -0,0 +1,81 @@
+# app/commands/rerender_content.py
+"""
+Re-render post and comment bodies stored by an older renderer version.
+
+Run it after bumping RENDERER_VERSION in app/utils/markdown.py, or after
+migration v0003 to fill in rows written before rendered HTML was stored.
+Until then, reads serve those rows as escaped source and the app re-renders
+the ones that are read in the background. Stale rows are read in primary-key
+batches and rendered in a pool of worker processes. The main process writes
+the results back, one transaction per batch, and bumps the post versions so
+ETags and cache keys change. A row edited in the meantime already carries
+the current version and is left alone, so the command is safe to run on a
+live forum and to rerun.
+
+    python -m app.commands.rerender_content [--workers N] [--batch-size 1000]
+"""
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select
+
+from app.database import engine
+from app.models.comment import Comment
+from app.services.stale_content import (
+    TABLES, comments_version_update, render_params, rerendered_update, stale_columns,
+)
+from app.utils.markdown import RENDERER_VERSION
+
+
+def stale_batches(table, batch_size: int):
+    last_id = 0
+    while True:
+        # 每批单独取连接：两批之间主进程要写入，SQLite 上不能一直持有读事务
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(*stale_columns(table))
+                .where(table.c.id > last_id, table.c.render_version != RENDERER_VERSION)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [tuple(row) for row in rows]
+
+
+def write_batch(table, batch: list[tuple], params: list[dict]) -> int:
+    # 渲染期间被编辑的行已是当前版本，不再覆盖
+    with engine.begin() as conn:
+        written = conn.execute(rerendered_update(table), params).rowcount
+        if table is Comment.__table__:
+            conn.execute(comments_version_update({row[2] for row in batch}))
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="rendering processes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for name, table in TABLES.items():
+            rendered = 0
+            pending = deque()
+            for batch in stale_batches(table, args.batch_size):
+                pending.append((batch, pool.submit(render_params, batch)))
+                # 每个进程最多排队两批，读取不会远远领先于写入
+                if len(pending) >= args.workers * 2:
+                    batch, future = pending.popleft()
+                    rendered += write_batch(table, batch, future.result())
+            while pending:
+                batch, future = pending.popleft()
+                rendered += write_batch(table, batch, future.result())
+            print(f"re-rendered {rendered} {name} to renderer version {RENDERER_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# app/commands/route_fixture.py
+"""
+Fixture and request list shared by check_query_budgets and check_query_plans.
+
+Import it after the command has set its environment: it pulls in the app.
+"""
+import httpx
+from fastapi.routing import APIRoute
+from sqlalchemy import update
+from starlette.routing import Match
+
+from app.database import AsyncSessionFactory
+from app.models.user import User
+from app.utils.security import invalidate_principal
+
+AUTHORS = 12
+COMMENTS = 60
+PASSWORD = "password123"
+STREAM_SECONDS = 0.5
+
+
+async def build_fixture(client: httpx.AsyncClient) -> dict:
+    """Users (the first an admin), one post each, and a nested comment thread on the first post"""
+    tokens, users = [], []
+    for i in range(AUTHORS):
+        response = await client.post("/register", json={"username": f"author{i}", "email": f"author{i}@example.com",
+                                                        "password": PASSWORD})
+        response.raise_for_status()
+        users.append(response.json()["id"])
+        response = await client.post("/login", data={"username": f"author{i}", "password": PASSWORD})
+        tokens.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+    # 没有提升管理员的接口，直接改库；绕过了 ORM，需自行使已缓存的鉴权失效
+    async with AsyncSessionFactory() as db:
+        await db.execute(update(User).where(User.id == users[0]).values(is_admin=True))
+        await db.commit()
+    await invalidate_principal(users[0])
+
+    posts = []
+    for i, headers in enumerate(tokens):
+        response = await client.post("/posts/", json={"title": f"post {i}", "content": "全文 search text"},
+                                     headers=headers)
+        posts.append(response.json()["id"])
+
+    comments = []
+    for i in range(COMMENTS):
+        # 每隔几条另起一个顶层评论，其余回复上一条，形成多层嵌套
+        parent_id = comments[-1] if comments and i % 4 else None
+        response = await client.post(f"/posts/{posts[0]}/comments",
+                                     json={"content": f"comment {i}", "parent_id": parent_id},
+                                     headers=tokens[i % AUTHORS])
+        comments.append(response.json()["id"])
+    return {"tokens": tokens, "users": users, "posts": posts, "comments": comments}
+
+
+def requests(fixture: dict) -> list[tuple]:
+    """(method, path, request kwargs, expected status) covering every route; None for event streams"""
+    owner = fixture["tokens"][0]
+    post_id, other_post = fixture["posts"][0], fixture["posts"][1]
+    comment_id, leaf = fixture["comments"][0], fixture["comments"][-1]
+    batch_ids = ",".join(str(i) for i in fixture["posts"])
+    return [
+        ("GET", "/", {}, 200),
+        ("GET", "/cache/stats", {}, 200),
+        ("GET", "/metrics", {}, 200),
+        ("POST", "/register", {"json": {"username": "newcomer", "email": "newcomer@example.com",
+                                        "password": PASSWORD}}, 201),
+        ("POST", "/login", {"data": {"username": "author1", "password": PASSWORD}}, 200),
+        ("GET", "/posts/", {"params": {"limit": 100}}, 200),
+        ("GET", "/posts/", {"params": {"limit": 100, "sort": "hot", "pinned_first": True}}, 200),
+        ("GET", "/posts/", {"params": {"limit": 100, "sort": "active", "pinned_first": True}}, 200),
+        ("GET", "/posts/batch", {"params": {"ids": batch_ids}}, 200),
+        ("GET", f"/posts/{post_id}", {}, 200),
+        ("POST", "/posts/", {"json": {"title": "budget", "content": "check"}, "headers": owner}, 201),
+        ("PUT", f"/posts/{post_id}", {"json": {"title": "edited", "content": "check"}, "headers": owner}, 200),
+        ("GET", f"/posts/{post_id}/comments", {"params": {"limit": 100}}, 200),
+        ("GET", f"/posts/{post_id}/comments/events", {}, None),
+        ("GET", f"/posts/{post_id}/thread", {}, 200),
+        ("GET", f"/posts/{post_id}/thread", {"params": {"max_depth": 1}}, 200),
+        ("GET", f"/comments/{comment_id}/thread", {}, 200),
+        ("GET", f"/comments/{comment_id}/thread", {"params": {"max_depth": 1}}, 200),
+        # 第三层评论的子树：深度从子树根的上级算起
+        ("GET", f"/comments/{fixture['comments'][2]}/thread", {"params": {"max_depth": 1}}, 200),
+        ("GET", f"/comments/{comment_id}", {}, 200),
+        ("POST", f"/posts/{post_id}/comments", {"json": {"content": "reply", "parent_id": leaf},
+                                                "headers": owner}, 201),
+        ("POST", f"/posts/{post_id}/comments:batch",
+         {"json": {"comments": [{"content": f"batch {i}", "parent_id": leaf if i % 2 else None}
+                                for i in range(20)]}, "headers": owner}, 201),
+        ("PUT", f"/comments/{fixture['comments'][AUTHORS]}", {"json": {"content": "edited"}, "headers": owner}, 200),
+        ("DELETE", f"/comments/{comment_id}", {"headers": owner}, 204),
+        ("GET", "/search", {"params": {"q": "search comment 全文"}}, 200),
+        ("GET", f"/users/{fixture['users'][0]}", {"params": {"limit": 100}}, 200),
+        ("DELETE", f"/posts/{other_post}", {"headers": fixture["tokens"][1]}, 204),
+        ("GET", "/admin/export", {"params": {"gzip": True}, "headers": owner}, 200),
+        ("GET", "/admin/deletions", {"params": {"pending": True}, "headers": owner}, 200),
+    ]
+
+
+def resolve(routes: dict, method: str, path: str) -> APIRoute | None:
+    """The route the app would dispatch to; earlier registrations win, as in the router"""
+    scope = {"type": "http", "path": path, "method": method}
+    return next((route for (m, _), route in routes.items()
+                 if m == method and route.matches(scope)[0] == Match.FULL), None)
@@ -1,40 +1,253 @@
+import asyncio
+import logging
 import os
+import time
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from app.utils.metrics import Counter, Gauge, TimedQueuePool, register
+
+logger = logging.getLogger(__name__)
 
 # 安全获取环境变量（带默认值）
-DB_CONFIG = "mysql+pymysql://{user}:{pwd}@{host}/{db}".format(
+# DATABASE_URL 可直接指定异步连接串，例如本地替身 sqlite+aiosqlite:///./forum.db
+# 或纯内存库 sqlite+aiosqlite:///:memory:（仅限单进程，表结构在应用启动时创建）
+DATABASE_URL = os.getenv("DATABASE_URL") or "mysql+aiomysql://{user}:{pwd}@{host}/{db}".format(
     user=os.getenv("DB_USER", "root"),
     pwd=os.getenv("DB_PASSWORD", "123456789"),
     host=os.getenv("DB_HOST", "localhost"),
     db=os.getenv("DB_NAME", "forum_db")
 ) + "?charset=utf8mb4"
 
+# 异步驱动 -> 同步驱动（建表和离线脚本仍使用同步引擎）
+SYNC_DRIVERS = {
+    "mysql+aiomysql": "mysql+pymysql",
+    "mysql+asyncmy": "mysql+pymysql",
+    "sqlite+aiosqlite": "sqlite",
+}
+
+
+def to_sync_url(url: str) -> str:
+    """Map an async database URL onto the equivalent sync driver"""
+    parsed = make_url(url)
+    return parsed.set(drivername=SYNC_DRIVERS.get(parsed.drivername, parsed.drivername)) \
+        .render_as_string(hide_password=False)
+
+
+def is_memory_database(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    """Pool settings for the given URL"""
+    # 异步引擎使用记录取连接等待时间的队列池，供 /metrics 统计
+    pool = dict(poolclass=TimedQueuePool) if make_url(url).get_dialect().is_async else {}
+    if is_memory_database(url):
+        # 内存库随连接存在：固定一条永不回收的连接，会话排队使用，事务互不交叉
+        return dict(pool, pool_size=1, max_overflow=0, pool_recycle=-1) if pool else {}
+    if make_url(url).get_backend_name() == "sqlite":
+        return pool
+    return dict(pool, pool_size=20, max_overflow=10, pool_recycle=1800, pool_pre_ping=True)
+
+
+# 只读副本：逗号分隔的异步连接串，为空时读请求也走主库。
+# 本地可用 SQLite 文件替身，例如指向主库文件本身（零延迟副本）或其拷贝（停在拷贝时刻的滞后副本）
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# least_outstanding 选在途会话最少的副本，round_robin 轮询
+REPLICA_STRATEGY = os.getenv("REPLICA_STRATEGY", "least_outstanding")
+# 用户写入后该时长内（秒）其读请求走主库，保证读到自己的写入
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", "2"))
+# 除这些方法外的请求均视为写入
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+DB_CONFIG = to_sync_url(DATABASE_URL)
+
 # 配置连接池
-engine = create_engine(
-    DB_CONFIG,
-    pool_size=20,
-    max_overflow=10,
-    pool_recycle=1800,
-    pool_pre_ping=True
-)
-
-# 使用 scoped_session 确保线程安全
+engine = create_engine(DB_CONFIG, **engine_options(DB_CONFIG))
+async_engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+# 同步会话仅供脚本使用，请求处理使用 AsyncSession
 SessionFactory = sessionmaker(bind=engine)
-Session = scoped_session(SessionFactory)
+# 提交后不过期属性，避免在事件循环中隐式触发懒加载 IO
+AsyncSessionFactory = async_sessionmaker(async_engine, expire_on_commit=False)
 Base = declarative_base()  # 正确声明基类
 
+READ_SESSIONS = register(Counter("forum_db_read_sessions_total", "Read-only sessions by the engine serving them",
+                                 ("target",)))
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_async_engine(url, **engine_options(url))
+        self.healthy = True
+        self.outstanding = 0
+
+
+class ReplicaRouter:
+    """Chooses the engine for read-only sessions.
+
+    Replicas are picked by fewest outstanding sessions (ties rotate) or
+    round-robin among those that passed the last health check. Callers who
+    wrote within ``sticky_seconds`` read from the primary; they are recognised
+    by their bearer token, so the window is per process.
+    """
+
+    def __init__(self, urls: list[str], strategy: str = REPLICA_STRATEGY,
+                 sticky_seconds: float = REPLICA_STICKY_SECONDS):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self.strategy = strategy
+        self.sticky_seconds = sticky_seconds
+        self._turn = 0
+        self._sticky = {}  # Authorization 头 -> 截止时间（monotonic）
+        self._task = None
+
+    def choose(self) -> Replica | None:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        self._turn += 1
+        start = self._turn % len(healthy)
+        if self.strategy == "round_robin":
+            return healthy[start]
+        # 在途数相同时从轮转位置开始比较，避免总落在第一个副本上
+        return min(healthy[start:] + healthy[:start], key=lambda replica: replica.outstanding)
+
+    def mark_write(self, key: str | None):
+        if not key or not self.replicas:
+            return
+        now = time.monotonic()
+        if len(self._sticky) >= 10000:
+            self._sticky = {k: deadline for k, deadline in self._sticky.items() if deadline > now}
+        self._sticky[key] = now + self.sticky_seconds
+
+    def is_sticky(self, key: str | None) -> bool:
+        deadline = self._sticky.get(key) if key else None
+        return deadline is not None and deadline > time.monotonic()
 
-def get_db():
-    """自动处理提交和回滚的上下文管理器"""
-    db = Session()
+    def mark_unhealthy(self, replica: Replica, reason):
+        if replica.healthy:
+            logger.warning("Replica %s marked unhealthy: %s", replica.name, reason)
+        replica.healthy = False
+
+    async def check(self):
+        """Probe every replica; failures drop it from rotation until a later probe succeeds"""
+        async def probe(replica: Replica):
+            try:
+                async with replica.engine.connect() as conn:
+                    await asyncio.wait_for(conn.execute(text("SELECT 1")), REPLICA_HEALTH_TIMEOUT)
+            except Exception as exc:
+                self.mark_unhealthy(replica, exc)
+            else:
+                if not replica.healthy:
+                    logger.info("Replica %s is healthy again", replica.name)
+                replica.healthy = True
+
+        await asyncio.gather(*(probe(replica) for replica in self.replicas))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+            await self.check()
+
+    async def start(self):
+        if self.replicas and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+register(Gauge("forum_db_replica_healthy", "1 if the replica passed its last health check",
+               lambda: {(r.name,): int(r.healthy) for r in replica_router.replicas}, labels=("replica",)))
+register(Gauge("forum_db_replica_outstanding", "Read sessions currently open on the replica",
+               lambda: {(r.name,): r.outstanding for r in replica_router.replicas}, labels=("replica",)))
+
+
+# 引擎 -> 一条多行 INSERT 内相邻自增 id 的差；None 表示不保证连续
+_AUTOINCREMENT_STEPS = {}
+
+
+async def consecutive_autoincrement_step(db) -> int | None:
+    """Step between the auto-increment ids of one multi-row INSERT on MySQL; None if they may not be consecutive
+
+    With innodb_autoinc_lock_mode 0 or 1 a multi-row VALUES gets its ids as one
+    block and LAST_INSERT_ID() is the first of them. Interleaved mode (2, the
+    MySQL 8 default) gives no such guarantee, so callers fall back to
+    inserting row by row there.
+    """
+    bind = db.get_bind()
+    if bind not in _AUTOINCREMENT_STEPS:
+        mode, step = (await db.execute(text("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment"))).one()
+        if mode > 1:
+            logger.warning("innodb_autoinc_lock_mode=%s: batch inserts fall back to one INSERT per row", mode)
+        _AUTOINCREMENT_STEPS[bind] = step if mode <= 1 else None
+    return _AUTOINCREMENT_STEPS[bind]
+
+
+async def create_schema():
+    """Create missing tables, plus indexes added to tables that already exist"""
+    def create(conn):
+        Base.metadata.create_all(conn)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(create)
+
+
+async def get_db(request: Request):
+    """自动处理提交和回滚的异步会话依赖（主库，读写）"""
+    async with AsyncSessionFactory() as db:
+        try:
+            yield db
+            await db.commit()  # 无异常时提交
+        except Exception as e:
+            await db.rollback()  # 异常时回滚
+            raise e
+    # 写请求成功后，该用户短时间内的读请求改走主库
+    if request.method not in SAFE_METHODS:
+        replica_router.mark_write(request.headers.get("authorization"))
+
+
+async def get_read_db(request: Request):
+    """Read-only session on a replica; the primary serves recent writers and covers for unhealthy replicas"""
+    replica = None if replica_router.is_sticky(request.headers.get("authorization")) else replica_router.choose()
+    if replica is None:
+        READ_SESSIONS.inc("primary")
+        async with AsyncSessionFactory() as db:
+            yield db
+        return
+
+    READ_SESSIONS.inc(replica.name)
+    replica.outstanding += 1
     try:
-        yield db
-        db.commit()  # 无异常时提交
-    except Exception as e:
-        db.rollback()  # 异常时回滚
-        raise e
+        async with AsyncSessionFactory(bind=replica.engine) as db:
+            yield db
+    except DBAPIError as exc:
+        # 断连或建连失败（无语句）先摘除副本，由健康检查恢复；本次请求照常报错
+        if exc.connection_invalidated or exc.statement is None:
+            replica_router.mark_unhealthy(replica, exc)
+        raise
     finally:
-        db.close()  # 关闭会话（返回连接至连接池）
-        Session.remove()  # 清除线程局部会话
+        replica.outstanding -= 1
+
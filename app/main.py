@@ -1,21 +1,71 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import engine
-from app.models import user, post
-from app.routers import auth, posts, comments
-from app.schemas.user import UserOut  # 导入 User 模型
+from app.database import async_engine, create_schema, replica_router
+from app.models import user, post, comment, deletion_job, user_stats  # noqa: F401  注册全部映射类，建表时需要
+from app.routers import admin, auth, posts, comments, search, users
+from app.schemas.user import UserProfile  # 导入 User 模型
 from app.schemas.post import PostOut  # 导入 Post 模型
+from app.services.comment_events import comment_events
+from app.services.deletion_purger import deletion_purger
+from app.services.post_activity import hot_score_updater
+from app.services.search_index import search_index
+from app.services.stale_content import stale_content
+from app.services.view_counter import view_counter
+from app.utils.cache import cache_stats
+from app.utils.metrics import (
+    METRICS_ENABLED, Gauge, MetricsMiddleware, instrument_engine, register, register_pool_metrics, render_metrics,
+)
+from app.utils.query_budget import query_budget
+from app.utils.security import password_hasher
+from app.utils.single_flight import single_flight
 
-# 创建数据库表
-user.Base.metadata.create_all(bind=engine)
-post.Base.metadata.create_all(bind=engine)
+# 请求级 SQL 计数与耗时（请求只走异步引擎与副本，同步引擎仅供脚本使用）
+if METRICS_ENABLED:
+    instrument_engine(async_engine.sync_engine)
+    for replica in replica_router.replicas:
+        instrument_engine(replica.engine.sync_engine)
+register_pool_metrics(async_engine)
+register(Gauge("forum_password_hash_inflight", "bcrypt jobs queued or running", lambda: password_hasher.inflight))
+register(Gauge("forum_single_flight_inflight", "Keys with a load in flight", lambda: single_flight.inflight))
+register(Gauge("forum_comment_event_subscribers", "Open comment event streams (SSE and WebSocket)",
+               lambda: comment_events.count))
 
 # 调用无参数的 model_rebuild()，以确保 forward 引用得到正确解析
-UserOut.model_rebuild()
+UserProfile.model_rebuild()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时（而非导入时）建表并补建索引，导入应用不再需要可用的数据库
+    await create_schema()
+    # 副本先做一次健康检查再开始接收读请求
+    await replica_router.start()
+    await comment_events.start()
+    view_counter.start()
+    hot_score_updater.start()
+    stale_content.start()
+    # 接着清除重启前未删完的帖子与评论
+    deletion_purger.start()
+    # 加载搜索索引快照并补齐快照之后的写入，没有快照时从数据库重建
+    await search_index.start()
+    yield
+    # 关闭时先结束推送连接，写回缓冲的浏览计数与索引快照，再释放异步连接池
+    await comment_events.stop()
+    await view_counter.stop()
+    await hot_score_updater.stop()
+    await stale_content.stop()
+    await deletion_purger.stop()
+    await search_index.stop()
+    password_hasher.shutdown()
+    await replica_router.stop()
+    await async_engine.dispose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 允许的源列表
 origins = [
@@ -31,16 +81,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 最后注册的中间件位于最外层，计时覆盖 CORS 在内的整个请求
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(posts.router)
 app.include_router(comments.router)
+app.include_router(search.router)
+app.include_router(users.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
+@query_budget(0)
 def read_root():
     return {"message": "Forum API"}
 
 
+@app.get("/cache/stats")
+@query_budget(0)
+def read_cache_stats():
+    return cache_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+@query_budget(0)
+def read_metrics():
+    """Prometheus text exposition of request, database, pool and bcrypt metrics"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8800)
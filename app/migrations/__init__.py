@@ -0,0 +1,85 @@
+# app/migrations/__init__.py
+"""
+Versioned schema migrations.
+
+Each ``vNNNN_<name>.py`` module in this package defines ``upgrade(conn)``.
+Versions are applied in order, each in its own transaction, and recorded in
+``schema_migrations``. The operations check what already exists, so a database
+created from the current models (create_schema at startup) upgrades to a no-op.
+Migrations only move forward; there is no downgrade.
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.schema import CreateColumn
+
+# 迁移记录表，不属于应用模型，只由迁移工具创建
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+MODULE_NAME = re.compile(r"^v(\d{4})_(\w+)$")
+
+
+def migrations() -> list[tuple[int, str, object]]:
+    """(version, name, module) of every migration, oldest first"""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = MODULE_NAME.match(info.name)
+        if match:
+            found.append((int(match[1]), match[2], importlib.import_module(f"{__name__}.{info.name}")))
+    return sorted(found, key=lambda migration: migration[0])
+
+
+def applied_versions(engine) -> set[int]:
+    migration_metadata.create_all(engine)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def upgrade(engine, target: int | None = None) -> list[str]:
+    """Apply the pending migrations up to ``target`` (all by default); returns their names"""
+    done = applied_versions(engine)
+    names = []
+    for version, name, module in migrations():
+        if version in done or (target is not None and version > target):
+            continue
+        # MySQL 的 DDL 会隐式提交，事务只保证记录版本与最后一步一起落盘；各步骤均可重复执行
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(insert(schema_migrations).values(version=version, name=name, applied_at=datetime.now()))
+        names.append(f"v{version:04d}_{name}")
+    return names
+
+
+def reflect(conn, table: str) -> Table:
+    return Table(table, MetaData(), autoload_with=conn)
+
+
+def create_index(conn, table: str, name: str, *columns: str, unique: bool = False):
+    """Create the index unless an index of that name already exists on the table"""
+    if name not in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        reflected = reflect(conn, table)
+        Index(name, *(reflected.c[column] for column in columns), unique=unique).create(conn)
+
+
+def drop_index(conn, table: str, name: str):
+    """Drop the index if it exists, in the dialect's syntax"""
+    if not inspect(conn).has_table(table):
+        return
+    if name in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        reflected = reflect(conn, table)
+        next(index for index in reflected.indexes if index.name == name).drop(conn)
+
+
+def add_column(conn, table: str, column: Column):
+    """Add ``column`` (a detached Column) unless the table already has a column of that name"""
+    if column.name not in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+        definition = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {conn.dialect.identifier_preparer.quote(table)} ADD COLUMN {definition}"))
@@ -0,0 +1,50 @@
+"""Columns and tables that the later migrations and the app rely on.
+
+The denormalized activity and ETag version columns on posts, the
+materialized path on comments, and the deletion_jobs and user_stats tables.
+New columns start out empty: repair_post_activity, backfill_comment_paths
+and rebuild_user_stats fill them in afterwards, on a live forum.
+"""
+from sqlalchemy import Column, DateTime, Double, ForeignKey, Index, Integer, MetaData, String, Table, inspect
+
+from app.migrations import add_column
+
+# 物化路径的定长分段与最大深度，与 app.models.comment 一致
+PATH_LENGTH = 8 * 64
+
+
+def upgrade(conn):
+    add_column(conn, "posts", Column("comment_count", Integer, nullable=False, server_default="0"))
+    add_column(conn, "posts", Column("last_activity_at", DateTime, nullable=True))
+    add_column(conn, "posts", Column("hot_score", Double, nullable=False, server_default="0"))
+    add_column(conn, "posts", Column("version", Integer, nullable=False, server_default="1"))
+    add_column(conn, "posts", Column("comments_version", Integer, nullable=False, server_default="0"))
+    add_column(conn, "comments", Column("path", String(PATH_LENGTH), nullable=True))
+
+    # 建表时的结构冻结在这里，不引用会继续演变的模型
+    metadata = MetaData()
+    Table("users", metadata, autoload_with=conn)
+    tables = (
+        Table(
+            "deletion_jobs", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("post_id", Integer, nullable=False),
+            Column("comment_id", Integer, nullable=True),
+            Column("path", String(PATH_LENGTH), nullable=True),
+            Column("total", Integer, nullable=False),
+            Column("deleted", Integer, nullable=False, server_default="0"),
+            Column("created_at", DateTime),
+            Column("finished_at", DateTime, nullable=True),
+            Index("ix_deletion_jobs_post_id_finished_at", "post_id", "finished_at"),
+        ),
+        Table(
+            "user_stats", metadata,
+            Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+            Column("post_count", Integer, nullable=False, server_default="0"),
+            Column("comment_count", Integer, nullable=False, server_default="0"),
+            Column("view_count", Integer, nullable=False, server_default="0"),
+        ),
+    )
+    for table in tables:
+        if not inspect(conn).has_table(table.name):
+            table.create(conn)
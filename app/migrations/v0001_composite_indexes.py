@@ -0,0 +1,26 @@
+"""Composite indexes matching how each endpoint filters and orders.
+
+Feeds seek and sort on (sort key, id), optionally behind is_pinned; comment
+pages on (post_id, created_at, id); comment trees and subtrees on
+(post_id, path); profiles on (user_id, created_at, id). The sort columns
+come from v0000; the indexes can be built before repair_post_activity and
+backfill_comment_paths fill them in.
+"""
+from app.migrations import create_index
+
+INDEXES = (
+    ("posts", "ix_posts_created_at_id", ("created_at", "id")),
+    ("posts", "ix_posts_is_pinned_created_at_id", ("is_pinned", "created_at", "id")),
+    ("posts", "ix_posts_last_activity_at_id", ("last_activity_at", "id")),
+    ("posts", "ix_posts_is_pinned_last_activity_at_id", ("is_pinned", "last_activity_at", "id")),
+    ("posts", "ix_posts_hot_score_id", ("hot_score", "id")),
+    ("posts", "ix_posts_is_pinned_hot_score_id", ("is_pinned", "hot_score", "id")),
+    ("posts", "ix_posts_user_id_created_at_id", ("user_id", "created_at", "id")),
+    ("comments", "ix_comments_post_id_created_at_id", ("post_id", "created_at", "id")),
+    ("comments", "ix_comments_post_id_path", ("post_id", "path")),
+)
+
+
+def upgrade(conn):
+    for table, name, columns in INDEXES:
+        create_index(conn, table, name, *columns)
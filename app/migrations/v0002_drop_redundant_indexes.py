@@ -0,0 +1,23 @@
+"""Drop indexes that only cost writes.
+
+Copies of primary keys and leftmost prefixes of the composite indexes.
+comments.user_id stays: no query filters on it, but on MySQL it is the only
+index backing the foreign key to users, and InnoDB refuses to drop it.
+"""
+from app.migrations import drop_index
+
+INDEXES = (
+    # 与主键重复（旧模型在主键列上加了 index=True）
+    ("users", "ix_users_id"),
+    ("posts", "ix_posts_id"),
+    ("comments", "ix_comments_id"),
+    ("deletion_jobs", "ix_deletion_jobs_id"),
+    # MySQL 外键留下的单列索引，是联合索引的最左前缀
+    ("posts", "user_id"),
+    ("comments", "post_id"),
+)
+
+
+def upgrade(conn):
+    for table, name in INDEXES:
+        drop_index(conn, table, name)
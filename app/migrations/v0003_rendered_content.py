@@ -0,0 +1,15 @@
+"""Store rendered HTML next to post and comment bodies.
+
+Existing rows get render_version 0. Reads serve them as escaped source and
+queue them for re-rendering in the background;
+``python -m app.commands.rerender_content`` fills them all in at once.
+"""
+from sqlalchemy import Column, Integer, Text
+
+from app.migrations import add_column
+
+
+def upgrade(conn):
+    for table in ("posts", "comments"):
+        add_column(conn, table, Column("content_html", Text, nullable=True))
+        add_column(conn, table, Column("render_version", Integer, nullable=False, server_default="0"))
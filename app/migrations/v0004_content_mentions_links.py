@@ -0,0 +1,16 @@
+"""Store the @mentions and link targets collected when a body is rendered.
+
+Both are JSON arrays in order of first appearance. Existing rows start out
+NULL; they were written by renderer version 1 at most, so version 2 treats
+them as stale and ``python -m app.commands.rerender_content`` fills both in
+together with the HTML.
+"""
+from sqlalchemy import JSON, Column
+
+from app.migrations import add_column
+
+
+def upgrade(conn):
+    for table in ("posts", "comments"):
+        add_column(conn, table, Column("mentions", JSON, nullable=True))
+        add_column(conn, table, Column("links", JSON, nullable=True))
@@ -1,22 +1,44 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, JSON
 from sqlalchemy.orm import relationship
 
 from app.database import Base
 
+# 物化路径：每层为定长十六进制 id，按 path 排序即为评论树的先序遍历
+PATH_SEGMENT_LENGTH = 8
+MAX_COMMENT_DEPTH = 64
+
 
 class Comment(Base):
     __tablename__ = "comments"
+    # 帖子评论按 (created_at, id) 游标分页
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+        # 整帖评论树及单个子树均为 (post_id, path) 上的范围扫描
+        Index("ix_comments_post_id_path", "post_id", "path"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     content = Column(Text, nullable=False)
     post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     parent_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
-    created_at = Column(DateTime, default=datetime.now())
+    created_at = Column(DateTime, default=datetime.now)
+    path = Column(String(PATH_SEGMENT_LENGTH * MAX_COMMENT_DEPTH), nullable=True)
+    # 正文渲染后的 HTML 在写入时生成；render_version 落后于 RENDERER_VERSION 的行由后台重新渲染并写回
+    content_html = Column(Text, nullable=True)
+    # 渲染时提取的 @提及用户名与链接地址，按首次出现顺序去重
+    mentions = Column(JSON, nullable=True)
+    links = Column(JSON, nullable=True)
+    render_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
     # 嵌套评论
-    replies = relationship("Comment", backref="parent", remote_side=lambda: [Comment.id])
+    parent = relationship("Comment", back_populates="replies", remote_side=lambda: [Comment.id])
+    replies = relationship("Comment", back_populates="parent")
+
+
+def path_segment(comment_id: int) -> str:
+    return format(comment_id, f"0{PATH_SEGMENT_LENGTH}x")
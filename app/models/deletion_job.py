@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+
+from app.database import Base
+from app.models.comment import PATH_SEGMENT_LENGTH, MAX_COMMENT_DEPTH
+
+
+# 待清除的帖子或评论子树：记录写入即为墓碑，读取时隐藏对应行，后台分批删除后标记完成
+class DeletionJob(Base):
+    __tablename__ = "deletion_jobs"
+    # 读取帖子与评论时按 post_id 查找未完成的任务
+    __table_args__ = (
+        Index("ix_deletion_jobs_post_id_finished_at", "post_id", "finished_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # 不设外键：帖子删除后任务记录仍保留，用于查看进度
+    post_id = Column(Integer, nullable=False)
+    # 删除整帖时为空；删除评论时为子树根及其物化路径
+    comment_id = Column(Integer, nullable=True)
+    path = Column(String(PATH_SEGMENT_LENGTH * MAX_COMMENT_DEPTH), nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
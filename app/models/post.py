@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, JSON, Double
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -8,15 +8,40 @@ from ..database import Base
 
 class Post(Base):
     __tablename__ = "posts"
+    # 列表按 (created_at, id) 游标分页，可选置顶优先
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_is_pinned_created_at_id", "is_pinned", "created_at", "id"),
+        # 按活跃度 / 热度排序的信息流，同样可选置顶优先
+        Index("ix_posts_last_activity_at_id", "last_activity_at", "id"),
+        Index("ix_posts_is_pinned_last_activity_at_id", "is_pinned", "last_activity_at", "id"),
+        Index("ix_posts_hot_score_id", "hot_score", "id"),
+        Index("ix_posts_is_pinned_hot_score_id", "is_pinned", "hot_score", "id"),
+        # 用户资料页按作者列出最新帖子
+        Index("ix_posts_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     title = Column(String(100), nullable=False)
     content = Column(Text, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime, default=datetime.now())
-    updated_at = Column(DateTime, onupdate=datetime.now())
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, onupdate=datetime.now)
     view_count = Column(Integer, default=0)
     is_pinned = Column(Boolean, default=False)
+    # 冗余计数：随评论增删在同一事务内维护，漂移由 repair_post_activity 修复
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_activity_at = Column(DateTime, default=datetime.now)
+    hot_score = Column(Double, nullable=False, default=0, server_default="0")
+    # ETag 版本号：version 随帖子编辑递增，comments_version 随评论增删改递增
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    comments_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # 正文渲染后的 HTML 在写入时生成；render_version 落后于 RENDERER_VERSION 的行由后台重新渲染并写回
+    content_html = Column(Text, nullable=True)
+    # 渲染时提取的 @提及用户名与链接地址，按首次出现顺序去重
+    mentions = Column(JSON, nullable=True)
+    links = Column(JSON, nullable=True)
+    render_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     author = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post", foreign_keys="[Comment.post_id]",
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey
+
+from app.database import Base
+
+
+# 用户资料页的冗余计数：随发帖、评论、浏览与清除在同一事务内增减，漂移由 rebuild_user_stats 修复
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # 该用户全部帖子的浏览量之和
+    view_count = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,61 @@
+# app/routers/admin.py
+
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models.deletion_job import DeletionJob
+from app.models.user import User
+from app.schemas.deletion import DeletionJobList
+from app.services.export_service import export_stream, parse_checkpoint
+from app.utils.query_budget import query_budget
+from app.utils.security import get_current_admin
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/export",
+            summary="Stream users, posts and comments as NDJSON",
+            responses={200: {"description": "One JSON object per line with its `type` and `id`",
+                             "content": {"application/x-ndjson": {}, "application/gzip": {}}}})
+@query_budget(4)
+async def export(
+        kinds: List[Literal["users", "posts", "comments"]] = Query(["users", "posts", "comments"]),
+        after: Optional[str] = Query(None, description="Resume after the last line received, e.g. `posts:123`"),
+        gzip: bool = False,
+        current_user: User = Depends(get_current_admin)
+):
+    """Export in primary-key order, users first; password hashes are never included"""
+    try:
+        checkpoint = parse_checkpoint(after)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # 响应流在依赖清理之后才开始发送，导出自行打开连接，不使用请求的会话
+    body = export_stream(kinds, checkpoint, compress=gzip)
+    if gzip:
+        return StreamingResponse(body, media_type="application/gzip",
+                                 headers={"Content-Disposition": 'attachment; filename="forum-export.ndjson.gz"'})
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+@router.get("/deletions",
+            response_model=DeletionJobList,
+            summary="Progress of post and comment deletions")
+@query_budget(2)
+async def read_deletions(
+        pending: bool = False,
+        limit: int = Query(50, ge=1, le=500),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_admin)
+):
+    """Deletion jobs, newest first; with `pending` only those still being purged"""
+    stmt = select(DeletionJob).order_by(DeletionJob.id.desc()).limit(limit)
+    if pending:
+        stmt = stmt.filter(DeletionJob.finished_at.is_(None))
+    result = await db.execute(stmt)
+    return DeletionJobList.model_validate({"items": result.scalars().all()})
@@ -2,12 +2,13 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.schemas.user import UserCreate, UserOut, Token
-from app.utils.security import create_access_token
+from app.utils.security import create_access_token, TOKEN_EMBED_USER_ID
 from app.services.user_service import UserService
+from app.utils.query_budget import query_budget
 
 router = APIRouter(tags=["Authentication"])
 
@@ -20,12 +21,14 @@ router = APIRouter(tags=["Authentication"])
     responses={
         409: {"description": "Username or email already exists"},
         400: {"description": "Invalid input data"},
-        500: {"description": "Server error during user creation"}
+        500: {"description": "Server error during user creation"},
+        503: {"description": "Password hashing queue is full"}
     }
 )
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+@query_budget(5)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     service = UserService(db)
-    new_user = service.register_user(user)
+    new_user = await service.register_user(user)
     return new_user
 
 
@@ -36,16 +39,20 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     responses={
         401: {"description": "Invalid credentials"},
         403: {"description": "User account is disabled"},
+        503: {"description": "Password hashing queue is full"},
     }
 )
+@query_budget(2)
 async def login(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     service = UserService(db)
-    user = service.authenticate_user(form_data.username, form_data.password)
+    user = await service.authenticate_user(form_data.username, form_data.password)
 
     token_data = {"sub": str(user.email)}
+    if TOKEN_EMBED_USER_ID:
+        token_data["uid"] = user.id
     access_token = create_access_token(data=token_data)
 
     return {"access_token": access_token, "token_type": "bearer"}
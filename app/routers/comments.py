@@ -1,17 +1,23 @@
 # app/routers/comment.py
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
-from app.models.comment import Comment
-from app.models.post import Post
+from app.database import AsyncSessionFactory, get_db, get_read_db
 from app.models.user import User
-from app.schemas.comment import CommentCreate, CommentUpdate, CommentOut
+from app.schemas.comment import (
+    CommentCreate, CommentBatchCreate, CommentUpdate, CommentOut, CommentPage, CommentThread,
+)
 from app.utils.security import get_current_user
+from app.services.comment_events import comment_events, sse_events, websocket_events
 from app.services.comment_service import CommentService
+from app.utils.http_cache import SHORT_LIVED, etag_matches, not_modified, weak_etag
+from app.utils.markdown import RENDERER_VERSION
+from app.utils.query_budget import query_budget
+from app.utils.serialization import json_response
 
 router = APIRouter(tags=["Comments"])
 
@@ -22,60 +28,167 @@ router = APIRouter(tags=["Comments"])
              summary="Create a new comment",
              responses={404: {"description": "Post or parent comment not found"},
                         403: {"description": "Not authorized"}})
+@query_budget(6)
 async def create_comment(
         post_id: int,
         comment: CommentCreate,  # CommentCreate 现在包含 parent_id
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Create a new comment (supports nested comments)"""
     service = CommentService(db, current_user)
-    new_comment = service.create_comment(post_id, comment.content, comment.parent_id)  # 使用 parent_id
+    new_comment = await service.create_comment(post_id, comment.content, comment.parent_id)  # 使用 parent_id
     return new_comment
 
 
+@router.post("/posts/{post_id}/comments:batch",
+             response_model=List[CommentOut],
+             status_code=status.HTTP_201_CREATED,
+             summary="Create many comments",
+             responses={400: {"description": "Empty or oversized batch, or nesting too deep"},
+                        404: {"description": "Post or parent comment not found"}})
+@query_budget(6)
+async def create_comments(
+        post_id: int,
+        batch: CommentBatchCreate,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """Create several comments in one transaction; all or none are stored"""
+    service = CommentService(db, current_user)
+    return await service.create_comments(post_id, batch.comments)
+
+
 
 @router.get("/posts/{post_id}/comments",
-            response_model=List[CommentOut],
+            response_model=CommentPage,
             summary="Get post comments",
-            responses={404: {"description": "Post not found"}})
+            responses={304: {"description": "Not modified since the ETag in If-None-Match"},
+                       404: {"description": "Post not found"},
+                       400: {"description": "Invalid cursor"}})
+@query_budget(2)
 async def read_comments(
         post_id: int,
-        skip: int = 0,
+        request: Request,
+        cursor: Optional[str] = None,
         limit: int = 100,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
-    """Get paginated comments for a post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    """Get a page of comments for a post, oldest first; supports conditional requests via ETag"""
+    if limit > 100:
+        limit = 100
+    if limit < 1:
+        limit = 1
+
+    service = CommentService(db)
+    comments_version = await service.get_comments_version(post_id)
+    headers = {"ETag": weak_etag("c", comments_version, RENDERER_VERSION), "Cache-Control": SHORT_LIVED}
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+    return json_response(await service.read_comments(post_id, comments_version, cursor, limit), headers=headers)
+
+
+@router.get("/posts/{post_id}/comments/events",
+            response_class=StreamingResponse,
+            summary="Stream comment changes on a post (Server-Sent Events)",
+            responses={200: {"description": "`created`, `updated` and `deleted` events whose data is a CommentEvent; "
+                                            "`resync` means events were missed and the comments must be refetched",
+                             "content": {"text/event-stream": {}}},
+                       404: {"description": "Post not found"},
+                       503: {"description": "Too many open streams"}})
+@query_budget(1)
+async def stream_comment_events(
+        post_id: int,
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Push comment writes instead of polling; subscribe before fetching the first page to miss nothing"""
+    service = CommentService(db)
+    await service.get_comments_version(post_id)
+    comment_events.ensure_capacity()
+    # 会话在响应开始前随依赖关闭，长连接不占用数据库连接
+    return StreamingResponse(sse_events(post_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/posts/{post_id}/comments/ws")
+async def comment_events_socket(websocket: WebSocket, post_id: int):
+    """WebSocket variant of the comment event stream; messages are CommentEvent JSON"""
+    # 不使用会话依赖：依赖要到连接结束才清理，会一直占用数据库连接
+    async with AsyncSessionFactory() as db:
+        try:
+            await CommentService(db).get_comments_version(post_id)
+            comment_events.ensure_capacity()
+        except HTTPException as exc:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=exc.detail)
+            return
+    await websocket.accept()
+    await websocket_events(websocket, post_id)
+
+
+@router.get("/posts/{post_id}/thread",
+            response_model=CommentThread,
+            summary="Get post comment tree",
+            responses={404: {"description": "Post not found"},
+                       400: {"description": "Invalid cursor"}})
+# 带 max_depth 时另需一次查询，找出深度上限处还有回复的节点
+@query_budget(3)
+async def read_thread(
+        post_id: int,
+        max_depth: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 200,
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Get the nested comment tree of a post, optionally cut off below max_depth"""
+    if limit > 500:
+        limit = 500
+    if limit < 1:
+        limit = 1
+    if max_depth is not None and max_depth < 1:
+        max_depth = 1
+
+    service = CommentService(db)
+    return json_response(await service.get_thread(post_id, max_depth, cursor, limit))
+
+
+@router.get("/comments/{comment_id}/thread",
+            response_model=CommentThread,
+            summary="Get comment subtree",
+            responses={404: {"description": "Comment not found"},
+                       400: {"description": "Invalid cursor"}})
+# 带 max_depth 时另需一次查询，找出深度上限处还有回复的节点
+@query_budget(3)
+async def read_comment_thread(
+        comment_id: int,
+        max_depth: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 200,
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Get a comment and its replies, e.g. to expand a node marked has_more_replies"""
+    if limit > 500:
+        limit = 500
+    if limit < 1:
+        limit = 1
+    if max_depth is not None and max_depth < 1:
+        max_depth = 1
 
-    return db.query(Comment) \
-        .options(joinedload(Comment.author)) \
-        .filter(Comment.post_id == post_id) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+    service = CommentService(db)
+    return json_response(await service.get_subtree(comment_id, max_depth, cursor, limit))
 
 
 @router.get("/comments/{comment_id}",
             response_model=CommentOut,
             summary="Get comment by ID",
             responses={404: {"description": "Comment not found"}})
+@query_budget(1)
 async def read_comment(
         comment_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     """Get a single comment with replies"""
-    comment = db.query(Comment) \
-        .options(joinedload(Comment.author)) \
-        .filter(Comment.id == comment_id) \
-        .first()
-
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-
-    return comment
+    service = CommentService(db)
+    return await service.read_comment(comment_id)
 
 
 @router.put("/comments/{comment_id}",
@@ -85,15 +198,16 @@ async def read_comment(
                 403: {"description": "Not authorized to update"},
                 404: {"description": "Comment not found"}
             })
+@query_budget(4)
 async def update_comment(
         comment_id: int,
         comment: CommentUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Update comment content (must be comment owner)"""
     service = CommentService(db, current_user)
-    updated_comment = service.update_comment(comment_id, comment.content)
+    updated_comment = await service.update_comment(comment_id, comment.content)
     return updated_comment
 
 
@@ -102,14 +216,17 @@ async def update_comment(
                summary="Delete a comment",
                responses={
                    403: {"description": "Not authorized to delete"},
-                   404: {"description": "Comment not found"}
+                   404: {"description": "Comment not found"},
+                   409: {"description": "Comment has no reply path yet (run backfill_comment_paths)"}
                })
+# 小子树在请求内清除；MySQL 不支持 DELETE ... RETURNING，清除时另需一次加锁查询
+@query_budget(9)
 async def delete_comment(
         comment_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Delete a comment (must be comment owner or admin)"""
     service = CommentService(db, current_user)
-    service.delete_comment(comment_id)
+    await service.delete_comment(comment_id)
     return
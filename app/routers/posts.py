@@ -1,16 +1,20 @@
 # app/routers/post.py
 
-from typing import List
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
-from app.models.post import Post
+from app.database import get_db, get_read_db
 from app.models.user import User
-from app.schemas.post import PostOut, PostCreate, PostUpdate
+from app.schemas.post import PostOut, PostCreate, PostUpdate, PostPage, PostBatch
 from app.services.post_service import PostService
+from app.services.view_counter import view_counter
+from app.utils.http_cache import REVALIDATE, etag_matches, not_modified, weak_etag
+from app.utils.markdown import RENDERER_VERSION
+from app.utils.query_budget import query_budget
 from app.utils.security import get_current_user
+from app.utils.serialization import json_response
 
 router = APIRouter(tags=["Posts"])
 
@@ -23,57 +27,103 @@ router = APIRouter(tags=["Posts"])
                  401: {"description": "Not authenticated"},
                  403: {"description": "Inactive user"}
              })
+@query_budget(3)
 async def create_post(
         post: PostCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Create a new post (requires authentication)"""
     service = PostService(db, current_user)
-    new_post = service.create_post(post.title, post.content)
+    new_post = await service.create_post(post.title, post.content)
     return new_post
 
 
 @router.get("/posts/",
-            response_model=List[PostOut],
+            response_model=PostPage,
             summary="Get all posts",
-            responses={200: {"description": "List of all posts"}})
+            responses={200: {"description": "Page of posts ordered by the requested feed"},
+                       400: {"description": "Invalid cursor"}})
+@query_budget(1)
 async def read_posts(
-        skip: int = 0,
+        cursor: Optional[str] = None,
         limit: int = 10,
-        db: Session = Depends(get_db)
+        pinned_first: bool = False,
+        sort: Literal["new", "active", "hot"] = "new",
+        db: AsyncSession = Depends(get_read_db)
 ):
-    """Get paginated list of posts"""
-    # Validate limit and skip to avoid extremely large queries
+    """Get a page of posts, newest, most recently replied to or hottest first;
+    pass the returned next_cursor to fetch the following page"""
+    # Validate limit to avoid extremely large queries
     if limit > 100:
         limit = 100
-    if skip < 0:
-        skip = 0
+    if limit < 1:
+        limit = 1
 
-    return db.query(Post) \
-        .options(joinedload(Post.author)) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+    service = PostService(db)
+    page = await service.read_posts(cursor, limit, pinned_first, sort)
+    for item in page.items:
+        item.view_count = view_counter.current(item.id, item.view_count)
+    return json_response(page)
+
+
+# 需注册在 /posts/{post_id} 之前，否则 batch 会被当作帖子 id
+@router.get("/posts/batch",
+            response_model=PostBatch,
+            summary="Get many posts by ID",
+            responses={200: {"description": "Posts in request order, null for missing ids"},
+                       400: {"description": "Malformed or too many ids"}})
+@query_budget(1)
+async def read_posts_batch(
+        ids: List[str] = Query(..., description="Comma-separated and/or repeated post ids"),
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Get several posts in one round trip; does not count as a view"""
+    try:
+        post_ids = [int(part) for value in ids for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+
+    service = PostService(db)
+    posts = [
+        post and PostOut.model_validate(post, from_attributes=True)
+        for post in await service.get_posts(post_ids)
+    ]
+    for post in posts:
+        if post:
+            post.view_count = view_counter.current(post.id, post.view_count)
+    return PostBatch(items=posts)
 
 
 @router.get("/posts/{post_id}",
             response_model=PostOut,
             summary="Get post by ID",
-            responses={404: {"description": "Post not found"}})
+            responses={304: {"description": "Not modified since the ETag in If-None-Match"},
+                       404: {"description": "Post not found"}})
+@query_budget(2)
 async def read_post(
         post_id: int,
-        db: Session = Depends(get_db)
+        request: Request,
+        db: AsyncSession = Depends(get_read_db)
 ):
-    """Get a single post by its ID"""
+    """Get a single post by its ID; supports conditional requests via ETag / If-None-Match"""
     service = PostService(db)
-    post = service.get_post(post_id)
+    versions = await service.get_versions(post_id)
 
-    # Update view count
-    post.view_count += 1
-    db.commit()
+    # 304 也算一次浏览：帖子详情要求每次回源校验，浏览量不会被 CDN 吞掉。
+    # 浏览量不参与 ETag（弱校验），否则每次浏览都会使客户端缓存失效；渲染器升级后正文 HTML 变化，需换 ETag。
+    # 热度由定时任务重算、不递增 version，直接计入 ETag
+    view_counter.increment(post_id)
+    headers = {"ETag": weak_etag(versions.version, versions.comments_version, RENDERER_VERSION, versions.hot_score),
+               "Cache-Control": REVALIDATE}
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
 
-    return post
+    post = await service.read_post(post_id, versions.version, versions.comments_version)
+    # 缓存中的计数可能过期，以刚查到的持久化值为准
+    post.view_count = view_counter.current(post_id, versions.view_count)
+    post.hot_score = versions.hot_score
+    return json_response(post, headers=headers)
 
 
 @router.put("/posts/{post_id}",
@@ -83,15 +133,17 @@ async def read_post(
                 403: {"description": "Not authorized to update"},
                 404: {"description": "Post not found"}
             })
+# 支持 UPDATE ... RETURNING 时为 2，MySQL 需再读回帖子
+@query_budget(3)
 async def update_post(
         post_id: int,
         post: PostUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Update an existing post (must be post owner)"""
     service = PostService(db, current_user)
-    updated_post = service.update_post(post_id, post.title, post.content)
+    updated_post = await service.update_post(post_id, post.title, post.content)
     return updated_post
 
 
@@ -102,12 +154,13 @@ async def update_post(
                    403: {"description": "Not authorized to delete"},
                    404: {"description": "Post not found"}
                })
+@query_budget(7)
 async def delete_post(
         post_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
     """Delete a post (must be post owner or admin)"""
     service = PostService(db, current_user)
-    service.delete_post(post_id)
+    await service.delete_post(post_id)
     return {"message": "Post deleted successfully"}
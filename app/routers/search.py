@@ -0,0 +1,33 @@
+# app/routers/search.py
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_read_db
+from app.schemas.search import SearchResults
+from app.services.search_service import SearchService
+from app.utils.query_budget import query_budget
+
+router = APIRouter(tags=["Search"])
+
+
+@router.get("/search",
+            response_model=SearchResults,
+            summary="Full-text search over posts and comments",
+            responses={200: {"description": "Hits ranked by BM25 relevance"}})
+@query_budget(2)
+async def search(
+        q: str = Query(..., min_length=1, max_length=200),
+        type: Optional[Literal["post", "comment"]] = None,
+        offset: int = Query(0, ge=0, le=1000),
+        limit: int = 20,
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Search titles and contents; Chinese text is matched by overlapping character pairs"""
+    # Validate limit to avoid extremely large result pages
+    limit = max(1, min(limit, 50))
+
+    service = SearchService(db)
+    return await service.search(q, type, offset, limit)
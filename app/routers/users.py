@@ -0,0 +1,40 @@
+# app/routers/users.py
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_read_db
+from app.schemas.user import UserProfile
+from app.services.user_service import UserService
+from app.services.view_counter import view_counter
+from app.utils.query_budget import query_budget
+from app.utils.serialization import json_response
+
+router = APIRouter(tags=["Users"])
+
+
+@router.get("/users/{user_id}",
+            response_model=UserProfile,
+            summary="Get a user's profile",
+            responses={200: {"description": "Post, comment and view totals with the user's newest posts"},
+                       400: {"description": "Invalid cursor"},
+                       404: {"description": "User not found"}})
+@query_budget(2)
+async def read_user(
+        user_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 10,
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Get a user's profile with a page of their posts, newest first;
+    pass the returned next_cursor to fetch older posts"""
+    limit = max(1, min(limit, 100))
+
+    service = UserService(db)
+    profile = await service.get_profile(user_id, cursor, limit)
+    # 统计中的浏览量按刷新批次累加，帖子的浏览量补上尚未刷新的部分
+    for post in profile.posts:
+        post.view_count = view_counter.current(post.id, post.view_count)
+    return json_response(profile)
@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import Literal, Optional, List
 
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from .user import UserOut
+from .content import RenderedContent
+from .user import UserSummary
 
 
 class CommentBase(BaseModel):
@@ -21,11 +22,41 @@ class CommentUpdate(CommentBase):
     pass
 
 
-class CommentOut(CommentBase):
+class CommentOut(RenderedContent, CommentBase):
+    content_table = "comments"
     id: int
     user_id: int
     post_id: int
     created_at: datetime
-    author: UserOut
+    author: UserSummary  # 不含 posts，序列化时不会触及作者的帖子列表
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CommentEvent(BaseModel):
+    type: Literal["created", "updated", "deleted"]
+    post_id: int
+    comment_id: int
+    comment: Optional[CommentOut] = None  # deleted 事件不带评论内容
+
+
+class CommentBatchCreate(BaseModel):
+    comments: List[CommentCreate]
+
+
+class CommentPage(BaseModel):
+    items: List[CommentOut]
+    next_cursor: Optional[str] = None
+
+
+class CommentNode(CommentOut):
+    parent_id: Optional[int] = None
+    depth: int
+    # 因深度限制未返回的回复，可通过 /comments/{id}/thread 加载
+    has_more_replies: bool = False
+    replies: List["CommentNode"] = []
+
+
+class CommentThread(BaseModel):
+    items: List[CommentNode]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,34 @@
+# app/schemas/content.py
+from typing import ClassVar, List, Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from app.services.stale_content import stale_content
+from app.utils.markdown import RENDERER_VERSION, escaped
+
+
+class RenderedContent(BaseModel):
+    """``content`` with the HTML rendered from it when the row was written"""
+    content: str
+    content_html: Optional[str] = None
+    # 渲染时提取的 @提及用户名与链接地址
+    mentions: List[str] = []
+    links: List[str] = []
+    # 只用于判断存储的 HTML 是否过期，不出现在响应中；从缓存反序列化时缺省为当前版本
+    render_version: int = Field(RENDERER_VERSION, exclude=True)
+    # 行所在的表，过期的行按 (表, id) 排队重新渲染
+    content_table: ClassVar[str]
+
+    @field_validator("mentions", "links", mode="before")
+    @classmethod
+    def empty_when_missing(cls, value):
+        # 迁移 v0004 之前的行为 NULL，随重新渲染补齐
+        return [] if value is None else value
+
+    @model_validator(mode="after")
+    def rerender_stale(self):
+        # 旧版本渲染器写入的行不在请求中渲染：先返回转义后的原文，由后台渲染并写回
+        if self.content_html is None or self.render_version != RENDERER_VERSION:
+            self.content_html = escaped(self.content)
+            stale_content.defer(self.content_table, self.id)
+        return self
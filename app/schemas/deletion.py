@@ -0,0 +1,21 @@
+# app/schemas/deletion.py
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class DeletionJobOut(BaseModel):
+    id: int
+    post_id: int
+    comment_id: Optional[int] = None  # 为空表示删除整帖
+    total: int  # 开始时估计的评论数
+    deleted: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DeletionJobList(BaseModel):
+    items: List[DeletionJobOut]
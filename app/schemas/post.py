@@ -2,8 +2,9 @@
 from __future__ import annotations
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import Optional
-from app.schemas.user import UserBase  # 引用 UserBase 代替 UserOut
+from typing import Optional, List
+from app.schemas.content import RenderedContent
+from app.schemas.user import UserSummary  # 引用 UserSummary 代替 UserOut，避免循环引用
 
 
 class PostBase(BaseModel):
@@ -19,16 +20,26 @@ class PostUpdate(PostBase):
     pass
 
 
-class PostOut(PostBase):
+class PostOut(RenderedContent, PostBase):
+    content_table = "posts"
     id: int
     user_id: int
     created_at: datetime
     updated_at: Optional[datetime]
     view_count: int
-    author: UserBase  # 使用 UserBase，避免循环引用
+    comment_count: int = 0
+    last_activity_at: Optional[datetime] = None
+    hot_score: float = 0
+    author: UserSummary
 
     model_config = ConfigDict(from_attributes=True)
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.update_forward_refs()
+
+class PostPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[str] = None
+
+
+class PostBatch(BaseModel):
+    # 与请求的 ids 一一对应，不存在的帖子为 null
+    items: List[Optional[PostOut]]
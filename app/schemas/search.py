@@ -0,0 +1,18 @@
+# app/schemas/search.py
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+
+class SearchHit(BaseModel):
+    type: Literal["post", "comment"]
+    id: int
+    post_id: int
+    score: float
+    title: Optional[str] = None  # 评论命中时为所属帖子的标题
+    snippet: str
+
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    total: int
@@ -18,13 +18,35 @@ class UserOut(UserBase):
     id: int
     is_active: bool
     created_at: datetime
-    # 使用字符串字面量来定义前向引用，这里引用 PostOut（循环引用）
-    posts: Optional[List["PostOut"]] = None
 
     # Pydantic V2 的配置
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserSummary(BaseModel):
+    """Author embedded in post and comment payloads (no relationships, no input validators)"""
+    id: int
+    username: str
+    email: str
+    is_active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UserStatsOut(BaseModel):
+    post_count: int = 0
+    comment_count: int = 0
+    view_count: int = 0
+
+
+class UserProfile(UserSummary):
+    stats: UserStatsOut
+    # 最新的一页帖子，next_cursor 取后续页；使用字符串字面量前向引用 PostOut（循环引用）
+    posts: List["PostOut"]
+    next_cursor: Optional[str] = None
+
+
 # Token 相关类
 class Token(BaseModel):
     access_token: str
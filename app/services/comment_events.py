@@ -0,0 +1,322 @@
+# app/services/comment_events.py
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Callable
+
+from fastapi import HTTPException, status
+from pydantic_core import from_json
+
+from app.schemas.comment import CommentEvent
+from app.utils.cache import REDIS_URL
+from app.utils.metrics import COMMENT_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# 评论事件总线：local 仅本进程；redis 经 Redis 频道在多进程间扇出；fakeredis 为本地替身
+COMMENT_EVENTS_BACKEND = os.getenv("COMMENT_EVENTS_BACKEND", "local")
+COMMENT_EVENTS_CHANNEL = os.getenv("COMMENT_EVENTS_CHANNEL", "forum:comment-events")
+# 每个连接最多积压的事件数；消费跟不上时丢弃该连接的积压并通知客户端重新拉取
+COMMENT_EVENTS_BUFFER = int(os.getenv("COMMENT_EVENTS_BUFFER", "64"))
+COMMENT_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("COMMENT_EVENTS_MAX_SUBSCRIBERS", "50000"))
+# 空闲连接的心跳间隔（秒），用于及时发现已断开的连接
+COMMENT_EVENTS_HEARTBEAT = float(os.getenv("COMMENT_EVENTS_HEARTBEAT", "15"))
+
+# Subscription.next() 的特殊返回值
+HEARTBEAT, RESYNC, CLOSED = "heartbeat", "resync", "closed"
+
+
+class Event:
+    """One published event, encoded once and shared by every subscriber"""
+    __slots__ = ("type", "json", "sse")
+
+    def __init__(self, type: str, json: bytes):
+        self.type = type
+        self.json = json
+        self.sse = b"event: " + type.encode() + b"\ndata: " + json + b"\n\n"
+
+
+class Subscription:
+    """A connection's bounded event buffer; an idle one waits on a single future with a timer"""
+    __slots__ = ("post_id", "limit", "_buffer", "_waiter", "_state")
+
+    def __init__(self, post_id: int, limit: int = COMMENT_EVENTS_BUFFER):
+        self.post_id = post_id
+        self.limit = limit
+        # 积压很短，用列表而不是 deque：空 deque 预分配整块，空闲连接多时占用可观
+        self._buffer = []
+        self._waiter = None
+        self._state = None  # None / RESYNC / CLOSED
+
+    def push(self, event: Event) -> bool:
+        """Queue the event; False once the consumer fell behind and the subscription must resync"""
+        if self._state is not None:
+            return False
+        if len(self._buffer) >= self.limit:
+            self._buffer.clear()
+            self._state = RESYNC
+            self._wake()
+            return False
+        self._buffer.append(event)
+        self._wake()
+        return True
+
+    def close(self, state: str = CLOSED):
+        if self._state is None:
+            self._buffer.clear()
+            self._state = state
+            self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def next(self, timeout: float = COMMENT_EVENTS_HEARTBEAT) -> Event | str:
+        """The next event, HEARTBEAT after ``timeout`` idle seconds, or RESYNC / CLOSED as the last value"""
+        if not self._buffer and self._state is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                return HEARTBEAT
+            finally:
+                self._waiter = None
+        if self._buffer:
+            return self._buffer.pop(0)
+        return self._state
+
+
+class LocalBroker:
+    """Single process: publishing delivers directly"""
+
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver: Callable[[bytes | None], None]):
+        self._deliver = deliver
+
+    async def publish(self, payload: bytes):
+        if self._deliver is not None:
+            self._deliver(payload)
+
+    async def stop(self):
+        self._deliver = None
+
+
+class RedisBroker:
+    """Fan-out across processes over one Redis pub/sub channel (any redis.asyncio-like client)"""
+
+    def __init__(self, client, channel: str = COMMENT_EVENTS_CHANNEL):
+        self.client = client
+        self.channel = channel
+        self._task = None
+
+    async def start(self, deliver: Callable[[bytes | None], None]):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(deliver))
+
+    async def publish(self, payload: bytes):
+        await self.client.publish(self.channel, payload)
+
+    async def _listen(self, deliver):
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        deliver(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Comment event subscription lost, reconnecting")
+                # 断线期间的事件已丢失，通知所有连接重新拉取
+                deliver(None)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class FakeRedisPubSub:
+    """Local stand-in for redis.asyncio's publish / pubsub(); brokers sharing one instance act as processes"""
+
+    def __init__(self):
+        self._queues = defaultdict(set)
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        for queue in self._queues[channel]:
+            queue.put_nowait({"type": "message", "channel": channel, "data": data})
+        return len(self._queues[channel])
+
+    def pubsub(self):
+        return _FakePubSub(self)
+
+
+class _FakePubSub:
+    def __init__(self, server: FakeRedisPubSub):
+        self.server = server
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.channels.add(channel)
+            self.server._queues[channel].add(self.queue)
+            self.queue.put_nowait({"type": "subscribe", "channel": channel, "data": len(self.channels)})
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        for channel in self.channels:
+            self.server._queues[channel].discard(self.queue)
+        self.channels.clear()
+
+
+def create_broker(name: str = COMMENT_EVENTS_BACKEND):
+    if name == "local":
+        return LocalBroker()
+    if name == "redis":
+        import redis.asyncio  # 可选依赖，仅在启用 Redis 时需要
+
+        return RedisBroker(redis.asyncio.from_url(REDIS_URL))
+    if name == "fakeredis":
+        return RedisBroker(FakeRedisPubSub())
+    raise ValueError(f"Unknown COMMENT_EVENTS_BACKEND: {name}")
+
+
+class CommentEvents:
+    """Per-post subscriptions fed by comment writes published through the broker"""
+
+    def __init__(self, broker=None, max_subscribers: int = COMMENT_EVENTS_MAX_SUBSCRIBERS):
+        self.broker = broker if broker is not None else create_broker()
+        self.max_subscribers = max_subscribers
+        self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self.count = 0
+
+    def ensure_capacity(self):
+        """Refuse new streams (503) while the process holds ``max_subscribers``; call before the response starts"""
+        if self.count >= self.max_subscribers:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "5"},
+            )
+
+    def subscribe(self, post_id: int) -> Subscription:
+        subscription = Subscription(post_id)
+        self._subscriptions[post_id].add(subscription)
+        self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.post_id)
+        if subscriptions is not None and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            self.count -= 1
+            if not subscriptions:
+                del self._subscriptions[subscription.post_id]
+        subscription.close()
+
+    async def publish(self, event: CommentEvent):
+        """Hand the event to the broker after the write committed; failures never fail the write"""
+        COMMENT_EVENTS.inc("published")
+        try:
+            await self.broker.publish(event.model_dump_json().encode())
+        except Exception:
+            logger.exception("Failed to publish %s event for post %s", event.type, event.post_id)
+
+    def deliver(self, payload: bytes | None):
+        """Fan a broker message out to this process's subscribers; None means messages may have been lost"""
+        if payload is None:
+            for subscriptions in self._subscriptions.values():
+                for subscription in subscriptions:
+                    subscription.close(RESYNC)
+            return
+        message = from_json(payload)
+        subscriptions = self._subscriptions.get(message["post_id"])
+        if not subscriptions:
+            return
+        event = Event(message["type"], payload)
+        delivered = sum(subscription.push(event) for subscription in subscriptions)
+        COMMENT_EVENTS.inc("delivered", amount=delivered)
+        if delivered < len(subscriptions):
+            COMMENT_EVENTS.inc("dropped", amount=len(subscriptions) - delivered)
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+
+    async def stop(self):
+        """Stop listening and end every open stream"""
+        await self.broker.stop()
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                self.unsubscribe(subscription)
+
+
+comment_events = CommentEvents()
+
+
+async def sse_events(post_id: int):
+    """Server-Sent Events body: one frame per event, a comment line as heartbeat, ``resync`` before closing"""
+    # 在生成器内订阅：响应未开始就断开时不会遗留订阅
+    subscription = comment_events.subscribe(post_id)
+    try:
+        # 断线后客户端的重连间隔（毫秒）
+        yield b"retry: 3000\n\n"
+        while True:
+            event = await subscription.next()
+            if event is HEARTBEAT:
+                yield b": keepalive\n\n"
+            elif event is RESYNC:
+                yield b"event: resync\ndata: {}\n\n"
+                return
+            elif event is CLOSED:
+                return
+            else:
+                yield event.sse
+    finally:
+        comment_events.unsubscribe(subscription)
+
+
+async def websocket_events(websocket, post_id: int):
+    """Send CommentEvent JSON messages over an accepted WebSocket until either side closes"""
+    subscription = comment_events.subscribe(post_id)
+
+    async def receive():
+        # 客户端消息一律忽略，只用来发现断开
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        subscription.close()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            event = await subscription.next()
+            if event is HEARTBEAT:
+                await websocket.send_text('{"type":"heartbeat"}')
+            elif event is RESYNC:
+                await websocket.send_text('{"type":"resync"}')
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return
+            elif event is CLOSED:
+                if not receiver.done():
+                    await websocket.close(code=status.WS_1001_GOING_AWAY)
+                return
+            else:
+                await websocket.send_text(event.json.decode())
+    finally:
+        receiver.cancel()
+        comment_events.unsubscribe(subscription)
@@ -1,80 +1,356 @@
 # app/services/comment_service.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, exists, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
+from datetime import datetime
+
 from fastapi import HTTPException, status
 
+from app.database import consecutive_autoincrement_step
 from app.models.post import Post
-from app.models.comment import Comment
+from app.models.comment import Comment, PATH_SEGMENT_LENGTH, MAX_COMMENT_DEPTH, path_segment
+from app.models.deletion_job import DeletionJob
 from app.models.user import User
+from app.schemas.comment import CommentCreate, CommentEvent, CommentOut, CommentPage, CommentThread
+from app.services.comment_events import comment_events
+from app.services.deletion_purger import comment_visible, deletion_purger, in_subtree, post_visible
+from app.services.post_activity import activity_update, post_hot_score
+from app.services.search_index import search_index
+from app.services.user_stats import stats_delta, user_stats_update
+from app.utils.cache import (
+    read_through, cache, comment_key, comment_list_key,
+)
+from app.utils.markdown import rendered_columns
+from app.utils.pagination import paginate, page_of
+
+# 单条评论的 ORM 查询预加载作者（AsyncSession 下序列化时不能懒加载）
+COMMENT_OUT_OPTIONS = (joinedload(Comment.author),)
+# 列表与评论树直接查询列元组，不构造 ORM 对象
+COMMENT_ROW_COLUMNS = (
+    Comment.id, Comment.content, Comment.content_html, Comment.mentions, Comment.links, Comment.render_version,
+    Comment.user_id, Comment.post_id, Comment.created_at, Comment.parent_id, Comment.path,
+    User.username, User.email, User.is_active, User.created_at.label("author_created_at"),
+)
+# 批量创建单次最多的评论数
+COMMENT_BATCH_MAX = 100
+# 发表评论时只需帖子的这几列来计算新热度
+POST_ACTIVITY_COLUMNS = (Post.id, Post.created_at, Post.view_count, Post.comment_count)
+# 评论按时间正序分页
+COMMENT_ORDER = [Comment.created_at, Comment.id]
+# 评论树按物化路径先序遍历
+THREAD_ORDER = [Comment.path]
+
+
+def comment_from_row(row) -> dict:
+    return {
+        "id": row.id, "content": row.content, "content_html": row.content_html,
+        "mentions": row.mentions, "links": row.links, "render_version": row.render_version,
+        "user_id": row.user_id, "post_id": row.post_id, "created_at": row.created_at,
+        "author": {"id": row.user_id, "username": row.username, "email": row.email,
+                   "is_active": row.is_active, "created_at": row.author_created_at},
+    }
 
 
 class CommentService:
-    def __init__(self, db: Session, current_user: User = None):
+    def __init__(self, db: AsyncSession, current_user: User = None):
         self.db = db
         self.current_user = current_user
 
-    def get_post(self, post_id: int) -> Post:
-        post = self.db.query(Post).filter(Post.id == post_id).first()
+    async def get_post(self, post_id: int) -> Post:
+        result = await self.db.execute(select(Post).filter(Post.id == post_id, post_visible()))
+        post = result.scalars().first()
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
         return post
 
-    def get_comment(self, comment_id: int) -> Comment:
-        comment = self.db.query(Comment).filter(Comment.id == comment_id).first()
+    async def get_post_and_parents(self, post_id: int, parent_ids: set[int]) -> tuple:
+        """The post's activity columns and the paths of those ``parent_ids`` found in it, in one query"""
+        stmt = select(*POST_ACTIVITY_COLUMNS).filter(Post.id == post_id, post_visible())
+        if parent_ids:
+            stmt = stmt.add_columns(Comment.id.label("parent_id"), Comment.path.label("parent_path")).outerjoin(
+                Comment, and_(Comment.id.in_(parent_ids), Comment.post_id == Post.id, comment_visible())
+            )
+        rows = (await self.db.execute(stmt)).all()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Post not found")
+        parent_paths = {row.parent_id: row.parent_path for row in rows if parent_ids and row.parent_id is not None}
+        return rows[0], parent_paths
+
+    async def get_comment(self, comment_id: int) -> Comment:
+        result = await self.db.execute(
+            select(Comment)
+            .options(*COMMENT_OUT_OPTIONS)
+            .filter(Comment.id == comment_id, comment_visible())
+            .execution_options(populate_existing=True)
+        )
+        comment = result.scalars().first()
         if not comment:
             raise HTTPException(status_code=404, detail="Comment not found")
         return comment
 
+    async def list_comments(self, post_id: int, cursor: str | None,
+                            limit: int) -> tuple[list, str | None]:
+        """A page of comment rows (see COMMENT_ROW_COLUMNS) and the next cursor"""
+        result = await self.db.execute(paginate(
+            select(*COMMENT_ROW_COLUMNS).join(Comment.author).filter(Comment.post_id == post_id, comment_visible()),
+            COMMENT_ORDER, cursor, limit
+        ))
+        return page_of(result.all(), COMMENT_ORDER, limit)
+
+    async def read_comment(self, comment_id: int) -> CommentOut:
+        async def load():
+            return CommentOut.model_validate(await self.get_comment(comment_id), from_attributes=True)
+
+        return await read_through(comment_key(comment_id), CommentOut, load)
+
+    async def get_comments_version(self, post_id: int) -> int:
+        """Primary-key lookup of the post's comments_version; 404 when the post does not exist"""
+        result = await self.db.execute(select(Post.comments_version).filter(Post.id == post_id, post_visible()))
+        version = result.scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return version
+
+    async def read_comments(self, post_id: int, comments_version: int, cursor: str | None,
+                            limit: int) -> CommentPage:
+        """Cached comment page; the key carries comments_version so writes switch to fresh entries"""
+        async def load():
+            rows, next_cursor = await self.list_comments(post_id, cursor, limit)
+            items = [comment_from_row(row) for row in rows]
+            return CommentPage.model_validate({"items": items, "next_cursor": next_cursor})
+
+        return await read_through(comment_list_key(post_id, comments_version, cursor, limit), CommentPage, load)
+
+    async def get_thread(self, post_id: int, max_depth: int | None, cursor: str | None,
+                         limit: int) -> CommentThread:
+        await self.get_post(post_id)
+        return await self._load_tree(post_id, "", "", max_depth, cursor, limit)
+
+    async def get_subtree(self, comment_id: int, max_depth: int | None, cursor: str | None,
+                          limit: int) -> CommentThread:
+        result = await self.db.execute(
+            select(Comment.post_id, Comment.path).filter(Comment.id == comment_id, comment_visible())
+        )
+        comment = result.first()
+        if not comment or not comment.path:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        return await self._load_tree(comment.post_id, comment.path, comment.path[:-PATH_SEGMENT_LENGTH],
+                                     max_depth, cursor, limit)
+
+    async def _load_tree(self, post_id: int, prefix: str, scope: str,
+                         max_depth: int | None, cursor: str | None, limit: int) -> CommentThread:
+        """Load the comments under ``prefix`` in one range scan and nest them in O(n)
+
+        ``max_depth`` counts levels below ``scope`` (the parent of the subtree root).
+        """
+        # 子树即 path 以 prefix 开头的连续区间（十六进制字符均小于 "g"）
+        filters = [Comment.post_id == post_id, in_subtree(prefix) if prefix else Comment.path >= prefix,
+                   comment_visible()]
+
+        stmt = select(*COMMENT_ROW_COLUMNS).join(Comment.author).filter(*filters)
+        depth_limit = len(scope) + max_depth * PATH_SEGMENT_LENGTH if max_depth else None
+        if depth_limit:
+            stmt = stmt.filter(func.length(Comment.path) <= depth_limit)
+        result = await self.db.execute(paginate(stmt, THREAD_ORDER, cursor, limit))
+        rows, next_cursor = page_of(result.all(), THREAD_ORDER, limit)
+
+        # 本页中位于深度上限且还有可见回复的节点：每个节点在 (post_id, path) 索引上探查一次，
+        # 不对其下全部回复去重
+        truncated = set()
+        boundary = [row.path for row in rows if depth_limit and len(row.path) == depth_limit]
+        if boundary:
+            node = aliased(Comment)
+            result = await self.db.execute(
+                select(node.path).filter(
+                    node.post_id == post_id, node.path.in_(boundary),
+                    exists().where(Comment.post_id == node.post_id, Comment.path > node.path,
+                                   Comment.path < node.path + "g", comment_visible()),
+                )
+            )
+            truncated = set(result.scalars())
+
+        nodes, roots = {}, []
+        for row in rows:
+            node = comment_from_row(row)
+            node.update(
+                parent_id=row.parent_id,
+                depth=len(row.path) // PATH_SEGMENT_LENGTH,
+                has_more_replies=row.path in truncated,
+                replies=[],
+            )
+            nodes[row.id] = node
+            # 先序遍历保证父节点先于子节点出现；父节点不在本页时作为根返回
+            parent = nodes.get(row.parent_id)
+            (parent["replies"] if parent else roots).append(node)
+        return CommentThread.model_validate({"items": roots, "next_cursor": next_cursor})
+
     def check_comment_owner_or_admin(self, comment: Comment):
         if comment.user_id != self.current_user.id and not self.current_user.is_admin:
             raise HTTPException(status_code=403, detail="Not authorized")
 
-    def create_comment(self, post_id: int, content: str, parent_id: int = None) -> Comment:
-        post = self.get_post(post_id)
+    async def publish(self, type: str, comment: Comment | CommentOut):
+        """Notify the post's subscribers of a committed write"""
+        comment = CommentOut.model_validate(comment)
+        await comment_events.publish(CommentEvent(type=type, post_id=comment.post_id, comment_id=comment.id,
+                                                  comment=comment))
+
+    async def create_comment(self, post_id: int, content: str, parent_id: int = None) -> Comment:
+        """At most five statements: post and parent check, INSERT, path, post counters, author stats"""
+        post, parent_paths = await self.get_post_and_parents(post_id, {parent_id} if parent_id else set())
 
         # Validate parent comment if provided
+        parent_path = ""
         if parent_id:
-            parent = self.db.query(Comment).filter(
-                Comment.id == parent_id,
-                Comment.post_id == post_id
-            ).first()
-            if not parent:
+            if parent_id not in parent_paths:
                 raise HTTPException(status_code=404, detail="Parent comment not found in this post")
+            parent_path = parent_paths[parent_id]
+            if parent_path and len(parent_path) >= PATH_SEGMENT_LENGTH * MAX_COMMENT_DEPTH:
+                raise HTTPException(status_code=400, detail="Reply nesting too deep")
 
-        new_comment = Comment(content=content, post_id=post_id, user_id=self.current_user.id, parent_id=parent_id)
+        # 作者就是已加载的当前用户，插入后无需再查询即可返回
+        new_comment = Comment(content=content, post_id=post_id, user_id=self.current_user.id, parent_id=parent_id,
+                              author=self.current_user, **rendered_columns(content))
 
         try:
             self.db.add(new_comment)
-            self.db.commit()
-            self.db.refresh(new_comment)
+            # 路径包含自身 id，插入后在同一事务内补写
+            await self.db.flush()
+            if parent_path is not None:
+                new_comment.path = parent_path + path_segment(new_comment.id)
+            # 帖子的评论数、最后活跃时间与热度随评论在同一事务内更新
+            hot = post_hot_score(post, (post.comment_count or 0) + 1, new_comment.created_at)
+            await self.db.execute(activity_update(post_id, 1, hot, new_comment.created_at))
+            await self.db.execute(user_stats_update(self.db.bind.dialect),
+                                  stats_delta(self.current_user.id, comments=1))
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Failed to create comment")
 
+        search_index.index_comment(new_comment.id, post_id, content)
+        await self.publish("created", new_comment)
         return new_comment
 
-    def update_comment(self, comment_id: int, content: str) -> Comment:
-        comment = self.get_comment(comment_id)
+    async def create_comments(self, post_id: int, comments: list[CommentCreate]) -> list[CommentOut]:
+        """Create many comments in one transaction; parents must already exist in this post"""
+        if not comments:
+            raise HTTPException(status_code=400, detail="No comments to create")
+        if len(comments) > COMMENT_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"At most {COMMENT_BATCH_MAX} comments per request")
+
+        # 帖子与全部父评论一次查询校验
+        parent_ids = {comment.parent_id for comment in comments if comment.parent_id}
+        post, parent_paths = await self.get_post_and_parents(post_id, parent_ids)
+        missing = parent_ids - parent_paths.keys()
+        if missing:
+            raise HTTPException(status_code=404,
+                                detail=f"Parent comments not found in this post: {sorted(missing)}")
+        if any(path and len(path) >= PATH_SEGMENT_LENGTH * MAX_COMMENT_DEPTH for path in parent_paths.values()):
+            raise HTTPException(status_code=400, detail="Reply nesting too deep")
+
+        now = datetime.now()
+        rows = [
+            {"content": comment.content, "post_id": post_id, "user_id": self.current_user.id,
+             "parent_id": comment.parent_id, "created_at": now, **rendered_columns(comment.content)}
+            for comment in comments
+        ]
+        comments_table = Comment.__table__
+        try:
+            step = None
+            if self.db.bind.dialect.name == "mysql":
+                step = await consecutive_autoincrement_step(self.db)
+            if self.db.bind.dialect.insert_executemany_returning:
+                # 使用 Core 表对象：ORM 批量插入会按取值为空的列拆分成多条语句。
+                # 多行 VALUES 按顺序分配自增 id，排序后即与 rows 对应，
+                # 不要求 sort_by_parameter_order（SQLite 上会退化为逐行插入）
+                result = await self.db.execute(insert(comments_table).returning(comments_table.c.id), rows)
+                comment_ids = sorted(result.scalars().all())
+            elif step:
+                # MySQL 没有 RETURNING：一条多行 INSERT 的自增 id 连续分配，LAST_INSERT_ID() 为其中第一个
+                result = await self.db.execute(insert(comments_table).values(rows))
+                comment_ids = [result.lastrowid + i * step for i in range(len(rows))]
+            else:
+                # 自增 id 可能不连续（innodb_autoinc_lock_mode=2）时由 ORM 逐行插入取回，仍在同一事务内
+                new_comments = [Comment(**row) for row in rows]
+                self.db.add_all(new_comments)
+                await self.db.flush()
+                comment_ids = [comment.id for comment in new_comments]
+            # 父评论尚无路径（未回填的旧评论）时同 create_comment，回复也不设路径，留给 backfill_comment_paths
+            paths = [
+                {"id": comment_id, "path": parent_paths.get(row["parent_id"], "") + path_segment(comment_id)}
+                for comment_id, row in zip(comment_ids, rows)
+                if parent_paths.get(row["parent_id"], "") is not None
+            ]
+            if paths:
+                await self.db.execute(update(Comment), paths)
+            hot = post_hot_score(post, (post.comment_count or 0) + len(rows), now)
+            await self.db.execute(activity_update(post_id, len(rows), hot, now))
+            await self.db.execute(user_stats_update(self.db.bind.dialect),
+                                  stats_delta(self.current_user.id, comments=len(rows)))
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise HTTPException(status_code=500, detail="Failed to create comments")
+
+        # 插入的各列都已知，作者为当前用户，直接组装响应
+        created = [
+            CommentOut.model_validate({**row, "id": comment_id, "author": self.current_user})
+            for comment_id, row in zip(comment_ids, rows)
+        ]
+        for comment in created:
+            search_index.index_comment(comment.id, post_id, comment.content)
+            await self.publish("created", comment)
+        return created
+
+    async def update_comment(self, comment_id: int, content: str) -> Comment:
+        comment = await self.get_comment(comment_id)
         self.check_comment_owner_or_admin(comment)
 
         comment.content = content
+        for name, value in rendered_columns(content).items():
+            setattr(comment, name, value)
 
         try:
-            self.db.commit()
-            self.db.refresh(comment)
+            # 只递增帖子的 comments_version，使评论页的 ETag 与缓存键失效
+            await self.db.execute(activity_update(comment.post_id, 0))
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Failed to update comment")
 
+        search_index.index_comment(comment_id, comment.post_id, content)
+        await cache.delete(comment_key(comment_id))
+        # 提交后属性不过期，作者已随评论加载，无需重新查询
+        await self.publish("updated", comment)
         return comment
 
-    def delete_comment(self, comment_id: int):
-        comment = self.get_comment(comment_id)
+    async def delete_comment(self, comment_id: int):
+        """Hide the comment and its replies at once; the rows are purged in batches by the deletion purger"""
+        comment = await self.get_comment(comment_id)
         self.check_comment_owner_or_admin(comment)
+        if not comment.path:
+            # 没有路径就无法隐藏与清除其下的回复
+            raise HTTPException(status_code=409,
+                                detail="Comment predates reply paths; it can be deleted once paths are backfilled")
+
+        # 回复随评论一并删除：子树为路径上的一段区间，计数后立即扣减帖子的评论数
+        total = await self.db.scalar(select(func.count()).select_from(Comment).filter(
+            Comment.post_id == comment.post_id, in_subtree(comment.path), comment_visible()
+        ))
+        job = DeletionJob(post_id=comment.post_id, comment_id=comment_id, path=comment.path, total=total)
 
         try:
-            self.db.delete(comment)
-            self.db.commit()
+            self.db.add(job)
+            # 热度留给定时任务重算；最后活跃时间不回退
+            await self.db.execute(activity_update(comment.post_id, -total))
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Failed to delete comment")
+
+        search_index.remove_comment(comment_id)
+        await cache.delete(comment_key(comment_id))
+        # 订阅者收到子树根的删除事件后自行移除其下的回复
+        await comment_events.publish(CommentEvent(type="deleted", post_id=comment.post_id, comment_id=comment_id))
+        await deletion_purger.submit(job)
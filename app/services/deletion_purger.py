@@ -0,0 +1,240 @@
+# app/services/deletion_purger.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import and_, delete, exists, or_, select, update
+
+from app.database import async_engine
+from app.models.comment import Comment
+from app.models.deletion_job import DeletionJob
+from app.models.post import Post
+from app.services.search_index import search_index
+from app.services.user_stats import stats_deltas, user_stats_update
+from app.utils.cache import cache, comment_key
+from app.utils.metrics import DELETED_ROWS, DELETION_JOB_FAILURES
+
+logger = logging.getLogger(__name__)
+
+# 每批删除的评论数，限制单个事务的持锁时间；不足一批的删除在请求内直接完成
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "1000"))
+# 批次之间的间隔（秒），给其他写入与副本复制让出空隙
+DELETION_BATCH_PAUSE = float(os.getenv("DELETION_BATCH_PAUSE", "0.05"))
+# 空闲时检查未完成任务的间隔（秒）；已完成任务的保留时长（小时）
+DELETION_POLL_INTERVAL = float(os.getenv("DELETION_POLL_INTERVAL", "30"))
+DELETION_JOB_RETENTION_HOURS = float(os.getenv("DELETION_JOB_RETENTION_HOURS", "24"))
+DELETION_PROGRESS_INTERVAL = 10
+
+
+def in_subtree(path):
+    """Comments at or below ``path``: one range of the (post_id, path) index"""
+    # 十六进制字符均小于 "g"
+    return and_(Comment.path >= path, Comment.path < path + "g")
+
+
+def post_visible():
+    """Filter hiding posts whose deletion is queued"""
+    return ~exists().where(DeletionJob.post_id == Post.id, DeletionJob.comment_id.is_(None),
+                           DeletionJob.finished_at.is_(None))
+
+
+def comment_visible():
+    """Filter hiding comments whose post or subtree deletion is queued"""
+    return ~exists().where(
+        DeletionJob.post_id == Comment.post_id, DeletionJob.finished_at.is_(None),
+        or_(DeletionJob.comment_id.is_(None), DeletionJob.comment_id == Comment.id, in_subtree(DeletionJob.path)),
+    )
+
+
+class MissingPath(Exception):
+    """A comment subtree job whose root has no materialized path yet"""
+
+
+def job_scope(job) -> list:
+    """The comments a job removes"""
+    if job.comment_id is None:
+        return [Comment.post_id == job.post_id]
+    if not job.path:
+        # 没有路径就找不到子树，只删根评论会留下孤立的回复
+        raise MissingPath(f"comment {job.comment_id} has no path yet, run backfill_comment_paths")
+    return [Comment.post_id == job.post_id, in_subtree(job.path)]
+
+
+async def delete_returning(conn, table, where, *columns) -> list:
+    """DELETE the matching rows and return ``columns`` of those this transaction actually removed"""
+    if conn.dialect.delete_returning:
+        result = await conn.execute(delete(table).where(where).returning(*columns))
+        return result.all()
+    # 不支持 RETURNING 时（MySQL）先锁定再删除，并发清除同一任务的进程不会重复计数
+    result = await conn.execute(select(*columns).where(where).with_for_update())
+    rows = result.all()
+    await conn.execute(delete(table).where(where))
+    return rows
+
+
+def describe(job) -> str:
+    return f"post {job.post_id}" if job.comment_id is None else f"comment {job.comment_id} and its replies"
+
+
+class DeletionPurger:
+    """Purges tombstoned posts and comment subtrees in bounded batches in the background.
+
+    The queue is the ``deletion_jobs`` table, so a restart resumes where the
+    last committed batch stopped. Each batch picks the deepest comments
+    first (path descending), so what is left is always a complete tree, and
+    removes them with one bulk DELETE in its own transaction. Several
+    processes may purge the same job; progress counts rows actually deleted.
+    """
+
+    def __init__(self, batch_size: int = DELETION_BATCH_SIZE, pause: float = DELETION_BATCH_PAUSE,
+                 poll_interval: float = DELETION_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def purge_batch(self, job) -> tuple[int, bool]:
+        """Delete one batch of the job's comments; returns (rows deleted, whether the job is finished)"""
+        comments = Comment.__table__
+        async with async_engine.begin() as conn:
+            # 先取 id 再删除：MySQL 的 IN 子查询不支持 LIMIT，SQLite 不支持 DELETE ... LIMIT，
+            # 且取回的 id 还要用于清理搜索索引与缓存
+            result = await conn.execute(
+                select(Comment.id).filter(*job_scope(job)).order_by(Comment.path.desc()).limit(self.batch_size)
+            )
+            comment_ids = result.scalars().all()
+            removed = []
+            if comment_ids:
+                removed = await delete_returning(conn, comments, comments.c.id.in_(comment_ids), comments.c.user_id)
+            deleted = len(removed)
+            finished = len(comment_ids) < self.batch_size
+            values = {"deleted": DeletionJob.deleted + deleted}
+            # 用户统计按本事务实际删除的行扣减
+            posts_removed, comments_removed, views_removed = Counter(), Counter(), Counter()
+            for row in removed:
+                comments_removed[row.user_id] -= 1
+            if finished:
+                if job.comment_id is None:
+                    posts = Post.__table__
+                    for post in await delete_returning(conn, posts, posts.c.id == job.post_id,
+                                                       posts.c.user_id, posts.c.view_count):
+                        posts_removed[post.user_id] -= 1
+                        views_removed[post.user_id] -= post.view_count or 0
+                values["finished_at"] = datetime.now()
+            await conn.execute(update(DeletionJob.__table__).where(DeletionJob.id == job.id).values(**values))
+            deltas = stats_deltas(posts_removed, comments_removed, views_removed)
+            if deltas:
+                await conn.execute(user_stats_update(conn.dialect), deltas)
+
+        for comment_id in comment_ids:
+            search_index.remove_comment(comment_id)
+        await cache.delete(*(comment_key(comment_id) for comment_id in comment_ids))
+        DELETED_ROWS.inc("comments", amount=deleted)
+        if finished and job.comment_id is None:
+            DELETED_ROWS.inc("posts")
+        return deleted, finished
+
+    async def purge(self, job) -> int:
+        """Purge the job to the end; returns the rows deleted"""
+        total, finished = 0, False
+        started = reported = time.perf_counter()
+        while not finished:
+            deleted, finished = await self.purge_batch(job)
+            total += deleted
+            if time.perf_counter() - reported >= DELETION_PROGRESS_INTERVAL:
+                reported = time.perf_counter()
+                logger.info("Purging %s: %d of about %d comments deleted", describe(job), total, job.total)
+            if not finished:
+                await asyncio.sleep(self.pause)
+        logger.info("Purged %s: %d comments in %.1fs", describe(job), total, time.perf_counter() - started)
+        return total
+
+    async def submit(self, job):
+        """Purge a job smaller than one batch right away; anything larger goes to the background worker"""
+        if job.total < self.batch_size:
+            try:
+                if (await self.purge_batch(job))[1]:
+                    return
+            except Exception:
+                logger.exception("Failed to purge %s, leaving it to the background worker", describe(job))
+        self.wake()
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def with_path(self, job):
+        """The job with its subtree path filled in from the root comment, once backfill_comment_paths has run"""
+        if job.comment_id is None or job.path:
+            return job
+        async with async_engine.begin() as conn:
+            path = await conn.scalar(select(Comment.path).where(Comment.id == job.comment_id))
+            if not path:
+                raise MissingPath(f"comment {job.comment_id} has no path yet, run backfill_comment_paths")
+            # 记入任务，读取时按子树隐藏其下的回复
+            await conn.execute(update(DeletionJob.__table__).where(DeletionJob.id == job.id).values(path=path))
+        return SimpleNamespace(**{**job._asdict(), "path": path})
+
+    async def run_pending(self, prune: bool = True) -> int:
+        """Purge unfinished jobs oldest first, then drop finished ones past retention; returns jobs purged.
+
+        A job that fails is logged, counted and retried on the next pass; the
+        jobs queued after it still run.
+        """
+        jobs = DeletionJob.__table__
+        async with async_engine.connect() as conn:
+            result = await conn.execute(select(jobs).where(jobs.c.finished_at.is_(None)).order_by(jobs.c.id))
+            pending = result.all()
+        purged = 0
+        for job in pending:
+            try:
+                await self.purge(await self.with_path(job))
+                purged += 1
+            except Exception:
+                DELETION_JOB_FAILURES.inc()
+                logger.exception("Failed to purge %s, retrying on the next pass", describe(job))
+        if not prune:
+            return purged
+
+        cutoff = datetime.now() - timedelta(hours=DELETION_JOB_RETENTION_HOURS)
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(jobs).where(jobs.c.finished_at < cutoff))
+        return purged
+
+    async def _run(self):
+        while True:
+            # 被唤醒时只处理新任务，定时轮询时才顺带清理过期记录
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                woken = True
+            except asyncio.TimeoutError:
+                woken = False
+            self._wakeup.clear()
+            try:
+                await self.run_pending(prune=not woken)
+            except Exception:
+                logger.exception("Failed to purge deleted posts and comments")
+
+    def start(self):
+        if self._task is None:
+            # 启动时立即接着处理重启前未完成的任务
+            self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop purging; a batch in flight rolls back and is redone after the next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+deletion_purger = DeletionPurger()
@@ -0,0 +1,80 @@
+# app/services/export_service.py
+
+import gzip
+import os
+from typing import AsyncIterator
+
+from pydantic_core import to_json
+from sqlalchemy import select
+
+from app.database import async_engine, replica_router
+from app.models.comment import Comment
+from app.models.post import Post
+from app.models.user import User
+from app.services.deletion_purger import comment_visible, post_visible
+
+# 按外键依赖顺序导出：用户 -> 帖子 -> 评论，导入时可顺序写入
+EXPORT_TABLES = {"users": User.__table__, "posts": Post.__table__, "comments": Comment.__table__}
+EXPORT_TYPES = {"users": "user", "posts": "post", "comments": "comment"}
+SECRET_COLUMNS = {"users": {"password_hash"}}
+# 已删除、等待后台清除的帖子与评论不导出
+VISIBLE = {"posts": post_visible, "comments": comment_visible}
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+
+def parse_checkpoint(value: str | None) -> tuple[str, int] | None:
+    """``"posts:123"`` -> ``("posts", 123)``: resume after post 123, skipping users"""
+    if not value:
+        return None
+    kind, _, last_id = value.partition(":")
+    if kind not in EXPORT_TABLES or not last_id.isdigit():
+        raise ValueError(f"checkpoint must look like 'posts:123' with one of {', '.join(EXPORT_TABLES)}")
+    return kind, int(last_id)
+
+
+async def export_batches(kinds=tuple(EXPORT_TABLES), after: tuple[str, int] | None = None,
+                         batch_size: int = EXPORT_BATCH_SIZE,
+                         include_secrets: bool = False) -> AsyncIterator[tuple[str, int, bytes]]:
+    """Stream tables as NDJSON in primary-key order, one ``(kind, last id, lines)`` per batch.
+
+    Rows come from a server-side cursor (``yield_per``) as Core rows, so
+    memory holds one batch whatever the table size. Every line carries its
+    ``type`` and ``id``; ``after`` resumes behind the last line received.
+    """
+    order = list(EXPORT_TABLES)
+    replica = replica_router.choose()
+    # 导出是长时间的只读扫描，优先放到副本上
+    engine = replica.engine if replica else async_engine
+    if replica:
+        replica.outstanding += 1
+    try:
+        async with engine.connect() as conn:
+            for kind in sorted(set(kinds), key=order.index):
+                start = 0
+                if after is not None:
+                    if order.index(kind) < order.index(after[0]):
+                        continue
+                    if kind == after[0]:
+                        start = after[1]
+                table = EXPORT_TABLES[kind]
+                hidden = set() if include_secrets else SECRET_COLUMNS.get(kind, set())
+                stmt = select(*(column for column in table.c if column.name not in hidden)).where(table.c.id > start)
+                if kind in VISIBLE:
+                    stmt = stmt.where(VISIBLE[kind]())
+                stmt = stmt.order_by(table.c.id).execution_options(yield_per=batch_size)
+
+                result = await conn.stream(stmt)
+                kind_type = EXPORT_TYPES[kind]
+                async for rows in result.partitions():
+                    lines = b"".join(to_json({"type": kind_type, **row._mapping}) + b"\n" for row in rows)
+                    yield kind, rows[-1].id, lines
+    finally:
+        if replica:
+            replica.outstanding -= 1
+
+
+async def export_stream(kinds=tuple(EXPORT_TABLES), after: tuple[str, int] | None = None,
+                        compress: bool = False) -> AsyncIterator[bytes]:
+    """Response body for the export endpoint; with ``compress`` every batch is its own gzip member"""
+    async for _, _, lines in export_batches(kinds, after):
+        yield gzip.compress(lines, compresslevel=6) if compress else lines
@@ -0,0 +1,287 @@
+# app/services/import_service.py
+
+import csv
+import gzip
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, bindparam, case, func, insert, select, update
+
+from app.database import async_engine
+from app.models.comment import Comment, MAX_COMMENT_DEPTH, PATH_SEGMENT_LENGTH, path_segment
+from app.models.post import Post
+from app.models.user import User
+from app.services.user_stats import stats_deltas, user_stats_update
+from app.utils.markdown import rendered_columns
+from app.utils.security import get_password_hash, pwd_context
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+# 导入顺序即外键依赖顺序
+IMPORT_KINDS = ("users", "posts", "comments")
+KIND_BY_TYPE = {"user": "users", "post": "posts", "comment": "comments"}
+TABLES = {"users": User.__table__, "posts": Post.__table__, "comments": Comment.__table__}
+# 源数据中可直接写入的列；其余列（路径、计数、热度、渲染后的正文）由导入计算
+SOURCE_COLUMNS = {
+    "users": ("username", "email", "password_hash", "is_active", "is_admin", "created_at", "last_login"),
+    "posts": ("title", "content", "user_id", "created_at", "updated_at", "view_count", "is_pinned", "version"),
+    "comments": ("content", "post_id", "user_id", "parent_id", "created_at"),
+}
+REFERENCES = {"posts": {"user_id": "users"}, "comments": {"user_id": "users", "post_id": "posts"}}
+
+# 源 id 到新 id 的映射与数据行在同一事务内写入，既用于改写外键，也是断点：重跑时已映射的行直接跳过。
+# 不属于应用模型，只由导入工具创建
+import_metadata = MetaData()
+import_id_map = Table(
+    "import_id_map", import_metadata,
+    Column("source", String(50), primary_key=True),
+    Column("kind", String(16), primary_key=True),
+    Column("source_id", Integer, primary_key=True),
+    Column("target_id", Integer, nullable=False),
+)
+
+
+class RowRejected(Exception):
+    """A source row that cannot be imported; counted by reason and skipped"""
+
+
+def _coerce(column, value):
+    if value is None or value == "":
+        return None
+    python_type = column.type.python_type
+    if isinstance(value, python_type):
+        return value
+    if python_type is bool:
+        return str(value).lower() in ("1", "true", "t", "yes", "y")
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    return python_type(value)
+
+
+def source_row(kind: str, record: dict) -> dict:
+    """Keep the importable columns of a parsed NDJSON/CSV record, converted to the column types"""
+    table = TABLES[kind]
+    try:
+        row = {"id": int(record["id"])}
+        for name in SOURCE_COLUMNS[kind]:
+            if name in record:
+                row[name] = _coerce(table.c[name], record[name])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise RowRejected(f"unreadable {kind} row: {exc}")
+    for name in SOURCE_COLUMNS[kind]:
+        column = table.c[name]
+        if row.get(name) is None and not column.nullable and column.default is None and name != "password_hash":
+            raise RowRejected(f"{kind} without {name}")
+    if kind == "users" and not row.get("password_hash"):
+        if not record.get("password"):
+            raise RowRejected("user without password_hash or password")
+        # 明文密码只能逐行 bcrypt，迁移时应尽量提供已有的哈希
+        row["password_hash"] = get_password_hash(record["password"])
+    return row
+
+
+def read_records(path: str, kind: str | None = None) -> Iterator[tuple[str, dict]]:
+    """``(kind, record)`` from an NDJSON file (each line has ``type``) or a CSV file of one kind, optionally gzipped"""
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if name.endswith(".csv"):
+            kind = kind or os.path.splitext(os.path.basename(name))[0]
+            if kind not in IMPORT_KINDS:
+                raise ValueError(f"cannot tell what {path} contains; name it users/posts/comments.csv "
+                                 f"or pass kind=path")
+            for record in csv.DictReader(f):
+                yield kind, record
+            return
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield kind or KIND_BY_TYPE.get(record.get("type")), record
+
+
+def post_activity_update():
+    """Add imported comments to their post's counters, as the comment service does per comment"""
+    posts = Post.__table__
+    last = bindparam("last", type_=posts.c.last_activity_at.type)
+    return update(posts).where(posts.c.id == bindparam("post_id")).values(
+        comment_count=posts.c.comment_count + bindparam("count"),
+        comments_version=posts.c.comments_version + bindparam("count"),
+        last_activity_at=case((posts.c.last_activity_at.is_(None), last),
+                              (last > posts.c.last_activity_at, last), else_=posts.c.last_activity_at),
+        updated_at=posts.c.updated_at,
+    )
+
+
+class BulkImporter:
+    """Insert source rows with Core executemany, one transaction per batch, remapping every id"""
+
+    def __init__(self, source: str = "legacy", batch_size: int = IMPORT_BATCH_SIZE, progress=None):
+        self.source = source
+        self.batch_size = batch_size
+        self.progress = progress
+        self.buffers = {kind: [] for kind in IMPORT_KINDS}
+        # 引用尚未导入的行（如回复早于父评论出现），在其余数据写完后重试
+        self.deferred = {kind: [] for kind in IMPORT_KINDS}
+        self.imported = Counter()
+        self.skipped = Counter()
+        self.merged = Counter()
+        self.rejected = Counter()
+        self.started = time.perf_counter()
+
+    async def prepare(self):
+        async with async_engine.begin() as conn:
+            await conn.run_sync(import_metadata.create_all)
+
+    async def add(self, kind: str, record: dict):
+        if kind not in IMPORT_KINDS:
+            self.rejected[f"unknown type {record.get('type')!r}"] += 1
+            return
+        try:
+            self.buffers[kind].append(source_row(kind, record))
+        except RowRejected as exc:
+            self.rejected[str(exc)] += 1
+            return
+        if len(self.buffers[kind]) >= self.batch_size:
+            await self.flush(kind)
+
+    async def flush(self, kind: str):
+        # 先写完依赖的种类，保证引用的行已有映射
+        for earlier in IMPORT_KINDS[:IMPORT_KINDS.index(kind)]:
+            if self.buffers[earlier]:
+                await self.flush(earlier)
+        rows, self.buffers[kind] = self.buffers[kind], []
+        for start in range(0, len(rows), self.batch_size):
+            await self.write_batch(kind, rows[start:start + self.batch_size])
+
+    async def finish(self):
+        """Flush the buffers, then retry deferred rows until no more can be resolved"""
+        for kind in IMPORT_KINDS:
+            await self.flush(kind)
+        for kind in IMPORT_KINDS:
+            while self.deferred[kind]:
+                pending, self.deferred[kind] = sorted(self.deferred[kind], key=lambda row: row["id"]), []
+                before = self.imported[kind]
+                for start in range(0, len(pending), self.batch_size):
+                    await self.write_batch(kind, pending[start:start + self.batch_size])
+                if self.imported[kind] == before:
+                    self.rejected[f"{kind} referencing rows missing from the input"] += len(self.deferred[kind])
+                    self.deferred[kind] = []
+
+    async def lookup(self, conn, kind: str, source_ids) -> dict[int, int]:
+        if not source_ids:
+            return {}
+        rows = await conn.execute(
+            select(import_id_map.c.source_id, import_id_map.c.target_id)
+            .where(import_id_map.c.source == self.source, import_id_map.c.kind == kind,
+                   import_id_map.c.source_id.in_(source_ids))
+        )
+        return dict(rows.all())
+
+    async def write_batch(self, kind: str, rows: list[dict]):
+        table = TABLES[kind]
+        async with async_engine.begin() as conn:
+            done = await self.lookup(conn, kind, [row["id"] for row in rows])
+            if done:
+                self.skipped[kind] += len(done)
+                rows = [row for row in rows if row["id"] not in done]
+            if not rows:
+                return
+
+            targets = {}
+            for column, referenced in REFERENCES.get(kind, {}).items():
+                targets[column] = await self.lookup(conn, referenced, {row.get(column) for row in rows} - {None})
+            parents = {}
+            if kind == "comments":
+                parent_ids = {row["parent_id"] for row in rows} - {None}
+                mapped = await self.lookup(conn, "comments", parent_ids)
+                if mapped:
+                    result = await conn.execute(select(Comment.id, Comment.path)
+                                                .where(Comment.id.in_(mapped.values())))
+                    paths = dict(result.all())
+                    parents = {source_id: (target_id, paths[target_id]) for source_id, target_id in mapped.items()}
+            emails, usernames = {}, set()
+            if kind == "users":
+                # 同一邮箱视为同一人，映射到已有账号而不是重复注册
+                result = await conn.execute(select(User.email, User.id)
+                                            .where(User.email.in_({row["email"] for row in rows})))
+                emails = dict(result.all())
+                result = await conn.execute(select(User.username)
+                                            .where(User.username.in_({row["username"] for row in rows})))
+                usernames = set(result.scalars())
+
+            next_id = (await conn.scalar(select(func.max(table.c.id))) or 0) + 1
+            inserts, mappings, activity = [], [], defaultdict(lambda: [0, None])
+            authored, views = Counter(), Counter()
+            for row in rows:
+                if kind == "users":
+                    if row["email"] in emails:
+                        self.merged[kind] += 1
+                        mappings.append({"source": self.source, "kind": kind, "source_id": row["id"],
+                                         "target_id": emails[row["email"]]})
+                        continue
+                    if row["username"] in usernames:
+                        self.rejected["username taken by a user with another email"] += 1
+                        continue
+                    if not pwd_context.identify(row["password_hash"]):
+                        self.rejected["password hash in a scheme the app cannot verify"] += 1
+                        continue
+                    emails[row["email"]] = next_id
+                    usernames.add(row["username"])
+
+                unresolved = any(row.get(column) is not None and row[column] not in ids
+                                 for column, ids in targets.items())
+                if unresolved or (row.get("parent_id") is not None and row["parent_id"] not in parents):
+                    self.deferred[kind].append(row)
+                    continue
+                target = dict(row, id=next_id)
+                for column, ids in targets.items():
+                    target[column] = ids[row[column]]
+                if kind == "posts":
+                    target.update(comment_count=0, comments_version=0, hot_score=0,
+                                  last_activity_at=row.get("created_at"), version=row.get("version") or 1)
+                    views[target["user_id"]] += row.get("view_count") or 0
+                elif kind == "comments":
+                    parent_path = ""
+                    if row.get("parent_id") is not None:
+                        target["parent_id"], parent_path = parents[row["parent_id"]]
+                    if parent_path and len(parent_path) >= PATH_SEGMENT_LENGTH * MAX_COMMENT_DEPTH:
+                        self.rejected[f"comments nested deeper than {MAX_COMMENT_DEPTH}"] += 1
+                        continue
+                    # 本批中更早的评论也可作为父评论；父评论尚无路径（未回填的旧评论）时同 create_comment，
+                    # 回复也不设路径，留给 backfill_comment_paths
+                    target["path"] = None if parent_path is None else parent_path + path_segment(next_id)
+                    parents[row["id"]] = (next_id, target["path"])
+                    counts = activity[target["post_id"]]
+                    counts[0] += 1
+                    if row.get("created_at") and (counts[1] is None or row["created_at"] > counts[1]):
+                        counts[1] = row["created_at"]
+                if kind != "users":
+                    # 正文同服务层一样在写入时渲染
+                    target.update(rendered_columns(row["content"]))
+                    authored[target["user_id"]] += 1
+                inserts.append(target)
+                mappings.append({"source": self.source, "kind": kind, "source_id": row["id"], "target_id": next_id})
+                next_id += 1
+
+            if inserts:
+                await conn.execute(insert(table), inserts)
+            if mappings:
+                await conn.execute(insert(import_id_map), mappings)
+            if activity:
+                await conn.execute(post_activity_update(), [
+                    {"post_id": post_id, "count": count, "last": last} for post_id, (count, last) in activity.items()
+                ])
+            if authored:
+                # 作者的发帖、评论与浏览统计，同服务层一样随数据行在同一事务内累加
+                deltas = stats_deltas(posts=authored, views=views) if kind == "posts" \
+                    else stats_deltas(comments=authored)
+                await conn.execute(user_stats_update(conn.dialect), deltas)
+        self.imported[kind] += len(inserts)
+        if self.progress is not None:
+            self.progress(self)
+
+    def rate(self) -> float:
+        return sum(self.imported.values()) / max(time.perf_counter() - self.started, 1e-9)
@@ -0,0 +1,115 @@
+# app/services/post_activity.py
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, func, select, update
+
+from app.database import async_engine
+from app.models.post import Post
+from app.utils.cache import bump_generation, post_list_namespace
+
+logger = logging.getLogger(__name__)
+
+# 热度 = (评论数 * 权重 + 浏览数 * 权重 + 1) / (发帖小时数 + 2) ^ 重力，随时间衰减
+HOT_COMMENT_WEIGHT = float(os.getenv("HOT_COMMENT_WEIGHT", "1"))
+HOT_VIEW_WEIGHT = float(os.getenv("HOT_VIEW_WEIGHT", "0.05"))
+HOT_GRAVITY = float(os.getenv("HOT_GRAVITY", "1.8"))
+# 定时重算间隔（秒）；超出窗口的旧帖热度直接归零，不再逐行重算
+HOT_SCORE_INTERVAL = float(os.getenv("HOT_SCORE_INTERVAL", "300"))
+HOT_SCORE_WINDOW_DAYS = float(os.getenv("HOT_SCORE_WINDOW_DAYS", "7"))
+HOT_SCORE_BATCH_SIZE = 10000
+
+
+def hot_score(comment_count, view_count, age_hours):
+    """Decayed hotness; accepts scalars or NumPy arrays"""
+    activity = np.multiply(comment_count, HOT_COMMENT_WEIGHT) + np.multiply(view_count, HOT_VIEW_WEIGHT) + 1
+    return activity / np.power(np.maximum(age_hours, 0) + 2, HOT_GRAVITY)
+
+
+def post_hot_score(post: Post, comment_count: int, now: datetime) -> float:
+    age_hours = (now - (post.created_at or now)).total_seconds() / 3600
+    return float(hot_score(comment_count, post.view_count or 0, age_hours))
+
+
+def activity_update(post_id: int, comment_delta: int, hot: float | None = None,
+                    last_activity_at: datetime | None = None):
+    """Core UPDATE adjusting a post's counters after a comment write and bumping its comments_version;
+    leaves updated_at alone since replies are not edits"""
+    posts = Post.__table__
+    values = dict(comment_count=posts.c.comment_count + comment_delta,
+                  comments_version=posts.c.comments_version + 1, updated_at=posts.c.updated_at)
+    if hot is not None:
+        values["hot_score"] = hot
+    if last_activity_at is not None:
+        values["last_activity_at"] = last_activity_at
+    return update(posts).where(posts.c.id == post_id).values(**values)
+
+
+class HotScoreUpdater:
+    """Periodically recomputes decayed hot scores in vectorized batches"""
+
+    def __init__(self, interval: float = HOT_SCORE_INTERVAL, window_days: float = HOT_SCORE_WINDOW_DAYS):
+        self.interval = interval
+        self.window = timedelta(days=window_days)
+        self._task = None
+
+    async def refresh(self) -> int:
+        """Rescore posts inside the window and zero older ones; returns the number rescored"""
+        now = datetime.now()
+        cutoff = now - self.window
+        posts = Post.__table__
+        stmt = update(posts).where(posts.c.id == bindparam("post_id")) \
+            .values(hot_score=bindparam("score"), updated_at=posts.c.updated_at)
+
+        async with async_engine.begin() as conn:
+            # 窗口内的帖子数量有限，整体读出后一次向量化计算（流式游标期间同一连接不能再执行更新）
+            result = await conn.execute(
+                select(posts.c.id, func.coalesce(posts.c.comment_count, 0), func.coalesce(posts.c.view_count, 0),
+                       posts.c.created_at)
+                .where(posts.c.created_at >= cutoff)
+            )
+            rows = result.all()
+            if rows:
+                ids, comments, views, created = zip(*rows)
+                ages = (np.datetime64(now, "us") - np.array(created, dtype="datetime64[us]")) \
+                    / np.timedelta64(1, "h")
+                scores = hot_score(np.array(comments, dtype=np.float64), np.array(views, dtype=np.float64), ages)
+                params = [{"post_id": post_id, "score": score} for post_id, score in zip(ids, scores.tolist())]
+                for start in range(0, len(params), HOT_SCORE_BATCH_SIZE):
+                    await conn.execute(stmt, params[start:start + HOT_SCORE_BATCH_SIZE])
+
+            await conn.execute(
+                update(posts).where(posts.c.created_at < cutoff, posts.c.hot_score != 0)
+                .values(hot_score=0, updated_at=posts.c.updated_at)
+            )
+
+        await bump_generation(post_list_namespace())
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh hot scores")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+hot_score_updater = HotScoreUpdater()
@@ -1,63 +1,205 @@
 # app/services/post_service.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException, status
 
+from app.models.deletion_job import DeletionJob
 from app.models.post import Post
 from app.models.user import User
+from app.schemas.post import PostOut, PostPage
+from app.services.deletion_purger import deletion_purger, post_visible
+from app.services.post_activity import hot_score
+from app.services.search_index import search_index
+from app.services.user_stats import stats_delta, user_stats_update
+from app.utils.cache import (
+    read_through, bump_generation, post_key, post_list_key, post_list_namespace,
+)
+from app.utils.markdown import rendered_columns
+from app.utils.pagination import paginate, page_of
+
+# 批量读取单次最多的帖子数
+POST_BATCH_MAX = 100
+# 列表直接查询列元组，不构造 ORM 对象
+POST_ROW_COLUMNS = (
+    Post.id, Post.title, Post.content, Post.content_html, Post.mentions, Post.links, Post.render_version,
+    Post.user_id, Post.created_at, Post.updated_at, Post.view_count, Post.comment_count, Post.last_activity_at,
+    Post.hot_score, Post.is_pinned,
+    User.username, User.email, User.is_active, User.created_at.label("author_created_at"),
+)
+# 列表排序键：最新 / 最近活跃 / 热度优先，可选置顶优先
+POST_ORDER = [Post.created_at, Post.id]
+FEED_ORDERS = {
+    "new": POST_ORDER,
+    "active": [Post.last_activity_at, Post.id],
+    "hot": [Post.hot_score, Post.id],
+}
+
+
+def post_from_row(row) -> dict:
+    return {
+        "id": row.id, "title": row.title, "content": row.content, "content_html": row.content_html,
+        "mentions": row.mentions, "links": row.links, "render_version": row.render_version, "user_id": row.user_id,
+        "created_at": row.created_at, "updated_at": row.updated_at, "view_count": row.view_count or 0,
+        "comment_count": row.comment_count, "last_activity_at": row.last_activity_at,
+        "hot_score": row.hot_score,
+        "author": {"id": row.user_id, "username": row.username, "email": row.email,
+                   "is_active": row.is_active, "created_at": row.author_created_at},
+    }
 
 
 class PostService:
-    def __init__(self, db: Session, current_user: User = None):
+    def __init__(self, db: AsyncSession, current_user: User = None):
         self.db = db
         self.current_user = current_user
 
-    def get_post(self, post_id: int) -> Post:
-        post = self.db.query(Post).filter(Post.id == post_id).first()
+    async def get_post(self, post_id: int) -> Post:
+        # author 需预加载：AsyncSession 下序列化时不能懒加载
+        result = await self.db.execute(
+            select(Post)
+            .options(joinedload(Post.author))
+            .filter(Post.id == post_id, post_visible())
+            .execution_options(populate_existing=True)
+        )
+        post = result.scalars().first()
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
         return post
 
+    async def get_posts(self, post_ids: list[int]) -> list[Post | None]:
+        """Posts in the order of ``post_ids`` with authors, in one query; missing ids map to None"""
+        if len(post_ids) > POST_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"At most {POST_BATCH_MAX} ids per request")
+        if not post_ids:
+            return []
+        result = await self.db.execute(
+            select(Post)
+            .options(joinedload(Post.author))
+            .filter(Post.id.in_(set(post_ids)), post_visible())
+            .execution_options(populate_existing=True)
+        )
+        posts = {post.id: post for post in result.scalars()}
+        return [posts.get(post_id) for post_id in post_ids]
+
+    async def list_posts(self, cursor: str | None, limit: int, pinned_first: bool = False,
+                         sort: str = "new") -> tuple[list, str | None]:
+        """A page of post rows (see POST_ROW_COLUMNS) and the next cursor"""
+        order = FEED_ORDERS[sort]
+        if pinned_first:
+            order = [Post.is_pinned, *order]
+        result = await self.db.execute(
+            paginate(select(*POST_ROW_COLUMNS).join(Post.author).filter(post_visible()), order, cursor, limit,
+                     descending=True)
+        )
+        return page_of(result.all(), order, limit)
+
+    async def list_user_posts(self, user_id: int, cursor: str | None, limit: int) -> tuple[list, str | None]:
+        """A page of the user's post rows, newest first, and the next cursor"""
+        result = await self.db.execute(
+            paginate(select(*POST_ROW_COLUMNS).join(Post.author).filter(Post.user_id == user_id, post_visible()),
+                     POST_ORDER, cursor, limit, descending=True)
+        )
+        return page_of(result.all(), POST_ORDER, limit)
+
+    async def get_versions(self, post_id: int):
+        """Primary-key lookup of (version, comments_version, view_count, hot_score) without loading content"""
+        result = await self.db.execute(
+            select(Post.version, Post.comments_version, Post.view_count, Post.hot_score)
+            .filter(Post.id == post_id, post_visible())
+        )
+        versions = result.first()
+        if not versions:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return versions
+
+    async def read_post(self, post_id: int, version: int, comments_version: int) -> PostOut:
+        """Cached PostOut payload for the given versions; its view_count and hot_score may be stale"""
+        async def load():
+            return PostOut.model_validate(await self.get_post(post_id), from_attributes=True)
+
+        return await read_through(post_key(post_id, version, comments_version), PostOut, load)
+
+    async def read_posts(self, cursor: str | None, limit: int, pinned_first: bool = False,
+                         sort: str = "new") -> PostPage:
+        async def load():
+            rows, next_cursor = await self.list_posts(cursor, limit, pinned_first, sort)
+            items = [post_from_row(row) for row in rows]
+            return PostPage.model_validate({"items": items, "next_cursor": next_cursor})
+
+        return await read_through(await post_list_key(cursor, limit, pinned_first, sort), PostPage, load)
+
     def check_post_owner_or_admin(self, post: Post):
         if post.user_id != self.current_user.id and not self.current_user.is_admin:
             raise HTTPException(status_code=403, detail="Not authorized")
 
-    def create_post(self, title: str, content: str) -> Post:
-        new_post = Post(title=title, content=content, user_id=self.current_user.id)
+    async def create_post(self, title: str, content: str) -> Post:
+        """INSERT and the author's stats upsert; every column is set client-side, the author is the current user"""
+        # 新帖以零互动的初始热度进入热榜，之后由定时任务衰减；正文只在写入时渲染一次
+        new_post = Post(title=title, content=content, user_id=self.current_user.id,
+                        hot_score=float(hot_score(0, 0, 0)), author=self.current_user, **rendered_columns(content))
 
         try:
             self.db.add(new_post)
-            self.db.commit()
-            self.db.refresh(new_post)
+            # 作者的发帖数在同一事务内递增
+            await self.db.execute(user_stats_update(self.db.bind.dialect),
+                                  stats_delta(self.current_user.id, posts=1))
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Failed to create post")
 
+        search_index.index_post(new_post.id, title, content)
+        await bump_generation(post_list_namespace())
         return new_post
 
-    def update_post(self, post_id: int, title: str, content: str) -> Post:
-        post = self.get_post(post_id)
-        self.check_post_owner_or_admin(post)
-
-        post.title = title
-        post.content = content
+    async def update_post(self, post_id: int, title: str, content: str) -> Post:
+        """One UPDATE ... RETURNING guarded by ownership; without RETURNING (MySQL) the post is read back"""
+        stmt = update(Post).where(Post.id == post_id, post_visible()) \
+            .values(title=title, content=content, version=Post.version + 1, **rendered_columns(content)) \
+            .execution_options(synchronize_session=False)
+        if not self.current_user.is_admin:
+            stmt = stmt.where(Post.user_id == self.current_user.id)
+        returning = self.db.bind.dialect.update_returning
 
         try:
-            self.db.commit()
-            self.db.refresh(post)
+            result = await self.db.execute(stmt.returning(Post) if returning else stmt)
+            post = result.scalars().first() if returning else None
+            updated = post is not None if returning else result.rowcount > 0
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Failed to update post")
+        if not updated:
+            # 没有更新任何行：区分帖子不存在（404）与无权修改（403）
+            self.check_post_owner_or_admin(await self.get_post(post_id))
 
+        search_index.index_post(post_id, title, content)
+        await bump_generation(post_list_namespace())
+        if post is None:
+            return await self.get_post(post_id)
+        # 作者通常就是当前用户；管理员编辑他人帖子时才需另查作者
+        author = self.current_user if post.user_id == self.current_user.id else await self.db.get(User, post.user_id)
+        set_committed_value(post, "author", author)
         return post
 
-    def delete_post(self, post_id: int):
-        post = self.get_post(post_id)
+    async def delete_post(self, post_id: int):
+        """Hide the post at once; its comments are purged in batches by the deletion purger"""
+        post = await self.get_post(post_id)
         self.check_post_owner_or_admin(post)
+        # 只写入删除任务作为墓碑，不在请求内加载并逐行删除整帖评论
+        job = DeletionJob(post_id=post_id, total=post.comment_count or 0)
 
         try:
-            self.db.delete(post)
-            self.db.commit()
+            self.db.add(job)
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Failed to delete post")
+
+        # 帖子详情与评论页的缓存键带版本号，删除后先查版本即返回 404，无需清理；
+        # 评论的搜索文档与缓存随批次清除
+        search_index.remove_post(post_id)
+        await bump_generation(post_list_namespace())
+        await deletion_purger.submit(job)
@@ -0,0 +1,308 @@
+# app/services/search_index.py
+
+import asyncio
+import heapq
+import logging
+import os
+import pickle
+import re
+import sys
+import unicodedata
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from math import log
+from operator import itemgetter
+
+from sqlalchemy import func, select
+
+from app.database import async_engine
+from app.models.comment import Comment
+from app.models.post import Post
+
+logger = logging.getLogger(__name__)
+
+# 快照路径（留空则不落盘，每次启动从数据库重建）与定时快照间隔（秒）
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.pkl")
+SEARCH_SNAPSHOT_INTERVAL = float(os.getenv("SEARCH_SNAPSHOT_INTERVAL", "300"))
+# 已删除文档占比超过该值时压缩倒排表
+SEARCH_COMPACT_RATIO = float(os.getenv("SEARCH_COMPACT_RATIO", "0.2"))
+REBUILD_BATCH_SIZE = 5000
+
+POST, COMMENT = 0, 1
+KINDS = {"post": POST, "comment": COMMENT}
+KIND_NAMES = {value: name for name, value in KINDS.items()}
+# 标题词频计两次，命中标题的帖子排名靠前
+TITLE_WEIGHT = 2
+SNAPSHOT_VERSION = 2
+
+# 中日韩文字按二元组切分，其余按字母数字连续串切分
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+TOKEN_RE = re.compile(f"[{CJK}]+|[^\\W_{CJK}]+")
+CJK_RE = re.compile(f"[{CJK}]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased alphanumeric words plus overlapping bigrams of CJK runs"""
+    tokens = []
+    for run in TOKEN_RE.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if len(run) > 1 and CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class SearchIndex:
+    """In-memory inverted index over posts and comments with BM25 ranking.
+
+    Documents get sequential numbers; a posting list is one flat array of
+    interleaved (doc number, term frequency) pairs. Updates append a new document and
+    tombstone the old one by zeroing its length; tombstones are skipped at
+    query time and dropped by :meth:`compact`.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.taken_at = None
+        self.dirty = False
+        self._task = None
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}  # term -> array("I")：文档号与词频交替存放，每个词只占一个对象
+        self._doc_len = array("I")  # 0 表示已删除
+        self._kinds = array("B")
+        self._ids = array("I")
+        self._post_ids = array("I")
+        self._docnos = {}  # id * 2 + kind -> 文档号
+        self.total_len = 0
+        self.dead = 0
+
+    @property
+    def live(self) -> int:
+        return len(self._docnos)
+
+    def _add(self, kind: int, doc_id: int, post_id: int, tokens: list[str]):
+        self._remove(kind, doc_id)
+        if not tokens:
+            return
+        docno = len(self._doc_len)
+        for term, tf in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = array("I")
+            postings.append(docno)
+            postings.append(tf)
+        self._doc_len.append(len(tokens))
+        self._kinds.append(kind)
+        self._ids.append(doc_id)
+        self._post_ids.append(post_id)
+        self._docnos[doc_id * 2 + kind] = docno
+        self.total_len += len(tokens)
+        self.dirty = True
+
+    def _remove(self, kind: int, doc_id: int):
+        docno = self._docnos.pop(doc_id * 2 + kind, None)
+        if docno is None:
+            return
+        self.total_len -= self._doc_len[docno]
+        self._doc_len[docno] = 0
+        self.dead += 1
+        self.dirty = True
+
+    def index_post(self, post_id: int, title: str, content: str):
+        self._add(POST, post_id, post_id, tokenize(title) * TITLE_WEIGHT + tokenize(content))
+
+    def index_comment(self, comment_id: int, post_id: int, content: str):
+        self._add(COMMENT, comment_id, post_id, tokenize(content))
+
+    def remove_post(self, post_id: int, comment_ids=()):
+        self._remove(POST, post_id)
+        for comment_id in comment_ids:
+            self._remove(COMMENT, comment_id)
+
+    def remove_comment(self, comment_id: int):
+        self._remove(COMMENT, comment_id)
+
+    def search(self, query: str, kind: str | None = None, offset: int = 0,
+               limit: int = 20) -> tuple[int, list[tuple[str, int, int, float]]]:
+        """Total matches and ranked ``(kind, id, post_id, score)`` hits; terms are OR-ed"""
+        if not self.live:
+            return 0, []
+        wanted = KINDS[kind] if kind else None
+        n, avgdl = self.live, self.total_len / self.live
+        k1, norm_b, doc_len, kinds = self.k1, self.b / avgdl, self._doc_len, self._kinds
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            # 文档频率包含尚未压缩的已删除文档，压缩前略有偏差
+            df = len(postings) // 2
+            idf = log(1 + (n - df + 0.5) / (df + 0.5))
+            entries = iter(postings)
+            for docno, tf in zip(entries, entries):
+                dl = doc_len[docno]
+                if not dl or (wanted is not None and kinds[docno] != wanted):
+                    continue
+                score = idf * tf * (k1 + 1) / (tf + k1 * (1 - self.b + norm_b * dl))
+                scores[docno] = scores.get(docno, 0.0) + score
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=itemgetter(1))[offset:]
+        return len(scores), [
+            (KIND_NAMES[kinds[docno]], self._ids[docno], self._post_ids[docno], score) for docno, score in top
+        ]
+
+    def needs_compaction(self) -> bool:
+        return self.dead > max(1000, (self.live + self.dead) * SEARCH_COMPACT_RATIO)
+
+    def compact(self):
+        """Renumber live documents and drop tombstoned postings"""
+        renumber = array("i", [-1]) * len(self._doc_len)
+        doc_len, kinds, ids, post_ids = array("I"), array("B"), array("I"), array("I")
+        for docno, dl in enumerate(self._doc_len):
+            if dl:
+                renumber[docno] = len(doc_len)
+                doc_len.append(dl)
+                kinds.append(self._kinds[docno])
+                ids.append(self._ids[docno])
+                post_ids.append(self._post_ids[docno])
+
+        postings = {}
+        for term, entries in self._postings.items():
+            kept = array("I")
+            entries = iter(entries)
+            for docno, tf in zip(entries, entries):
+                if renumber[docno] >= 0:
+                    kept.append(renumber[docno])
+                    kept.append(tf)
+            if kept:
+                postings[term] = kept
+
+        self._postings, self._doc_len, self._kinds, self._ids, self._post_ids = \
+            postings, doc_len, kinds, ids, post_ids
+        self._docnos = {key: renumber[docno] for key, docno in self._docnos.items()}
+        self.dead = 0
+        self.dirty = True
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the index structures"""
+        size = sum(sys.getsizeof(a) for a in (self._doc_len, self._kinds, self._ids, self._post_ids))
+        size += sys.getsizeof(self._postings) + sys.getsizeof(self._docnos)
+        # 文档号映射中的整数键值（小整数为共享对象，此处按上限估算）
+        size += len(self._docnos) * 2 * sys.getsizeof(2 ** 40)
+        for term, postings in self._postings.items():
+            size += sys.getsizeof(term) + sys.getsizeof(postings)
+        return size
+
+    def stats(self) -> dict:
+        return {"documents": self.live, "tombstones": self.dead, "terms": len(self._postings),
+                "snapshot_taken_at": self.taken_at}
+
+    # 快照与重建
+
+    def _state(self) -> dict:
+        return {
+            "version": SNAPSHOT_VERSION, "taken_at": self.taken_at,
+            "postings": self._postings, "doc_len": self._doc_len, "kinds": self._kinds, "ids": self._ids,
+            "post_ids": self._post_ids, "docnos": self._docnos, "total_len": self.total_len, "dead": self.dead,
+        }
+
+    async def save(self, path: str = SEARCH_INDEX_PATH):
+        """Write a snapshot atomically; serialization runs on the loop, disk IO off it"""
+        if not path:
+            return
+        self.taken_at = datetime.now()
+        payload = pickle.dumps(self._state(), protocol=pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+        def write():
+            with open(path + ".tmp", "wb") as f:
+                f.write(payload)
+            os.replace(path + ".tmp", path)
+
+        await asyncio.to_thread(write)
+
+    def load(self, path: str = SEARCH_INDEX_PATH) -> bool:
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            logger.exception("Ignoring unreadable search index snapshot %s", path)
+            return False
+        if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+            logger.warning("Ignoring search index snapshot %s with an unknown format", path)
+            return False
+        self.taken_at = state["taken_at"]
+        self._postings, self._doc_len, self._kinds = state["postings"], state["doc_len"], state["kinds"]
+        self._ids, self._post_ids, self._docnos = state["ids"], state["post_ids"], state["docnos"]
+        self.total_len, self.dead = state["total_len"], state["dead"]
+        self.dirty = False
+        return True
+
+    async def index_rows(self, since: datetime | None = None):
+        """Stream posts and comments from the database into the index.
+
+        With ``since`` only rows created or edited after that time are
+        indexed; this catches up a snapshot written before a crash. Deleted
+        rows are dropped when results are hydrated.
+        """
+        posts = select(Post.id, Post.title, Post.content)
+        comments = select(Comment.id, Comment.post_id, Comment.content)
+        if since is not None:
+            posts = posts.filter(func.coalesce(Post.updated_at, Post.created_at) >= since)
+            # 评论没有 updated_at，快照之后编辑过的评论需通过重建更新
+            comments = comments.filter(Comment.created_at >= since)
+
+        async with async_engine.connect() as conn:
+            result = await conn.stream(posts.execution_options(yield_per=REBUILD_BATCH_SIZE))
+            async for rows in result.partitions():
+                for row in rows:
+                    self.index_post(row.id, row.title, row.content)
+            result = await conn.stream(comments.execution_options(yield_per=REBUILD_BATCH_SIZE))
+            async for rows in result.partitions():
+                for row in rows:
+                    self.index_comment(row.id, row.post_id, row.content)
+
+    async def rebuild(self):
+        self._reset()
+        await self.index_rows()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SEARCH_SNAPSHOT_INTERVAL)
+            try:
+                if self.needs_compaction():
+                    self.compact()
+                if self.dirty:
+                    await self.save()
+            except Exception:
+                logger.exception("Failed to snapshot the search index")
+
+    async def start(self):
+        """Load the snapshot (catching up on newer rows) or rebuild, then snapshot periodically"""
+        if self.load():
+            # 留出余量，覆盖快照前后仍在提交的写入
+            await self.index_rows(since=self.taken_at - timedelta(minutes=1))
+        else:
+            await self.rebuild()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.dirty:
+            await self.save()
+
+
+search_index = SearchIndex()
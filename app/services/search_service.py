@@ -0,0 +1,56 @@
+# app/services/search_service.py
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.comment import Comment
+from app.models.post import Post
+from app.schemas.search import SearchHit, SearchResults
+from app.services.deletion_purger import comment_visible, post_visible
+from app.services.search_index import search_index, tokenize
+
+SNIPPET_LENGTH = 120
+
+
+def make_snippet(text: str, query: str) -> str:
+    """Window of ``text`` around the first query term it contains"""
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in tokenize(query)]
+    start = min((p for p in positions if p >= 0), default=0)
+    start = max(0, start - SNIPPET_LENGTH // 4)
+    snippet = text[start:start + SNIPPET_LENGTH]
+    return ("…" if start else "") + snippet + ("…" if start + SNIPPET_LENGTH < len(text) else "")
+
+
+class SearchService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def search(self, query: str, kind: str | None, offset: int, limit: int) -> SearchResults:
+        total, hits = search_index.search(query, kind, offset, limit)
+
+        # 每种类型一次查询补全标题与正文；索引中尚未移除的已删除（或待清除）行直接跳过
+        comment_ids = [doc_id for hit_kind, doc_id, _, _ in hits if hit_kind == "comment"]
+        post_ids = {post_id for _, _, post_id, _ in hits}
+        comments = {}
+        if comment_ids:
+            result = await self.db.execute(
+                select(Comment.id, Comment.content).filter(Comment.id.in_(comment_ids), comment_visible())
+            )
+            comments = dict(result.all())
+        posts = {}
+        if post_ids:
+            result = await self.db.execute(
+                select(Post.id, Post.title, Post.content).filter(Post.id.in_(post_ids), post_visible())
+            )
+            posts = {row.id: row for row in result}
+
+        items = []
+        for hit_kind, doc_id, post_id, score in hits:
+            post = posts.get(post_id)
+            text = post.content if hit_kind == "post" and post else comments.get(doc_id)
+            if post is None or text is None:
+                continue
+            items.append(SearchHit(type=hit_kind, id=doc_id, post_id=post_id, score=round(score, 4),
+                                   title=post.title, snippet=make_snippet(text, query)))
+        return SearchResults(items=items, total=total)
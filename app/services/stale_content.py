@@ -0,0 +1,140 @@
+# app/services/stale_content.py
+
+import asyncio
+import logging
+import os
+
+from sqlalchemy import bindparam, select, update
+
+from app.database import async_engine
+from app.models.comment import Comment
+from app.models.post import Post
+from app.utils.cache import bump_generation, cache, comment_key, post_list_namespace
+from app.utils.markdown import RENDERER_VERSION, render
+
+logger = logging.getLogger(__name__)
+
+# 后台重新渲染的间隔（秒）与排队上限；超出上限的行下次读取时再排队
+STALE_CONTENT_INTERVAL = float(os.getenv("STALE_CONTENT_INTERVAL", "5"))
+STALE_CONTENT_MAX_PENDING = int(os.getenv("STALE_CONTENT_MAX_PENDING", "1000"))
+TABLES = {"posts": Post.__table__, "comments": Comment.__table__}
+
+
+def stale_columns(table) -> list:
+    """(id, content), plus post_id for comments: what re-rendering a row needs"""
+    columns = [table.c.id, table.c.content]
+    if table is Comment.__table__:
+        columns.append(table.c.post_id)
+    return columns
+
+
+def render_params(rows) -> list[dict]:
+    """Update parameters for rows of stale_columns, for rerendered_update"""
+    params = []
+    for row in rows:
+        rendered = render(row[1])
+        params.append({"b_id": row[0], "b_html": rendered.html, "b_mentions": rendered.mentions,
+                       "b_links": rendered.links})
+    return params
+
+
+def rerendered_update(table):
+    """Write one re-rendered row unless it was edited (and so rendered) in the meantime.
+
+    Posts also bump ``version`` so their ETag and cache key change; comments
+    need comments_version_update for the posts they belong to.
+    """
+    values = dict(content_html=bindparam("b_html"), mentions=bindparam("b_mentions"), links=bindparam("b_links"),
+                  render_version=RENDERER_VERSION)
+    if table is Post.__table__:
+        # 保留 updated_at，重新渲染不算作内容更新
+        values.update(version=table.c.version + 1, updated_at=table.c.updated_at)
+    return update(table) \
+        .where(table.c.id == bindparam("b_id"), table.c.render_version != RENDERER_VERSION) \
+        .values(**values)
+
+
+def comments_version_update(post_ids):
+    posts = Post.__table__
+    return update(posts).where(posts.c.id.in_(list(post_ids))) \
+        .values(comments_version=posts.c.comments_version + 1, updated_at=posts.c.updated_at)
+
+
+class StaleContent:
+    """Re-renders rows stored by an older renderer version in the background and writes them back.
+
+    Reads serve such rows as escaped source (see RenderedContent) and queue
+    them here, so a renderer bump costs no Markdown rendering on the request
+    path and each row is rendered once, not on every read.
+    """
+
+    def __init__(self, interval: float = STALE_CONTENT_INTERVAL, max_pending: int = STALE_CONTENT_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {name: set() for name in TABLES}
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def defer(self, table: str, row_id: int):
+        pending = self._pending[table]
+        if row_id in pending or sum(map(len, self._pending.values())) >= self.max_pending:
+            return
+        pending.add(row_id)
+
+    async def flush(self) -> int:
+        """Render and write back the queued rows; returns the number written"""
+        async with self._lock:
+            written = 0
+            for name, table in TABLES.items():
+                if not self._pending[name]:
+                    continue
+                ids, self._pending[name] = self._pending[name], set()
+                try:
+                    written += await self._rerender(table, ids)
+                except Exception:
+                    # 不放回队列：这些行仍以转义原文返回，下次读取时重新排队
+                    logger.exception("Failed to re-render %d stale %s", len(ids), name)
+            return written
+
+    async def _rerender(self, table, ids: set[int]) -> int:
+        async with async_engine.connect() as conn:
+            rows = (await conn.execute(
+                select(*stale_columns(table))
+                .where(table.c.id.in_(list(ids)), table.c.render_version != RENDERER_VERSION)
+            )).all()
+        if not rows:
+            return 0
+        # 渲染是纯 CPU 计算，放到线程中执行，不阻塞事件循环
+        params = await asyncio.get_running_loop().run_in_executor(None, render_params, rows)
+        async with async_engine.begin() as conn:
+            written = (await conn.execute(rerendered_update(table), params)).rowcount
+            if table is Comment.__table__:
+                await conn.execute(comments_version_update({row[2] for row in rows}))
+        # 帖子详情与评论页的键随版本号变化；单条评论与帖子列表的缓存需主动失效
+        if table is Comment.__table__:
+            await cache.delete(*(comment_key(row[0]) for row in rows))
+        else:
+            await bump_generation(post_list_namespace())
+        return written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic re-render; rows still queued are picked up again when next read"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+stale_content = StaleContent()
@@ -1,26 +1,60 @@
 # app/services/user_service.py
 
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
 from app.models.user import User
-from app.schemas.user import UserCreate
-from app.utils.security import get_password_hash, verify_password
+from app.models.user_stats import UserStats
+from app.schemas.user import UserCreate, UserProfile
+from app.services.post_service import PostService, post_from_row
+from app.utils.security import password_hasher
 
 
 class UserService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_by_username_or_email(self, identifier: str) -> User | None:
-        return self.db.query(User).filter(
+    async def get_user(self, user_id: int) -> User | None:
+        result = await self.db.execute(
+            select(User)
+            .filter(User.id == user_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+
+    async def get_profile(self, user_id: int, cursor: str | None, limit: int) -> UserProfile:
+        """Profile from the precomputed user_stats row plus a keyset page of the user's posts: two queries"""
+        result = await self.db.execute(
+            select(User.id, User.username, User.email, User.is_active, User.created_at,
+                   UserStats.post_count, UserStats.comment_count, UserStats.view_count)
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .filter(User.id == user_id)
+        )
+        row = result.first()
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        rows, next_cursor = await PostService(self.db).list_user_posts(user_id, cursor, limit)
+        # 尚未发帖或评论的用户没有统计行
+        return UserProfile.model_validate({
+            "id": row.id, "username": row.username, "email": row.email, "is_active": row.is_active,
+            "created_at": row.created_at,
+            "stats": {"post_count": row.post_count or 0, "comment_count": row.comment_count or 0,
+                      "view_count": row.view_count or 0},
+            "posts": [post_from_row(post) for post in rows], "next_cursor": next_cursor,
+        })
+
+    async def get_by_username_or_email(self, identifier: str) -> User | None:
+        result = await self.db.execute(select(User).filter(
             (User.username == identifier) | (User.email == identifier)
-        ).first()
+        ))
+        return result.scalars().first()
 
-    def register_user(self, user_data: UserCreate) -> User:
-        if self.get_by_username_or_email(user_data.username) or \
-                self.get_by_username_or_email(str(user_data.email)):
+    async def register_user(self, user_data: UserCreate) -> User:
+        if await self.get_by_username_or_email(user_data.username) or \
+                await self.get_by_username_or_email(str(user_data.email)):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Username or email already exists"
@@ -29,26 +63,27 @@ class UserService:
         new_user = User(
             username=user_data.username,
             email=str(user_data.email),
-            password_hash=get_password_hash(user_data.password)
+            password_hash=await password_hasher.hash(user_data.password)
         )
 
         try:
             self.db.add(new_user)
-            self.db.commit()
-            self.db.refresh(new_user)
+            await self.db.commit()
         except Exception:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create user"
             )
 
-        return new_user
+        return await self.get_user(new_user.id)
 
-    def authenticate_user(self, username_or_email: str, password: str) -> User:
-        user = self.get_by_username_or_email(username_or_email)
+    async def authenticate_user(self, username_or_email: str, password: str) -> User:
+        user = await self.get_by_username_or_email(username_or_email)
 
-        if not user or not verify_password(password, user.password_hash):
+        valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash) \
+            if user else (False, None)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials",
@@ -61,7 +96,10 @@ class UserService:
                 detail="User account is disabled"
             )
 
+        # 哈希参数（如 BCRYPT_ROUNDS）变化后，借登录时的明文重新计算
+        if new_hash:
+            user.password_hash = new_hash
         user.last_login = datetime.now()
-        self.db.commit()
+        await self.db.commit()
 
         return user
@@ -0,0 +1,33 @@
+# app/services/user_stats.py
+
+from collections import Counter
+
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.models.user_stats import UserStats
+
+STAT_COLUMNS = ("post_count", "comment_count", "view_count")
+
+
+def user_stats_update(dialect):
+    """Upsert adding each parameter set's counts to a user's stats row, creating it on first use;
+    runs with one or many parameter sets (see :func:`stats_delta`)"""
+    table = UserStats.__table__
+    if dialect.name == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in STAT_COLUMNS})
+    stmt = (postgresql if dialect.name == "postgresql" else sqlite).insert(table)
+    return stmt.on_conflict_do_update(index_elements=[table.c.user_id],
+                                      set_={name: table.c[name] + stmt.excluded[name] for name in STAT_COLUMNS})
+
+
+def stats_delta(user_id: int, posts: int = 0, comments: int = 0, views: int = 0) -> dict:
+    return {"user_id": user_id, "post_count": posts, "comment_count": comments, "view_count": views}
+
+
+def stats_deltas(posts: Counter = None, comments: Counter = None, views: Counter = None) -> list[dict]:
+    """Parameter sets for :func:`user_stats_update` from per-user counters, one per user"""
+    posts, comments, views = posts or Counter(), comments or Counter(), views or Counter()
+    # 按 user_id 顺序写入，并发的批次加锁顺序一致，避免死锁
+    return [stats_delta(user_id, posts[user_id], comments[user_id], views[user_id])
+            for user_id in sorted(posts.keys() | comments.keys() | views.keys())]
@@ -0,0 +1,111 @@
+# app/services/view_counter.py
+
+import asyncio
+import contextvars
+import logging
+import os
+from collections import Counter, defaultdict
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.database import async_engine
+from app.models.post import Post
+from app.services.user_stats import stats_deltas, user_stats_update
+
+logger = logging.getLogger(__name__)
+
+# 刷新间隔（秒）与待刷新计数上限：进程崩溃时最多丢失 VIEW_COUNT_MAX_PENDING 次浏览
+VIEW_COUNT_FLUSH_INTERVAL = float(os.getenv("VIEW_COUNT_FLUSH_INTERVAL", "5"))
+VIEW_COUNT_MAX_PENDING = int(os.getenv("VIEW_COUNT_MAX_PENDING", "1000"))
+
+
+class ViewCounter:
+    """Buffers post view increments in memory and writes them back in batches"""
+
+    def __init__(self, flush_interval: float = VIEW_COUNT_FLUSH_INTERVAL,
+                 max_pending: int = VIEW_COUNT_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = defaultdict(int)
+        self._pending_total = 0
+        # 正在写入的一批：提交之前仍计入 current()，显示的浏览量不会短暂回退
+        self._flushing = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._early_flush = None
+
+    def increment(self, post_id: int, count: int = 1):
+        self._pending[post_id] += count
+        self._pending_total += count
+        # 超过上限时立即刷新，限制崩溃时的丢失量。任务不继承请求的上下文，
+        # 否则刷新的语句会计入触发它的请求（SQL 计数、查询预算）
+        if self._pending_total >= self.max_pending and not self._early_flush:
+            self._early_flush = asyncio.get_running_loop().create_task(self.flush(), context=contextvars.Context())
+
+    def pending(self, post_id: int) -> int:
+        return self._pending.get(post_id, 0) + self._flushing.get(post_id, 0)
+
+    def current(self, post_id: int, persisted: int | None) -> int:
+        """Persisted count plus the not-yet-flushed delta"""
+        return (persisted or 0) + self.pending(post_id)
+
+    async def flush(self):
+        async with self._lock:
+            self._early_flush = None
+            if not self._pending:
+                return
+            # 先交换缓冲区，刷新期间的新增计数进入下一批
+            batch, self._pending = self._pending, defaultdict(int)
+            self._pending_total = 0
+            self._flushing = batch
+
+            # 保留 updated_at，浏览不算作内容更新
+            posts = Post.__table__
+            stmt = update(posts) \
+                .where(posts.c.id == bindparam("post_id")) \
+                .values(view_count=func.coalesce(posts.c.view_count, 0) + bindparam("delta"),
+                        updated_at=posts.c.updated_at)
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(stmt, [
+                        {"post_id": post_id, "delta": delta} for post_id, delta in batch.items()
+                    ])
+                    # 同一事务内把浏览量累加到各帖作者的统计上，已删除的帖子不计
+                    result = await conn.execute(select(posts.c.id, posts.c.user_id)
+                                                .where(posts.c.id.in_(list(batch))))
+                    views = Counter()
+                    for post_id, user_id in result.all():
+                        views[user_id] += batch[post_id]
+                    if views:
+                        await conn.execute(user_stats_update(conn.dialect), stats_deltas(views=views))
+            except Exception:
+                logger.exception("Failed to flush %d buffered post views", sum(batch.values()))
+                # 放回缓冲区，等待下一次刷新
+                for post_id, delta in batch.items():
+                    self._pending[post_id] += delta
+                self._pending_total += sum(batch.values())
+            finally:
+                self._flushing = {}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write out whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+view_counter = ViewCounter()
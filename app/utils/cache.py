@@ -0,0 +1,230 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app.utils.markdown import RENDERER_VERSION
+from app.utils.single_flight import SINGLE_FLIGHT_TIMEOUT, single_flight
+
+# 缓存配置：CACHE_BACKEND 可选 memory / redis / fakeredis / none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class CacheBackend:
+    """Byte-string key/value store with per-entry TTL"""
+
+    def __init__(self):
+        self.evictions = 0
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: int | None = None):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"evictions": self.evictions}
+
+
+class NullCache(CacheBackend):
+    """Disables caching: every read is a miss"""
+
+    async def get(self, key: str) -> bytes | None:
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: int | None = None):
+        pass
+
+    async def delete(self, *keys: str):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU with TTL, bounded by the total size of keys and values"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: int | None = None):
+        if key in self._entries:
+            self._remove(key)
+        cost = len(key) + len(value)
+        if cost > self.max_bytes:
+            return
+        while self.size + cost > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self.size += cost
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.size -= len(key) + len(value)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class RedisCache(CacheBackend):
+    """Backend over any client exposing redis.asyncio's get / set(ex=) / delete"""
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int | None = None):
+        await self.client.set(key, value, ex=ttl)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+
+class FakeRedis:
+    """Local stand-in for a redis.asyncio client (get / set / delete only)"""
+
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, key: str) -> bytes | None:
+        value, expires_at = self._data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ex: int | None = None):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+def create_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    if name == "memory":
+        return MemoryCache()
+    if name == "redis":
+        import redis.asyncio  # 可选依赖，仅在启用 Redis 时需要
+
+        return RedisCache(redis.asyncio.from_url(REDIS_URL))
+    if name == "fakeredis":
+        return RedisCache(FakeRedis())
+    if name == "none":
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {name}")
+
+
+cache = create_backend()
+# 读穿命中统计（不含列表版本号的读取）
+counters = {"hits": 0, "misses": 0}
+
+
+def cache_stats() -> dict:
+    return {**counters, **cache.stats()}
+
+
+async def read_through(key: str, model: Type[Model], load: Callable[[], Awaitable[Model]],
+                       timeout: float = SINGLE_FLIGHT_TIMEOUT) -> Model:
+    """Return the cached payload for ``key``, or ``load()`` it and cache the serialized result.
+
+    Concurrent misses on the same key share one ``load()`` (see single_flight),
+    also when caching is disabled.
+    """
+    raw = await cache.get(key)
+    if raw is not None:
+        counters["hits"] += 1
+        return model.model_validate_json(raw)
+    counters["misses"] += 1
+
+    async def fill():
+        value = await load()
+        await cache.set(key, value.model_dump_json().encode(), CACHE_TTL)
+        return value
+
+    return await single_flight.do(key, fill, timeout)
+
+
+# 帖子列表页通过命名空间版本号整体失效：版本号变化后旧键不再被访问，随 TTL / LRU 淘汰。
+# 不缓存时版本号保存在进程内，列表键保持稳定，并发未命中仍可合并为一次加载
+local_generations: dict[str, str] = {}
+
+
+async def generation(namespace: str) -> str:
+    if isinstance(cache, NullCache):
+        return local_generations.setdefault(namespace, uuid.uuid4().hex[:12])
+    key = f"gen:{namespace}"
+    value = await cache.get(key)
+    if value is None:
+        # 版本号被淘汰时生成新值，避免命中旧版本的条目
+        value = uuid.uuid4().hex[:12].encode()
+        await cache.set(key, value)
+    return value.decode()
+
+
+async def bump_generation(*namespaces: str):
+    for namespace in namespaces:
+        if isinstance(cache, NullCache):
+            # 写入之后的读取不再并入写入之前开始的加载
+            local_generations[namespace] = uuid.uuid4().hex[:12]
+        else:
+            await cache.set(f"gen:{namespace}", uuid.uuid4().hex[:12].encode())
+
+
+def post_key(post_id: int, version: int, comments_version: int) -> str:
+    # 键中带版本号：编辑或评论变动后自然换键，旧条目随 TTL / LRU 淘汰；
+    # 载荷含渲染后的正文，渲染器版本升级后同样换键
+    return f"post:{post_id}:{version}.{comments_version}:r{RENDERER_VERSION}"
+
+
+def comment_key(comment_id: int) -> str:
+    return f"comment:{comment_id}:r{RENDERER_VERSION}"
+
+
+def post_list_namespace() -> str:
+    return "posts"
+
+
+def principal_namespace(user_id: int) -> str:
+    # 用户的鉴权缓存版本号，权限变更时递增；后端为 redis 时各进程共享
+    return f"principal:{user_id}"
+
+
+async def post_list_key(cursor: str | None, limit: int, pinned_first: bool, sort: str = "new") -> str:
+    return (f"posts:{await generation(post_list_namespace())}:r{RENDERER_VERSION}:{sort}:{int(pinned_first)}:{limit}:"
+            f"{cursor or ''}")
+
+
+def comment_list_key(post_id: int, comments_version: int, cursor: str | None, limit: int) -> str:
+    return f"comments:{post_id}:{comments_version}:r{RENDERER_VERSION}:{limit}:{cursor or ''}"
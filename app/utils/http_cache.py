@@ -0,0 +1,29 @@
+import os
+
+from fastapi import Request, Response, status
+
+# 匿名读取的缓存策略：帖子详情每次回源校验（以便统计浏览量），评论页可由 CDN 短时缓存
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "5"))
+HTTP_STALE_WHILE_REVALIDATE = int(os.getenv("HTTP_STALE_WHILE_REVALIDATE", "30"))
+REVALIDATE = "public, no-cache"
+SHORT_LIVED = f"public, max-age={HTTP_CACHE_MAX_AGE}, stale-while-revalidate={HTTP_STALE_WHILE_REVALIDATE}"
+
+
+def weak_etag(*parts) -> str:
+    """Weak validator: the body may differ in live counters (e.g. view_count) between equal tags"""
+    return 'W/"' + ".".join(map(str, parts)) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison against If-None-Match, as RFC 9110 prescribes for GET"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,193 @@
+"""
+Markdown subset to HTML for post and comment bodies.
+
+Raw HTML in the source is always escaped and only the tags below are emitted,
+so the output needs no separate sanitizing pass: paragraphs and line breaks,
+headings, block quotes, flat lists, horizontal rules, fenced and inline code,
+bold, italics, strikethrough, links (http, https, mailto and site-relative
+only) and @mentions. Bump RENDERER_VERSION whenever the output for the same
+source changes: rows rendered by an older version are served as escaped
+source and re-rendered in the background (app.services.stale_content), or
+all at once by ``python -m app.commands.rerender_content``.
+"""
+import html
+import re
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+RENDERER_VERSION = 3
+# 引用嵌套超过此深度的行按普通段落处理，避免恶意输入触发深递归
+MAX_QUOTE_DEPTH = 8
+ALLOWED_SCHEMES = ("http", "https", "mailto")
+
+FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([\w+#-]*)")
+HEADING = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+QUOTE = re.compile(r"^ {0,3}&gt; ?")
+BULLET = re.compile(r"^ {0,3}[-*+]\s+(.*)$")
+ORDERED = re.compile(r"^ {0,3}(\d{1,9})[.)]\s+(.*)$")
+RULE = re.compile(r"^ {0,3}([-*_])(?:\s*\1){2,}\s*$")
+
+# 行内标记的内容限长且不跨行：未闭合的标记只向后试探有限长度，避免恶意输入触发平方级回溯
+CODE_SPAN = re.compile(r"(`+)([^\n]{1,500}?)\1")
+LINK = re.compile(r"\[([^\]\n]{1,500})\]\(([^)\s]{1,2000})\)")
+# 转义后的引号与尖括号不属于 URL
+AUTOLINK = re.compile(r"\bhttps?://(?:(?!&quot;|&#x27;|&lt;|&gt;)[^\s\x00]){1,2000}")
+MENTION = re.compile(r"(?<![\w@/])@(\w{3,50})")
+STRONG = re.compile(r"(\*\*|__)(?=\S)([^<\n]{1,500}?)(?<=\S)\1")
+EMPHASIS = re.compile(r"(?<![\w*])([*_])(?=\S)([^<\n]{1,500}?)(?<=\S)\1(?![\w*])")
+STRIKE = re.compile(r"~~(?=\S)([^<\n]{1,500}?)(?<=\S)~~")
+PLACEHOLDER = re.compile("\x00(\\d+)\x00")
+
+
+class Rendered(NamedTuple):
+    html: str
+    mentions: list[str]  # 按首次出现顺序去重的用户名
+    links: list[str]  # 同上，为原文中的 URL
+
+
+def safe_link(target: str) -> bool:
+    """Whether ``target`` (unescaped) may become an href: a whitelisted scheme or a path on this site"""
+    # 浏览器把反斜杠当作斜杠，/\evil.com 会被解析为协议相对地址 //evil.com
+    if "\\" in target:
+        return False
+    try:
+        parts = urlsplit(target)
+    except ValueError:
+        return False
+    if parts.scheme:
+        return parts.scheme.lower() in ALLOWED_SCHEMES and (bool(parts.netloc) or parts.scheme.lower() == "mailto")
+    return not parts.netloc and target.startswith("/")
+
+
+class _Inline:
+    """Inline markup of one render; code and links are swapped out for placeholders so no other rule touches them"""
+
+    def __init__(self):
+        self.fragments = []
+        self.mentions = {}
+        self.links = {}
+
+    def hold(self, fragment: str) -> str:
+        self.fragments.append(fragment)
+        return f"\x00{len(self.fragments) - 1}\x00"
+
+    def link(self, url: str, label: str) -> str:
+        # url 与 label 均已转义；不在白名单内的协议（javascript: 等）只保留文字
+        target = html.unescape(url)
+        if not safe_link(target):
+            return label
+        self.links.setdefault(target)
+        return self.hold(f'<a href="{url}" rel="nofollow ugc noopener">{label}</a>')
+
+    def autolink(self, match) -> str:
+        # 句末标点与未配对的右括号不算 URL 的一部分
+        url = match[0].rstrip(".,;:!?]")
+        while url.endswith(")") and url.count(")") > url.count("("):
+            url = url[:-1].rstrip(".,;:!?]")
+        return self.link(url, url) + match[0][len(url):]
+
+    def mention(self, match) -> str:
+        self.mentions.setdefault(match[1])
+        return self.hold(f'<span class="mention" data-username="{match[1]}">@{match[1]}</span>')
+
+    def render(self, escaped: str) -> str:
+        text = CODE_SPAN.sub(lambda m: self.hold(f"<code>{m[2].strip()}</code>"), escaped)
+        text = LINK.sub(lambda m: self.link(m[2], self.render(m[1])), text)
+        text = AUTOLINK.sub(self.autolink, text)
+        text = MENTION.sub(self.mention, text)
+        text = STRONG.sub(r"<strong>\2</strong>", text)
+        text = EMPHASIS.sub(r"<em>\2</em>", text)
+        text = STRIKE.sub(r"<del>\1</del>", text)
+        return text.replace("\n", "<br>\n")
+
+    def restore(self, text: str) -> str:
+        # 占位内容可以嵌套占位（链接文字中的代码），逐层还原
+        while "\x00" in text:
+            text = PLACEHOLDER.sub(lambda m: self.fragments[int(m[1])], text)
+        return text
+
+
+def _blocks(lines: list[str], inline: _Inline, depth: int) -> list[str]:
+    out, paragraph = [], []
+
+    def close_paragraph():
+        if paragraph:
+            out.append(f"<p>{inline.render(chr(10).join(paragraph))}</p>")
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        fence = FENCE.match(line)
+        if fence:
+            close_paragraph()
+            end = i + 1
+            while end < len(lines) and not lines[end].lstrip().startswith(fence[1]):
+                end += 1
+            language = f' class="language-{fence[2]}"' if fence[2] else ""
+            code = "\n".join(lines[i + 1:end])
+            out.append(f"<pre><code{language}>{inline.hold(code)}</code></pre>")
+            i = end + 1
+            continue
+        if not line.strip():
+            close_paragraph()
+        elif (heading := HEADING.match(line)):
+            close_paragraph()
+            level = len(heading[1])
+            out.append(f"<h{level}>{inline.render(heading[2])}</h{level}>")
+        elif RULE.match(line):
+            close_paragraph()
+            out.append("<hr>")
+        elif QUOTE.match(line) and depth < MAX_QUOTE_DEPTH:
+            close_paragraph()
+            quoted = []
+            while i < len(lines) and QUOTE.match(lines[i]):
+                quoted.append(QUOTE.sub("", lines[i], count=1))
+                i += 1
+            out.append(f"<blockquote>\n{chr(10).join(_blocks(quoted, inline, depth + 1))}\n</blockquote>")
+            continue
+        elif BULLET.match(line) or ORDERED.match(line):
+            close_paragraph()
+            pattern = BULLET if BULLET.match(line) else ORDERED
+            items = []
+            while i < len(lines) and lines[i].strip():
+                item = pattern.match(lines[i])
+                if item:
+                    items.append([item[item.lastindex]])
+                elif BULLET.match(lines[i]) or ORDERED.match(lines[i]):
+                    break
+                else:
+                    # 续行并入上一项
+                    items[-1].append(lines[i].strip())
+                i += 1
+            tag, start = ("ul", "") if pattern is BULLET else ("ol", ORDERED.match(line)[1])
+            start = f' start="{int(start)}"' if start and int(start) != 1 else ""
+            body = "\n".join(f"<li>{inline.render(chr(10).join(item))}</li>" for item in items)
+            out.append(f"<{tag}{start}>\n{body}\n</{tag}>")
+            continue
+        else:
+            paragraph.append(line)
+        i += 1
+    close_paragraph()
+    return out
+
+
+def render(source: str) -> Rendered:
+    """Render ``source`` to safe HTML, collecting the @mentioned usernames and the link targets"""
+    inline = _Inline()
+    lines = html.escape(source.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")).split("\n")
+    body = inline.restore("\n".join(_blocks(lines, inline, 0)))
+    return Rendered(body, list(inline.mentions), list(inline.links))
+
+
+def escaped(source: str) -> str:
+    """The source as one escaped paragraph, served in place of stale HTML until the row is re-rendered"""
+    body = html.escape(source.replace("\r\n", "\n").replace("\r", "\n")).replace("\n", "<br>\n")
+    return f"<p>{body}</p>"
+
+
+def rendered_columns(content: str) -> dict:
+    """Values of content_html, mentions, links and render_version to store alongside ``content``"""
+    rendered = render(content)
+    return {"content_html": rendered.html, "mentions": rendered.mentions, "links": rendered.links,
+            "render_version": RENDERER_VERSION}
@@ -0,0 +1,280 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+from sqlalchemy import AsyncAdaptedQueuePool, event
+
+from app.utils import query_budget
+from app.utils.query_budget import QUERY_BUDGET_MODE
+
+# 设为 false 时不挂载中间件与数据库事件，/metrics 仍可访问但只有连接池与哈希指标
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Server-Timing 会暴露服务端耗时分布，对外部署时可关闭
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._series = {}
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._series.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_labels(self.label_names, labels)} {value}" for labels, value in self._series.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # 各桶计数（最后一个为 +Inf）与总和
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """Value read at scrape time from ``collect()``, a number or a dict keyed by label tuples"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def samples(self) -> list[str]:
+        value = self.collect()
+        if value is None:
+            return []
+        values = value if isinstance(value, dict) else {(): value}
+        return [f"{self.name}{_labels(self.label_names, labels)} {v}" for labels, v in values.items()]
+
+
+registry: list[Metric] = []
+
+
+def register(metric: Metric) -> Metric:
+    registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+REQUEST_SECONDS = register(Histogram(
+    "forum_http_request_duration_seconds", "Time to the end of the response body", ("method", "route")))
+REQUESTS = register(Counter("forum_http_requests_total", "Responses sent", ("method", "route", "status")))
+REQUEST_DB_SECONDS = register(Histogram(
+    "forum_http_request_db_seconds", "Time spent in SQL statements per request", ("method", "route")))
+REQUEST_QUERIES = register(Counter("forum_db_queries_total", "SQL statements executed", ("method", "route")))
+POOL_WAIT_SECONDS = register(Histogram(
+    "forum_db_pool_checkout_seconds", "Time to obtain a pooled connection, including opening new ones"))
+BUDGET_EXCEEDED = register(Counter(
+    "forum_query_budget_exceeded_total", "Requests that ran more SQL statements than their route's budget",
+    ("method", "route")))
+PASSWORD_HASH_SECONDS = register(Histogram(
+    "forum_password_hash_seconds", "bcrypt time in the worker, excluding queueing", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)))
+SINGLE_FLIGHT = register(Counter(
+    "forum_single_flight_total", "Cache-miss loads by key kind: leader ran the load, coalesced shared another's, "
+    "timeout gave up waiting", ("kind", "outcome")))
+COMMENT_EVENTS = register(Counter(
+    "forum_comment_events_total", "Comment events published, delivered to subscribers, or dropped for a "
+    "subscriber that fell behind", ("outcome",)))
+DELETED_ROWS = register(Counter(
+    "forum_deleted_rows_total", "Rows purged for deleted posts and comment subtrees", ("table",)))
+DELETION_JOB_FAILURES = register(Counter(
+    "forum_deletion_job_failures_total", "Purge passes over a deletion job that failed and left it for the next pass"))
+
+
+# 单个请求内的耗时累加，由中间件为每个请求创建；后台任务中为 None
+class RequestTimings:
+    __slots__ = ("scope", "queries", "db", "auth", "serialize", "statements", "violation")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db = self.auth = self.serialize = 0.0
+        # 仅在 raise 模式下记录语句与调用位置，超出预算时用于报错
+        self.statements = []
+        self.violation = None
+
+    def server_timing(self, total: float) -> str:
+        return (f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", auth;dur={self.auth * 1000:.1f}, '
+                f"serialize;dur={self.serialize * 1000:.1f}, total;dur={total * 1000:.1f}")
+
+
+request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """Add the block's wall time to the current request's ``auth`` or ``serialize`` phase"""
+    timings = request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timings, phase, getattr(timings, phase) + time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Count statements and time spent in them against the request that issued them"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+        if QUERY_BUDGET_MODE == "raise":
+            timings = request_timings.get()
+            if timings is not None:
+                timings.statements.append((statement, query_budget.call_site()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        timings = request_timings.get()
+        if timings is not None:
+            timings.queries += 1
+            timings.db += elapsed
+            if QUERY_BUDGET_MODE == "raise":
+                error = query_budget.check(timings.scope, timings.queries, timings.statements)
+                if error is not None:
+                    timings.violation = error
+                    raise error
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # 出错的语句不会触发 after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records checkout wait and exposes its capacity"""
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.capacity = pool_size + max_overflow if max_overflow >= 0 else None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def register_pool_metrics(engine):
+    """Gauges read from the engine's pool at scrape time"""
+    def read(value):
+        def collect():
+            # dispose() 会替换连接池对象，每次抓取时重新读取
+            pool = engine.pool
+            return value(pool) if isinstance(pool, TimedQueuePool) else None
+        return collect
+
+    register(Gauge("forum_db_pool_size", "Persistent connections the pool keeps", read(lambda pool: pool.size())))
+    register(Gauge("forum_db_pool_capacity", "Maximum connections including overflow",
+                   read(lambda pool: pool.capacity)))
+    register(Gauge("forum_db_pool_checked_out", "Connections currently in use",
+                   read(lambda pool: pool.checkedout())))
+    register(Gauge("forum_db_pool_saturation", "Checked-out connections over capacity",
+                   read(lambda pool: pool.checkedout() / pool.capacity if pool.capacity else None)))
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, records per-route metrics and adds a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings(scope)
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    header = timings.server_timing(time.perf_counter() - started).encode()
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+            # 服务层可能把超预算异常转成了普通错误响应，这里再次抛出，避免被吞掉
+            if timings.violation is not None:
+                raise timings.violation
+        finally:
+            request_timings.reset(token)
+            # 按路由模板而不是实际路径聚合，避免帖子 id 撑爆标签基数
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, *labels)
+            REQUEST_DB_SECONDS.observe(timings.db, *labels)
+            REQUEST_QUERIES.inc(*labels, amount=timings.queries)
+            REQUESTS.inc(*labels, status_code)
+            if QUERY_BUDGET_MODE != "off" and query_budget.report(scope, timings.queries):
+                BUDGET_EXCEEDED.inc(*labels)
@@ -0,0 +1,58 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, and_, literal, tuple_
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque cursor for the sort key of the last row on a page"""
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, ValueError):
+        raise invalid_cursor
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise invalid_cursor
+
+    try:
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (TypeError, ValueError):
+        raise invalid_cursor
+
+
+def keyset_after(columns: list, values: list, descending: bool = False):
+    """Rows strictly after ``values`` in ``columns`` order"""
+    # 行值比较可直接走联合索引的范围扫描；
+    # 首列上的冗余条件保证不支持行值范围优化的数据库也能从游标处开始扫描
+    values = [literal(value, column.type) for column, value in zip(columns, values)]
+    if descending:
+        return and_(columns[0] <= values[0], tuple_(*columns) < tuple_(*values))
+    return and_(columns[0] >= values[0], tuple_(*columns) > tuple_(*values))
+
+
+def paginate(stmt, columns: list, cursor: str | None, limit: int, descending: bool = False):
+    """Apply keyset ordering to ``stmt``; fetches one extra row to detect a next page"""
+    if cursor:
+        stmt = stmt.filter(keyset_after(columns, decode_cursor(cursor, columns), descending))
+    order_by = [column.desc() if descending else column.asc() for column in columns]
+    return stmt.order_by(*order_by).limit(limit + 1)
+
+
+def page_of(rows: list, columns: list, limit: int) -> tuple[list, str | None]:
+    """Split the ``limit + 1`` rows fetched by :func:`paginate` into a page and next cursor"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], column.key) for column in columns])
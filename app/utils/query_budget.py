@@ -0,0 +1,94 @@
+import logging
+import os
+import random
+import sys
+
+from greenlet import getcurrent
+
+logger = logging.getLogger(__name__)
+
+# 查询预算：raise 在超出时立即抛错并列出全部语句及调用位置（开发 / 测试），
+# log 在请求结束后按采样率记录警告（生产），off 不检查
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log")
+QUERY_BUDGET_LOG_SAMPLE = float(os.getenv("QUERY_BUDGET_LOG_SAMPLE", "0.01"))
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 调用位置跳过的模块：埋点本身
+SKIPPED_FILES = (os.path.join(APP_DIR, "utils", "metrics.py"), os.path.abspath(__file__))
+
+
+class QueryBudgetExceeded(Exception):
+    """A request issued more SQL statements than its route allows"""
+
+
+def query_budget(limit: int):
+    """Declare the most SQL statements one request to the route may execute.
+
+    Place it directly on the endpoint function, below the router decorator.
+    The count covers dependencies (authentication included) on a cold cache.
+    """
+    def decorate(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorate
+
+
+def route_budget(scope: dict) -> int | None:
+    route = scope.get("route")
+    return getattr(getattr(route, "endpoint", None), "query_budget", None)
+
+
+def stack():
+    """Frames from the caller outwards, continuing into the coroutine that awaits SQLAlchemy's greenlet"""
+    frame, current = sys._getframe(2), getcurrent()
+    while True:
+        while frame is not None:
+            yield frame
+            frame = frame.f_back
+        # 异步会话在子 greenlet 中执行语句，调用方的协程帧挂在父 greenlet 上
+        current = current.parent
+        if current is None:
+            return
+        frame = current.gr_frame
+
+
+def call_site() -> str:
+    """The innermost application frames that led to the current statement"""
+    frames = []
+    for frame in stack():
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename not in SKIPPED_FILES:
+            frames.append(f"{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} "
+                          f"in {frame.f_code.co_name}")
+            if len(frames) == 3:
+                break
+    return " <- ".join(frames) or "outside the app"
+
+
+def describe(scope: dict, count: int, budget: int, statements: list) -> str:
+    route = scope.get("route")
+    lines = [f"{scope['method']} {route.path if route else scope['path']} ran {count} SQL statements, "
+             f"budget is {budget}:"]
+    for number, (statement, site) in enumerate(statements, 1):
+        lines.append(f"  {number}. {' '.join(statement.split())[:300]}")
+        lines.append(f"     at {site}")
+    return "\n".join(lines)
+
+
+def check(scope: dict, count: int, statements: list) -> QueryBudgetExceeded | None:
+    """The error to raise once a request goes over its budget (raise mode)"""
+    budget = route_budget(scope)
+    if budget is not None and count == budget + 1:
+        return QueryBudgetExceeded(describe(scope, count, budget, statements))
+    return None
+
+
+def report(scope: dict, count: int) -> bool:
+    """After the request: log a sampled warning when over budget (log mode); True if over"""
+    budget = route_budget(scope)
+    if budget is None or count <= budget:
+        return False
+    if random.random() < QUERY_BUDGET_LOG_SAMPLE:
+        logger.warning("%s %s ran %d SQL statements, budget is %d", scope["method"], scope["route"].path,
+                       count, budget)
+    return True
@@ -1,4 +1,9 @@
+import asyncio
+import contextvars
 import os
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -7,18 +12,41 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import EmailStr, ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import TokenData
+from app.utils.cache import bump_generation, generation, principal_namespace
+from app.utils.metrics import PASSWORD_HASH_SECONDS, timed
 
 # Security configurations
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# 令牌中携带用户 id（uid），鉴权时按主键查询用户
+TOKEN_EMBED_USER_ID = os.getenv("TOKEN_EMBED_USER_ID", "true").lower() == "true"
+# 已验证令牌的用户缓存：有效期需短于令牌有效期。命中时还要比对用户的缓存版本号（见 invalidate_principal），
+# 缓存后端不跨进程共享（memory / none）时，其他进程里的权限变更最长延迟 TTL 才生效
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt 代价；调整后旧哈希在下次登录时自动重新计算
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 密码哈希工作池：线程或进程，排队（含执行中）超过上限时直接返回 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -26,10 +54,76 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify, returning a new hash when the stored one uses outdated parameters"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _timed_call(fn, *args):
+    """Run ``fn`` in the worker and report its own duration, excluding time spent queued"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE,
+                 executor: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor_type = executor
+        self._executor = None
+        self._inflight = 0
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.executor_type == "process" else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.workers)
+        return self._executor
+
+    async def _submit(self, operation: str, fn, *args):
+        # 准入控制：队列已满时快速失败，而不是让请求无限排队
+        if self._inflight >= self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self._inflight += 1
+        try:
+            elapsed, result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _timed_call, fn, *args)
+        finally:
+            self._inflight -= 1
+        PASSWORD_HASH_SECONDS.observe(elapsed, operation)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self._submit("verify", verify_and_update_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -40,16 +134,125 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-        db: Session = Depends(get_db),
+class PrincipalCache:
+    """Bounded LRU of verified tokens to a snapshot of the user's columns and the user's principal version"""
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, ttl: int = PRINCIPAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (user_id, columns, expires_at, version)
+        self._tokens_by_user = defaultdict(set)
+
+    def get(self, token: str) -> tuple[dict, str] | None:
+        """(columns, principal version) cached for ``token``"""
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            self._remove(token)
+            return None
+        self._entries.move_to_end(token)
+        return entry[1], entry[3]
+
+    def put(self, token: str, user: User, token_expires_at: float | None, version: str):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        if token in self._entries:
+            self._remove(token)
+        while len(self._entries) >= self.max_size:
+            self._remove(next(iter(self._entries)))
+        columns = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._entries[token] = (user.id, columns, expires_at, version)
+        self._tokens_by_user[user.id].add(token)
+
+    def invalidate_user(self, user_id: int):
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self._remove(token)
+
+    def _remove(self, token: str):
+        user_id = self._entries.pop(token)[0]
+        tokens = self._tokens_by_user[user_id]
+        tokens.discard(token)
+        if not tokens:
+            del self._tokens_by_user[user_id]
+
+
+principal_cache = PrincipalCache()
+
+
+async def invalidate_principal(user_id: int):
+    """Drop the user's cached principals in this process and, through the cache backend, in every other one.
+
+    ORM updates of is_active or is_admin call it on commit. Writes that bypass
+    the ORM (Core ``update(User)``, bulk updates, scripts) must await it after
+    committing; changes made straight in the database only show once the
+    cached entries expire (PRINCIPAL_CACHE_TTL).
+    """
+    principal_cache.invalidate_user(user_id)
+    await bump_generation(principal_namespace(user_id))
+
+
+@event.listens_for(User, "after_update")
+def collect_changed_principal(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.is_active.history.has_changes() or state.attrs.is_admin.history.has_changes():
+        # 先在本进程内失效；提交后再递增共享的版本号，避免其他进程在提交前重新缓存旧权限
+        principal_cache.invalidate_user(target.id)
+        object_session(target).info.setdefault("changed_principals", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_principals(session):
+    user_ids = session.info.pop("changed_principals", ())
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # 脚本中的同步会话：本进程没有鉴权缓存，其他进程的条目随 TTL 过期
+        return
+    for user_id in user_ids:
+        loop.create_task(invalidate_principal(user_id), context=contextvars.Context())
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_principals(session):
+    session.info.pop("changed_principals", None)
+
+
+async def get_current_user(
+        db: AsyncSession = Depends(get_db),
         token: str = Depends(oauth2_scheme)
 ) -> User:
+    # 计入 Server-Timing 的 auth 阶段（包含查询用户的数据库时间）
+    with timed("auth"):
+        return await resolve_user(db, token)
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return current_user
+
+
+async def resolve_user(db: AsyncSession, token: str) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    # 命中缓存的令牌此前已验证过签名，且缓存条目不会超过令牌的过期时间；
+    # 缓存之后用户权限变更过（版本号不同）则重新查询
+    cached = principal_cache.get(token)
+    if cached is not None:
+        columns, version = cached
+        if version == await generation(principal_namespace(columns["id"])):
+            user = User(**columns)
+            make_transient_to_detached(user)
+            return await db.merge(user, load=False)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -57,10 +260,19 @@ def get_current_user(
             raise credentials_exception
             # 验证 email 格式
         token_data = TokenData(email=email)
-    except JWTError:
+    except (JWTError, ValidationError):
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user_id = payload.get("uid")
+    # 令牌带 uid 时在查询用户之前读取版本号：查询期间发生的变更会使这次缓存的条目在下次命中时失效
+    version = await generation(principal_namespace(user_id)) if user_id is not None else None
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is not None and user.email != token_data.email:
+            user = None
+    else:
+        result = await db.execute(select(User).filter(User.email == token_data.email))
+        user = result.scalars().first()
     if user is None:
         raise credentials_exception
     if not user.is_active:
@@ -68,4 +280,8 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is disabled"
         )
+
+    if version is None:
+        version = await generation(principal_namespace(user.id))
+    principal_cache.put(token, user, payload.get("exp"), version)
     return user
@@ -0,0 +1,16 @@
+from fastapi import Response
+from pydantic import BaseModel
+
+from app.utils.metrics import timed
+
+
+def json_response(value: BaseModel, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Encode ``value`` straight to JSON bytes with its compiled pydantic-core serializer.
+
+    Returning a Response skips FastAPI's response_model pass (dump to dict,
+    re-validate, jsonable_encoder, json.dumps). Keep response_model on the
+    route for the OpenAPI schema.
+    """
+    with timed("serialize"):
+        body = value.__pydantic_serializer__.to_json(value)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,85 @@
+import asyncio
+import copy
+import os
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.utils.metrics import SINGLE_FLIGHT
+
+# 同一键的并发加载合并为一次：其余请求等待并共享结果（或异常）
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# 等待他人加载的上限（秒），超时返回 503，避免慢查询时请求无限堆积
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "5"))
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """At most one in-flight load per key; concurrent callers await it and share its outcome"""
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Future] = {}
+        self._followers: dict[str, int] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, load: Callable[[], Awaitable[T]], timeout: float = SINGLE_FLIGHT_TIMEOUT) -> T:
+        """Return ``load()``'s result, or that of the load already running for ``key``.
+
+        Every caller gets its own deep copy, so a caller may adjust fields of
+        its result in place. The leader's exception is raised in every
+        follower; a follower that waits longer than ``timeout`` gets a 503.
+        """
+        if not SINGLE_FLIGHT_ENABLED:
+            return await load()
+        kind = key.split(":", 1)[0]
+        while (flight := self._flights.get(key)) is not None:
+            self._followers[key] = self._followers.get(key, 0) + 1
+            try:
+                value = await asyncio.wait_for(asyncio.shield(flight), timeout)
+            except asyncio.TimeoutError:
+                SINGLE_FLIGHT.inc(kind, "timeout")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            except asyncio.CancelledError:
+                # 领头请求被取消（如客户端断开）时，由仍在等待的请求重新加载
+                if flight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            except Exception:
+                SINGLE_FLIGHT.inc(kind, "coalesced")
+                raise
+            finally:
+                self._followers[key] -= 1
+                if not self._followers[key]:
+                    del self._followers[key]
+            SINGLE_FLIGHT.inc(kind, "coalesced")
+            return copy.deepcopy(value)
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        SINGLE_FLIGHT.inc(kind, "leader")
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            # 没有等待者时也标记为已读取，避免事件循环记录“异常未被获取”
+            flight.exception()
+            raise
+        else:
+            # 领头请求返回后会就地修改结果，有等待者时交给它们一份未经修改的副本
+            flight.set_result(copy.deepcopy(value) if self._followers.get(key) else value)
+            return value
+        finally:
+            del self._flights[key]
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,143 @@
+# benchmarks/async_db.py
+"""
+Throughput of the async database layer versus the old sync-session path.
+
+Both variants serve ``GET /posts/`` from the same SQLite file through an
+in-process ASGI client. ``--db-latency-ms`` adds a per-statement delay inside
+the thread that executes SQL, emulating the network round trip to MySQL: on
+the sync path that thread is the event loop itself, on the async path it is
+the driver's worker thread.
+
+The sync variant gets a connection pool as large as ``--clients``: with the
+production pool (20 + 10 overflow) and more requests in flight than that, the
+blocked event loop cannot run the teardown that returns connections, and the
+old path stalls until ``pool_timeout``.
+
+    python -m benchmarks.async_db --clients 100 --requests 2000 --db-latency-ms 2
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="forum-bench-"), "forum.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DB_FILE}")
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import Session, joinedload, sessionmaker  # noqa: E402
+
+from app.database import Base, DB_CONFIG, engine, async_engine  # noqa: E402
+from app.main import app as async_app  # noqa: E402
+from app.models.post import Post  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.schemas.post import PostOut  # noqa: E402
+
+
+def build_sync_app(pool_size: int) -> FastAPI:
+    """The pre-async handler: async def calling a blocking Session"""
+    sync_app = FastAPI()
+    sync_engine = create_engine(DB_CONFIG, pool_size=pool_size)
+    install_latency(sync_engine)
+    session_factory = sessionmaker(bind=sync_engine)
+
+    def get_sync_db():
+        db = session_factory()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    @sync_app.get("/posts/", response_model=list[PostOut])
+    async def read_posts(skip: int = 0, limit: int = 10, db: Session = Depends(get_sync_db)):
+        return db.query(Post).options(joinedload(Post.author)).offset(skip).limit(limit).all()
+
+    return sync_app
+
+
+def seed(posts: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+            for i in range(1, 101)
+        ])
+        conn.execute(insert(Post), [
+            {"title": f"post {i}", "content": "content " * 20, "user_id": i % 100 + 1, "view_count": 0}
+            for i in range(posts)
+        ])
+
+
+DB_LATENCY = 0.0
+
+
+def delay(_statement):
+    time.sleep(DB_LATENCY)
+
+
+def install_latency(target):
+    """Sleep in whichever thread executes each SQLite statement"""
+    @event.listens_for(target, "connect")
+    def on_connect(dbapi_connection, _record):
+        if hasattr(dbapi_connection, "await_"):
+            dbapi_connection.await_(dbapi_connection._connection.set_trace_callback(delay))
+        else:
+            dbapi_connection.set_trace_callback(delay)
+
+
+async def run(app: FastAPI, clients: int, total: int, posts: int) -> dict:
+    latencies = []
+    remaining = total
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.get("/posts/", params={"skip": random.randrange(posts - 10), "limit": 10})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    global DB_LATENCY
+    seed(args.posts)
+    DB_LATENCY = args.db_latency_ms / 1000
+    install_latency(async_engine.sync_engine)
+
+    print(f"{args.clients} clients, {args.requests} requests, {args.db_latency_ms} ms per statement")
+    for name, app in (("sync", build_sync_app(args.clients)), ("async", async_app)):
+        result = await run(app, args.clients, args.requests, args.posts)
+        print(f"{name:>5}: {result['throughput']:8.1f} req/s  "
+              f"p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
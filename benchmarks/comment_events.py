@@ -0,0 +1,210 @@
+# benchmarks/comment_events.py
+"""
+Memory and fan-out of comment event streams with many idle subscribers.
+
+Connections are driven straight through the ASGI interface (httpx's
+ASGITransport buffers whole responses, so it cannot hold a stream open), which
+measures what the app keeps per connection without sockets or a server. The
+run:
+
+* opens ``--subscribers`` SSE or WebSocket streams spread over ``--posts`` posts
+  and reports RSS per idle subscriber (``--trace`` breaks it down);
+* creates comments through the API and times until every subscriber of the
+  post has the event;
+* stalls ``--slow`` subscribers so their buffers fill, and checks they are cut
+  off with ``resync`` while the rest keep receiving;
+* with ``--backend fakeredis``, adds a second bus on the same stand-in server,
+  as another process would be, and checks it receives the events too;
+* disconnects everyone and checks no subscription is left behind.
+
+    python -m benchmarks.comment_events --subscribers 10000 --transport sse
+"""
+import argparse
+import asyncio
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+os.environ["SEARCH_INDEX_PATH"] = ""
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# 慢连接在积压这么多事件后被断开
+BUFFER = 8
+os.environ["COMMENT_EVENTS_BUFFER"] = str(BUFFER)
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--subscribers", type=int, default=10000)
+parser.add_argument("--posts", type=int, default=10, help="posts the subscribers are spread over")
+parser.add_argument("--transport", choices=("sse", "ws"), default="sse")
+parser.add_argument("--backend", choices=("local", "fakeredis"), default="local")
+parser.add_argument("--comments", type=int, default=20, help="comments created on the first post")
+parser.add_argument("--slow", type=int, default=100, help="subscribers of the first post that stop reading")
+parser.add_argument("--trace", action="store_true", help="also break memory down by allocation site (slow)")
+ARGS = parser.parse_args()
+os.environ["COMMENT_EVENTS_BACKEND"] = ARGS.backend
+
+import httpx  # noqa: E402
+
+from app.main import app, lifespan  # noqa: E402
+from app.services.comment_events import CommentEvents, RedisBroker, comment_events  # noqa: E402
+from benchmarks.seed import SEED_PASSWORD, seed  # noqa: E402
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+class Connection:
+    """Client side of one stream: records what the app sends; ``stalled`` blocks the app in send()"""
+
+    def __init__(self, transport: str, post_id: int, disconnect: asyncio.Event, stalled: asyncio.Event | None):
+        self.transport = transport
+        self.post_id = post_id
+        self.disconnect = disconnect
+        self.stalled = stalled
+        self.started = False
+        self.events = []
+        self.received_at = []
+        self.connected = False
+
+    def scope(self) -> dict:
+        path = f"/posts/{self.post_id}/comments/" + ("events" if self.transport == "sse" else "ws")
+        scope = {"path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+                 "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+                 "asgi": {"version": "3.0"}, "scheme": "http" if self.transport == "sse" else "ws"}
+        if self.transport == "sse":
+            return {**scope, "type": "http", "http_version": "1.1", "method": "GET"}
+        return {**scope, "type": "websocket", "subprotocols": []}
+
+    async def receive(self):
+        if not self.started:
+            self.started = True
+            return {"type": "http.request", "body": b"", "more_body": False} if self.transport == "sse" \
+                else {"type": "websocket.connect"}
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"} if self.transport == "sse" \
+            else {"type": "websocket.disconnect", "code": 1000}
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind in ("http.response.start", "websocket.accept"):
+            self.connected = message.get("status", 200) == 200
+            return
+        data = message.get("body") or (message.get("text") or "").encode()
+        if not data or data.startswith((b"retry:", b":")):
+            return
+        if self.stalled is not None and self.events:
+            await self.stalled.wait()
+        self.events.append(data.split(b"\n", 1)[0] if self.transport == "sse" else data[:40])
+        self.received_at.append(time.perf_counter())
+
+    def resynced(self) -> bool:
+        return any(b"resync" in event for event in self.events)
+
+
+async def run() -> list[str]:
+    failures = []
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        created = await seed(users=5, posts=ARGS.posts, comments_per_post=2)
+        posts = list(created["posts"])
+        response = await client.post("/login", data={"username": f"user{created['users'][0]}",
+                                                     "password": SEED_PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        other = None
+        if ARGS.backend == "fakeredis":
+            # 与应用共用同一个替身服务器的第二条总线，相当于另一个进程
+            other = CommentEvents(RedisBroker(comment_events.broker.client))
+            await other.start()
+            await asyncio.sleep(0)
+            remote = other.subscribe(posts[0])
+
+        disconnect, stalled = asyncio.Event(), asyncio.Event()
+        first_post = [i for i in range(ARGS.subscribers) if i % len(posts) == 0]
+        slow = set(first_post[:ARGS.slow])
+        connections = [Connection(ARGS.transport, posts[i % len(posts)], disconnect, stalled if i in slow else None)
+                       for i in range(ARGS.subscribers)]
+
+        gc.collect()
+        if ARGS.trace:
+            tracemalloc.start()
+        rss_before = rss_bytes()
+        tasks = [asyncio.create_task(app(c.scope(), c.receive, c.send)) for c in connections]
+        try:
+            while comment_events.count < ARGS.subscribers:
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.2)
+            gc.collect()
+            rss = rss_bytes() - rss_before
+            print(f"{ARGS.subscribers} idle {ARGS.transport} subscribers ({ARGS.backend}): "
+                  f"{rss / ARGS.subscribers / 1024:.1f} KiB RSS each, {rss / 2 ** 20:.1f} MiB in total")
+            if ARGS.trace:
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                traced = sum(stat.size for stat in snapshot.statistics("filename"))
+                print(f"traced: {traced / ARGS.subscribers / 1024:.1f} KiB each; largest sources per subscriber:")
+                for stat in snapshot.statistics("lineno")[:10]:
+                    frame = stat.traceback[0]
+                    print(f"  {stat.size / ARGS.subscribers:7.0f} B  {frame.filename.split('site-packages/')[-1]}:"
+                          f"{frame.lineno}")
+            if not all(c.connected for c in connections):
+                failures.append("not every subscriber was accepted")
+
+            latencies, remote_events = [], 0
+            for i in range(ARGS.comments):
+                started = time.perf_counter()
+                response = await client.post(f"/posts/{posts[0]}/comments", json={"content": f"push {i}"},
+                                             headers=headers)
+                response.raise_for_status()
+                fast = [c for k, c in enumerate(connections) if c.post_id == posts[0] and k not in slow]
+                while sum(len(c.events) > i for c in fast) < len(fast):
+                    await asyncio.sleep(0.001)
+                latencies.append(max(c.received_at[i] for c in fast) - started)
+                if other is not None:
+                    while not isinstance(await remote.next(0.01), str):
+                        remote_events += 1
+            if latencies:
+                latencies.sort()
+                print(f"{ARGS.comments} comments fanned out to {len(first_post)} subscribers of one post: "
+                      f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms "
+                      f"from POST to the last delivery")
+
+            others = [c for c in connections if c.post_id != posts[0]]
+            if any(c.events for c in others):
+                failures.append("subscribers of other posts received events")
+            if ARGS.slow and ARGS.comments > BUFFER:
+                stalled.set()
+                await asyncio.sleep(0.2)
+                cut = sum(connections[k].resynced() for k in slow)
+                print(f"{cut}/{len(slow)} stalled subscribers were cut off with resync after {BUFFER} pending events")
+                if cut != len(slow):
+                    failures.append("stalled subscribers were not cut off")
+            if other is not None:
+                print(f"second bus on the shared server received {remote_events} events")
+                if remote_events != ARGS.comments:
+                    failures.append(f"cross-process fan-out delivered {remote_events}/{ARGS.comments} events")
+                await other.stop()
+
+        finally:
+            disconnect.set()
+            await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 30)
+        print(f"subscriptions left after disconnecting: {comment_events.count}")
+        if comment_events.count:
+            failures.append(f"{comment_events.count} subscriptions leaked")
+    return failures
+
+
+def main():
+    failures = asyncio.run(run())
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
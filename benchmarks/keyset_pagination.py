@@ -0,0 +1,110 @@
+# benchmarks/keyset_pagination.py
+"""
+Page-N latency of keyset pagination versus OFFSET over a large posts table.
+
+Seeds ``--rows`` posts (one million by default) into a SQLite file, then times
+fetching page N of ``GET /posts/`` both ways: the old ``.offset(skip)`` query
+(with the same ORDER BY, for a fair comparison) and ``PostService.list_posts``
+resuming from the cursor of page N - 1.
+
+    python -m benchmarks.keyset_pagination --rows 1000000 --limit 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="forum-bench-"), "forum.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DB_FILE}")
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app.database import Base, engine, async_engine, AsyncSessionFactory  # noqa: E402
+from app.models.comment import Comment  # noqa: E402, F401
+from app.models.post import Post  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.post_service import PostService, POST_ORDER  # noqa: E402
+from app.utils.pagination import encode_cursor  # noqa: E402
+
+CHUNK = 50000
+
+
+def seed(rows: int):
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+            for i in range(1, 1001)
+        ])
+        for offset in range(0, rows, CHUNK):
+            conn.execute(insert(Post), [
+                {"title": f"post {i}", "content": "content", "user_id": i % 1000 + 1, "view_count": 0,
+                 "is_pinned": False, "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + CHUNK, rows))
+            ])
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seed(args.rows)
+    print(f"seeded {args.rows} posts in {time.perf_counter() - started:.1f} s")
+
+    pages = [1, 10, 100, 1000, 10000]
+    pages += [page for page in (args.rows // args.limit // 2, args.rows // args.limit) if page > pages[-1]]
+
+    print(f"{'page':>8} {'offset ms':>10} {'keyset ms':>10}")
+    async with AsyncSessionFactory() as db:
+        service = PostService(db)
+        for page in pages:
+            skip = (page - 1) * args.limit
+            cursor = None
+            if skip:
+                # 上一页最后一行的排序键（不计入耗时）
+                last = (await db.execute(
+                    select(Post.created_at, Post.id)
+                    .order_by(Post.created_at.desc(), Post.id.desc())
+                    .offset(skip - 1).limit(1)
+                )).one()
+                cursor = encode_cursor([getattr(last, column.key) for column in POST_ORDER])
+
+            async def by_offset():
+                result = await db.execute(
+                    select(Post).options(joinedload(Post.author))
+                    .order_by(Post.created_at.desc(), Post.id.desc())
+                    .offset(skip).limit(args.limit)
+                )
+                return result.scalars().all()
+
+            async def by_keyset():
+                return await service.list_posts(cursor, args.limit)
+
+            offset_ms = await timed(by_offset, args.repeat)
+            keyset_ms = await timed(by_keyset, args.repeat)
+            print(f"{page:>8} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+            db.expunge_all()
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+# benchmarks/large_deletes.py
+"""
+Deleting a post with a large comment tree, and a comment with a large reply subtree.
+
+Seeds two posts of about ``--comments`` comments each into a throwaway SQLite
+file and deletes through the API:
+
+* the top-level comment with the most replies: the request time, that the
+  subtree is hidden at once and the post's comment_count already excludes
+  it, then the time until the purger has removed every row;
+* the first post: the request time and that it answers 404 at once, then
+  a restart of the purger part-way through, and the time until the post
+  and its comments are gone.
+
+    python -m benchmarks.large_deletes --comments 100000 --batch-size 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--comments", type=int, default=100000, help="comments per post, on average")
+parser.add_argument("--batch-size", type=int, default=1000, help="DELETION_BATCH_SIZE")
+ARGS = parser.parse_args()
+
+DIRECTORY = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DIRECTORY}/large_deletes.db"
+os.environ["SEARCH_INDEX_PATH"] = ""
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["DELETION_BATCH_SIZE"] = str(ARGS.batch_size)
+os.environ["DELETION_BATCH_PAUSE"] = "0"
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select, update  # noqa: E402
+
+from app.database import AsyncSessionFactory, create_schema  # noqa: E402
+from app.main import app, lifespan  # noqa: E402
+from app.models.comment import Comment, PATH_SEGMENT_LENGTH  # noqa: E402
+from app.models.post import Post  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.deletion_purger import deletion_purger  # noqa: E402
+from app.utils.security import invalidate_principal  # noqa: E402
+from benchmarks.seed import SEED_PASSWORD, seed  # noqa: E402
+
+
+async def scalar(stmt):
+    async with AsyncSessionFactory() as db:
+        return await db.scalar(stmt)
+
+
+async def wait_for_purge(client: httpx.AsyncClient, headers: dict) -> float:
+    started = time.perf_counter()
+    while (await client.get("/admin/deletions", params={"pending": True}, headers=headers)).json()["items"]:
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - started
+
+
+async def run() -> list[str]:
+    failures = []
+    # 先建表再灌数据，避免启动时的搜索索引重建扫描全部评论
+    await create_schema()
+    created = await seed(users=5, posts=2, comments_per_post=ARGS.comments, reply_ratio=0.9, max_depth=32)
+    first_post, second_post = created["posts"][0], created["posts"][-1]
+    admin = f"user{created['users'][0]}"
+    async with AsyncSessionFactory() as db:
+        await db.execute(update(User).where(User.username == admin).values(is_admin=True))
+        await db.commit()
+        admin_id = (await db.execute(select(User.id).filter(User.username == admin))).scalar_one()
+    await invalidate_principal(admin_id)
+
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/login", data={"username": admin, "password": SEED_PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # 回复最多的顶层评论
+        root = func.substr(Comment.path, 1, PATH_SEGMENT_LENGTH)
+        async with AsyncSessionFactory() as db:
+            result = await db.execute(select(root, func.count()).filter(Comment.post_id == second_post)
+                                      .group_by(root).order_by(func.count().desc()).limit(1))
+            root_path, subtree = result.first()
+            root_id = int(root_path, 16)
+            deepest = await db.scalar(select(Comment.id).filter(Comment.path.startswith(root_path))
+                                      .order_by(func.length(Comment.path).desc()).limit(1))
+        before = (await client.get(f"/posts/{second_post}")).json()["comment_count"]
+        comments = await scalar(select(func.count()).select_from(Comment).filter(Comment.post_id == first_post))
+
+        started = time.perf_counter()
+        response = await client.delete(f"/comments/{root_id}", headers=headers)
+        elapsed = time.perf_counter() - started
+        print(f"DELETE comment with {subtree - 1} replies: {response.status_code} in {elapsed * 1000:.0f} ms")
+        after = (await client.get(f"/posts/{second_post}")).json()["comment_count"]
+        if (await client.get(f"/comments/{deepest}")).status_code != 404 or after != before - subtree:
+            failures.append("subtree still visible or comment_count not adjusted right after the delete")
+        print(f"purged in {await wait_for_purge(client, headers):.1f}s")
+        left = await scalar(select(func.count()).select_from(Comment).filter(Comment.path.startswith(root_path)))
+        actual = await scalar(select(func.count()).select_from(Comment).filter(Comment.post_id == second_post))
+        if left or actual != after:
+            failures.append(f"{left} subtree rows left, comment_count {after} but {actual} comments")
+
+        started = time.perf_counter()
+        response = await client.delete(f"/posts/{first_post}", headers=headers)
+        elapsed = time.perf_counter() - started
+        print(f"DELETE post with {comments} comments: {response.status_code} in {elapsed * 1000:.0f} ms")
+        if (await client.get(f"/posts/{first_post}")).status_code != 404:
+            failures.append("post still visible right after the delete")
+
+        # 清除到一半时重启
+        while (await client.get("/admin/deletions", headers=headers)).json()["items"][0]["deleted"] \
+                < comments // 2:
+            await asyncio.sleep(0.01)
+        await deletion_purger.stop()
+        job = (await client.get("/admin/deletions", headers=headers)).json()["items"][0]
+        print(f"purger stopped after {job['deleted']} of {job['total']} comments")
+        deletion_purger.start()
+        seconds = await wait_for_purge(client, headers)
+        job = (await client.get("/admin/deletions", headers=headers)).json()["items"][0]
+        print(f"restarted purger finished in {seconds:.1f}s, {job['deleted']} comments deleted in total")
+        rows = await scalar(select(func.count()).select_from(Comment).filter(Comment.post_id == first_post))
+        if rows or await scalar(select(Post.id).filter(Post.id == first_post)) is not None:
+            failures.append(f"post {first_post} or {rows} of its comments left after the purge")
+        if job["deleted"] != comments:
+            failures.append(f"progress says {job['deleted']} deleted, expected {comments}")
+    return failures
+
+
+def main():
+    failures = asyncio.run(run())
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+# benchmarks/load_test.py
+"""
+Load test of every endpoint through an in-process ASGI client.
+
+The database defaults to an in-memory SQLite stand-in that is seeded with
+``benchmarks.seed`` at the requested scale; point ``DATABASE_URL`` at a file
+or a MySQL instance to test against that instead (``--skip-seed`` reuses data
+seeded earlier). The app runs with its normal lifespan, so caches, the search
+index and the background flushers behave as in production.
+
+Each scenario issues ``--warmup`` untimed requests followed by ``--requests``
+timed ones, keeping ``--concurrency`` in flight. Write scenarios create the
+posts and comments they edit or delete before the clock starts. Reported per
+scenario: latency percentiles, throughput, non-2xx/304 responses, and SQL
+statements per request (counted on the engine; background flushes that land
+inside the window are included).
+
+``--output`` writes the results with the commit, database and scale they were
+measured on; ``--compare`` prints the change against such a file.
+
+    python -m benchmarks.load_test --posts 20000 --concurrency 16 --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SEARCH_INDEX_PATH", "")
+
+import httpx  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+
+from app.database import DATABASE_URL, async_engine, create_schema  # noqa: E402
+from app.main import app, lifespan  # noqa: E402
+from app.models.comment import Comment  # noqa: E402
+from app.models.post import Post  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils.cache import CACHE_BACKEND  # noqa: E402
+from benchmarks.seed import PHRASES, SEED_PASSWORD, WORDS, seed  # noqa: E402
+
+SCENARIOS = {}
+
+
+def scenario(name: str):
+    """Register a builder returning ``n`` ``(method, url, request kwargs)`` calls"""
+    def register(build):
+        SCENARIOS[name] = build
+        return build
+    return register
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random, users: range, posts: range, comments: range):
+        self.client = client
+        self.rng = rng
+        self.users = users
+        self.posts = posts
+        self.comments = comments
+        self.headers = {}
+
+    def post_id(self) -> int:
+        return self.rng.choice(self.posts)
+
+    def comment_id(self) -> int:
+        return self.rng.choice(self.comments)
+
+    def text(self, words: int = 20) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(words))
+
+    async def create_posts(self, n: int) -> list[int]:
+        ids = []
+        for i in range(n):
+            response = await self.client.post("/posts/", json={"title": f"fixture {i}", "content": self.text()},
+                                              headers=self.headers)
+            response.raise_for_status()
+            ids.append(response.json()["id"])
+        return ids
+
+    async def create_comments(self, post_id: int, n: int) -> list[int]:
+        ids = []
+        for start in range(0, n, 100):
+            batch = [{"content": self.text()} for _ in range(min(100, n - start))]
+            response = await self.client.post(f"/posts/{post_id}/comments:batch", json={"comments": batch},
+                                              headers=self.headers)
+            response.raise_for_status()
+            ids.extend(comment["id"] for comment in response.json())
+        return ids
+
+
+@scenario("GET /")
+async def root(ctx, n):
+    return [("GET", "/", {})] * n
+
+
+@scenario("GET /cache/stats")
+async def cache_stats(ctx, n):
+    return [("GET", "/cache/stats", {})] * n
+
+
+@scenario("POST /register")
+async def register(ctx, n):
+    tag = f"{time.time_ns():x}"
+    return [("POST", "/register", {"json": {"username": f"load{tag}{i}", "email": f"load{tag}{i}@example.com",
+                                            "password": SEED_PASSWORD}}) for i in range(n)]
+
+
+@scenario("POST /login")
+async def login(ctx, n):
+    return [("POST", "/login", {"data": {"username": f"user{ctx.rng.choice(ctx.users)}",
+                                         "password": SEED_PASSWORD}}) for _ in range(n)]
+
+
+@scenario("GET /posts/?sort=new")
+async def posts_new(ctx, n):
+    return [("GET", "/posts/", {"params": {"limit": 20}})] * n
+
+
+@scenario("GET /posts/?sort=active")
+async def posts_active(ctx, n):
+    return [("GET", "/posts/", {"params": {"limit": 20, "sort": "active"}})] * n
+
+
+@scenario("GET /posts/?sort=hot")
+async def posts_hot(ctx, n):
+    return [("GET", "/posts/", {"params": {"limit": 20, "sort": "hot"}})] * n
+
+
+@scenario("GET /posts/?cursor=")
+async def posts_deep_page(ctx, n):
+    # 向后翻若干页，验证游标分页的开销不随页深增长
+    response = await ctx.client.get("/posts/", params={"limit": 100})
+    cursors = []
+    for _ in range(10):
+        cursor = response.json()["next_cursor"]
+        if not cursor:
+            break
+        cursors.append(cursor)
+        response = await ctx.client.get("/posts/", params={"limit": 100, "cursor": cursor})
+    return [("GET", "/posts/", {"params": {"limit": 20, "cursor": ctx.rng.choice(cursors)}}) for _ in range(n)] \
+        if cursors else await posts_new(ctx, n)
+
+
+@scenario("GET /posts/batch")
+async def posts_batch(ctx, n):
+    return [("GET", "/posts/batch", {"params": {"ids": ",".join(str(ctx.post_id()) for _ in range(20))}})
+            for _ in range(n)]
+
+
+@scenario("GET /posts/{post_id}")
+async def read_post(ctx, n):
+    return [("GET", f"/posts/{ctx.post_id()}", {}) for _ in range(n)]
+
+
+@scenario("GET /posts/{post_id} (hot)")
+async def read_hot_post(ctx, n):
+    # 所有请求读同一帖子，如帖子上了首页；缓存未命中时由 single-flight 合并加载
+    post_id = ctx.post_id()
+    return [("GET", f"/posts/{post_id}", {}) for _ in range(n)]
+
+
+@scenario("GET /posts/{post_id} (304)")
+async def read_post_conditional(ctx, n):
+    etags = {}
+    for post_id in {ctx.post_id() for _ in range(50)}:
+        etags[post_id] = (await ctx.client.get(f"/posts/{post_id}")).headers["ETag"]
+    ids = list(etags)
+    return [("GET", f"/posts/{post_id}", {"headers": {"If-None-Match": etags[post_id]}})
+            for post_id in (ctx.rng.choice(ids) for _ in range(n))]
+
+
+@scenario("POST /posts/")
+async def create_post(ctx, n):
+    return [("POST", "/posts/", {"json": {"title": f"load {i}", "content": ctx.text(60)}, "headers": ctx.headers})
+            for i in range(n)]
+
+
+@scenario("PUT /posts/{post_id}")
+async def update_post(ctx, n):
+    ids = await ctx.create_posts(10)
+    return [("PUT", f"/posts/{ctx.rng.choice(ids)}",
+             {"json": {"title": f"edit {i}", "content": ctx.text(60)}, "headers": ctx.headers}) for i in range(n)]
+
+
+@scenario("DELETE /posts/{post_id}")
+async def delete_post(ctx, n):
+    return [("DELETE", f"/posts/{post_id}", {"headers": ctx.headers}) for post_id in await ctx.create_posts(n)]
+
+
+@scenario("GET /posts/{post_id}/comments")
+async def read_comments(ctx, n):
+    return [("GET", f"/posts/{ctx.post_id()}/comments", {"params": {"limit": 50}}) for _ in range(n)]
+
+
+@scenario("GET /posts/{post_id}/comments (hot)")
+async def read_hot_comments(ctx, n):
+    post_id = ctx.post_id()
+    return [("GET", f"/posts/{post_id}/comments", {"params": {"limit": 50}}) for _ in range(n)]
+
+
+@scenario("GET /posts/{post_id}/thread")
+async def read_thread(ctx, n):
+    return [("GET", f"/posts/{ctx.post_id()}/thread", {}) for _ in range(n)]
+
+
+@scenario("GET /comments/{comment_id}/thread")
+async def read_comment_thread(ctx, n):
+    return [("GET", f"/comments/{ctx.comment_id()}/thread", {}) for _ in range(n)]
+
+
+@scenario("GET /comments/{comment_id}")
+async def read_comment(ctx, n):
+    return [("GET", f"/comments/{ctx.comment_id()}", {}) for _ in range(n)]
+
+
+@scenario("POST /posts/{post_id}/comments")
+async def create_comment(ctx, n):
+    return [("POST", f"/posts/{ctx.post_id()}/comments", {"json": {"content": ctx.text()}, "headers": ctx.headers})
+            for _ in range(n)]
+
+
+@scenario("POST /posts/{post_id}/comments (reply)")
+async def create_reply(ctx, n):
+    parents = []
+    for _ in range(10):
+        post_id = ctx.post_id()
+        parents.append((post_id, (await ctx.create_comments(post_id, 1))[0]))
+    return [("POST", f"/posts/{post_id}/comments",
+             {"json": {"content": ctx.text(), "parent_id": parent_id}, "headers": ctx.headers})
+            for post_id, parent_id in (ctx.rng.choice(parents) for _ in range(n))]
+
+
+@scenario("POST /posts/{post_id}/comments:batch")
+async def create_comments(ctx, n):
+    return [("POST", f"/posts/{ctx.post_id()}/comments:batch",
+             {"json": {"comments": [{"content": ctx.text()} for _ in range(10)]}, "headers": ctx.headers})
+            for _ in range(n)]
+
+
+@scenario("PUT /comments/{comment_id}")
+async def update_comment(ctx, n):
+    ids = await ctx.create_comments(ctx.post_id(), 10)
+    return [("PUT", f"/comments/{ctx.rng.choice(ids)}", {"json": {"content": ctx.text()}, "headers": ctx.headers})
+            for _ in range(n)]
+
+
+@scenario("DELETE /comments/{comment_id}")
+async def delete_comment(ctx, n):
+    ids = await ctx.create_comments(ctx.post_id(), n)
+    return [("DELETE", f"/comments/{comment_id}", {"headers": ctx.headers}) for comment_id in ids]
+
+
+@scenario("GET /search")
+async def search(ctx, n):
+    terms = WORDS + list(PHRASES)
+    return [("GET", "/search", {"params": {"q": " ".join(ctx.rng.sample(terms, 2))}}) for _ in range(n)]
+
+
+@scenario("GET /users/{user_id}")
+async def read_user(ctx, n):
+    return [("GET", f"/users/{ctx.rng.choice(ctx.users)}", {"params": {"limit": 10}}) for _ in range(n)]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+async def drive(client: httpx.AsyncClient, calls: list, concurrency: int):
+    """Issue the calls keeping ``concurrency`` in flight; returns latencies, status counts and wall time"""
+    latencies, statuses = [], Counter()
+    pending = iter(calls)
+
+    async def worker():
+        for method, url, kwargs in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float, queries: int) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if not (200 <= status < 300 or status == 304)),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000, "p99_ms": cuts[98] * 1000,
+        "max_ms": max(latencies) * 1000,
+        "throughput_rps": len(latencies) / elapsed,
+        "queries_per_request": queries / len(latencies),
+    }
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            result = subprocess.run(["git", *args], capture_output=True, text=True, timeout=10,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+        except OSError:
+            return None
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+async def table_sizes() -> dict:
+    async with async_engine.connect() as conn:
+        return {model.__tablename__: await conn.scalar(select(func.count()).select_from(model))
+                for model in (User, Post, Comment)}
+
+
+async def id_range(model) -> range:
+    async with async_engine.connect() as conn:
+        low, high = (await conn.execute(select(func.min(model.id), func.max(model.id)))).one()
+    return range(low, high + 1) if low is not None else range(0)
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    selected = [name for name in SCENARIOS
+                if not args.only or any(part.strip() in name for part in args.only.split(","))]
+
+    await create_schema()
+    if not args.skip_seed:
+        await seed(args.users, args.posts, args.comments_per_post, args.max_depth, seed=args.seed)
+    users, posts, comments = await id_range(User), await id_range(Post), await id_range(Comment)
+    if not posts or not comments:
+        raise SystemExit("the database has no posts or comments; drop --skip-seed")
+
+    queries = QueryCounter(async_engine.sync_engine)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    results = {}
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        ctx = Context(client, rng, users, posts, comments)
+        response = await client.post("/login", data={"username": f"user{users[0]}", "password": SEED_PASSWORD})
+        response.raise_for_status()
+        ctx.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        scale = await table_sizes()
+
+        for name in selected:
+            calls = await SCENARIOS[name](ctx, args.warmup + args.requests)
+            await drive(client, calls[:args.warmup], args.concurrency)
+            before = queries.count
+            latencies, statuses, elapsed = await drive(client, calls[args.warmup:], args.concurrency)
+            results[name] = summarize(latencies, statuses, elapsed, queries.count - before)
+            print_result(name, results[name])
+
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "database": make_url(DATABASE_URL).render_as_string(hide_password=True),
+            "cache_backend": CACHE_BACKEND,
+            "python": platform.python_version(),
+            "concurrency": args.concurrency, "requests": args.requests, "warmup": args.warmup, "seed": args.seed,
+            "scale": scale,
+        },
+        "results": results,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(f"{name:<40} p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms  "
+          f"{result['throughput_rps']:8.1f} req/s  {result['queries_per_request']:5.1f} q/req  "
+          f"{result['errors']} errors")
+
+
+def print_comparison(baseline: dict, current: dict):
+    print(f"\nchange against {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta'].get('timestamp')})")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        deltas = [
+            f"{metric.split('_')[0]} {(result[metric] / before[metric] - 1) * 100:+6.1f}%" if before[metric] else
+            f"{metric.split('_')[0]}    n/a"
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+        ]
+        queries = result["queries_per_request"] - before["queries_per_request"]
+        print(f"{name:<40} " + "  ".join(deltas) + f"  q/req {queries:+5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--comments-per-post", type=int, default=10)
+    parser.add_argument("--max-depth", type=int, default=16)
+    parser.add_argument("--skip-seed", action="store_true", help="use the data already in DATABASE_URL")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="comma-separated substrings of scenario names to run")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
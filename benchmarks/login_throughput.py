@@ -0,0 +1,123 @@
+# benchmarks/login_throughput.py
+"""
+Login throughput with bcrypt on the event loop versus on the worker pool.
+
+Every client logs in repeatedly with a valid password while a probe measures
+how long ``GET /`` waits for the event loop. With ``inline`` hashing each
+login stalls the loop for a full bcrypt round; with the pool the loop stays
+responsive and throughput scales with the worker count up to the number of
+cores (bcrypt releases the GIL, so threads are enough).
+
+    python -m benchmarks.login_throughput --clients 50 --requests 200 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="forum-bench-"), "forum.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DB_FILE}")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import Base, engine, async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils.security import get_password_hash, password_hasher  # noqa: E402
+
+PASSWORD = "password123"
+
+
+def seed(users: int):
+    Base.metadata.create_all(bind=engine)
+    password_hash = get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": password_hash}
+            for i in range(users)
+        ])
+
+
+def configure(workers: int | None, queue_size: int):
+    """``workers=None`` runs bcrypt inline on the event loop, as before the pool existed"""
+    password_hasher.shutdown()
+    password_hasher.queue_size = queue_size
+    if workers is None:
+        async def inline(fn, *args):
+            return fn(*args)
+        password_hasher._submit = inline
+    else:
+        password_hasher.__dict__.pop("_submit", None)
+        password_hasher.workers = workers
+
+
+async def run(clients: int, total: int, users: int) -> dict:
+    latencies, loop_lags = [], []
+    rejected = 0
+    remaining = total
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(n: int):
+            nonlocal remaining, rejected
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.post("/login", data={"username": f"user{n % users}", "password": PASSWORD})
+                if response.status_code == 503:
+                    rejected += 1
+                    continue
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                loop_lags.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "probe_ms": statistics.median(loop_lags) * 1000,
+        "rejected": rejected,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--queue-size", type=int, default=1000,
+                        help="admission limit; lower it to see fast 503s instead of queueing")
+    args = parser.parse_args()
+
+    seed(args.users)
+    print(f"{args.clients} clients, {args.requests} logins, {os.cpu_count()} cores")
+    for workers in [None, *sorted(set(args.workers))]:
+        configure(workers, args.queue_size)
+        result = await run(args.clients, args.requests, args.users)
+        name = "inline" if workers is None else f"{workers} workers"
+        print(f"{name:>10}: {result['throughput']:6.1f} logins/s  p99 {result['p99_ms']:8.1f} ms  "
+              f"GET / p50 {result['probe_ms']:7.1f} ms  rejected {result['rejected']}")
+
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+# benchmarks/read_replicas.py
+"""
+Read/write splitting against local SQLite stand-ins.
+
+The primary is a SQLite file. ``replica0`` opens the same file (a replica
+with no lag), ``replica1`` a copy taken right after seeding (a replica that
+stopped replicating), and ``replica2`` a path that cannot be opened (a replica
+that is down). The run checks that:
+
+* reads spread over the healthy replicas and the broken one is never used;
+* a user who just wrote reads from the primary and sees the write, while
+  anonymous readers may still be served the stale copy;
+* after the stickiness window the writer is back on the replicas.
+
+    python -m benchmarks.read_replicas --requests 2000 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+DATA_DIR = tempfile.mkdtemp(prefix="forum-replicas-")
+PRIMARY, LAGGING = os.path.join(DATA_DIR, "primary.db"), os.path.join(DATA_DIR, "lagging.db")
+STICKY_SECONDS = 1.0
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{PRIMARY}"
+os.environ["DATABASE_REPLICA_URLS"] = ",".join([
+    f"sqlite+aiosqlite:///{PRIMARY}",
+    f"sqlite+aiosqlite:///{LAGGING}",
+    f"sqlite+aiosqlite:///{os.path.join(DATA_DIR, 'missing', 'down.db')}",
+])
+os.environ["REPLICA_STICKY_SECONDS"] = str(STICKY_SECONDS)
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["SEARCH_INDEX_PATH"] = ""
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx  # noqa: E402
+
+from app.database import READ_SESSIONS, async_engine, create_schema, replica_router  # noqa: E402
+from app.main import app, lifespan  # noqa: E402
+from benchmarks.seed import SEED_PASSWORD, seed  # noqa: E402
+
+
+def read_sessions() -> Counter:
+    return Counter({name: READ_SESSIONS.value(name) for name in ("primary", "replica0", "replica1", "replica2")})
+
+
+async def run(args) -> list[str]:
+    failures = []
+    await create_schema()
+    created = await seed(users=20, posts=200, comments_per_post=5)
+    await async_engine.dispose()
+    shutil.copyfile(PRIMARY, LAGGING)
+
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://replicas") as client:
+        health = {replica.name: replica.healthy for replica in replica_router.replicas}
+        print(f"health after startup: {health}")
+        if health != {"replica0": True, "replica1": True, "replica2": False}:
+            failures.append(f"unexpected replica health {health}")
+
+        before = read_sessions()
+        pending = iter(range(args.requests))
+
+        async def reader():
+            for i in pending:
+                response = await client.get(f"/posts/{created['posts'][i % len(created['posts'])]}")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(reader() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        spread = read_sessions() - before
+        print(f"{args.requests} reads in {elapsed:.2f}s, sessions per engine: {dict(spread)}")
+        if spread["replica2"] or spread["primary"] or not (spread["replica0"] and spread["replica1"]):
+            failures.append(f"reads were not spread over the healthy replicas: {dict(spread)}")
+
+        response = await client.post("/login", data={"username": f"user{created['users'][0]}",
+                                                     "password": SEED_PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        response = await client.post("/posts/", json={"title": "fresh", "content": "written to the primary"},
+                                     headers=headers)
+        post_id = response.json()["id"]
+
+        own = [(await client.get(f"/posts/{post_id}", headers=headers)).status_code for _ in range(20)]
+        anonymous = Counter([(await client.get(f"/posts/{post_id}")).status_code for _ in range(20)])
+        print(f"writer reading its new post: {Counter(own)}; anonymous readers: {dict(anonymous)}")
+        if set(own) != {200}:
+            failures.append(f"the writer did not read its own write: {Counter(own)}")
+        if not anonymous[404]:
+            failures.append("no anonymous read reached the lagging replica")
+
+        await asyncio.sleep(STICKY_SECONDS)
+        before = read_sessions()
+        for _ in range(20):
+            await client.get(f"/posts/{post_id}", headers=headers)
+        after_window = read_sessions() - before
+        print(f"writer after the {STICKY_SECONDS}s window: {dict(after_window)}")
+        if after_window["primary"]:
+            failures.append("the writer still reads from the primary after the window")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    try:
+        failures = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
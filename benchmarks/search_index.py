@@ -0,0 +1,82 @@
+# benchmarks/search_index.py
+"""
+Query latency and memory of the in-process search index.
+
+Documents are synthetic Chinese text: characters drawn from a Zipf-like
+distribution over the 3500 most common code points (approximated by the
+start of the CJK block), mixed with a few ASCII words. Queries are two to
+four character phrases cut from random documents, so they hit both common
+and rare bigrams. Memory is measured with ``SearchIndex.memory_usage`` and
+scaled linearly to one million documents, an upper bound since the
+vocabulary grows more slowly than the document count.
+
+    python -m benchmarks.search_index --docs 200000 --queries 500
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='forum-bench-')}/forum.db")
+
+from app.services.search_index import SearchIndex  # noqa: E402
+
+VOCABULARY = [chr(0x4E00 + i) for i in range(3500)]
+WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+WORDS = ["python", "mysql", "fastapi", "redis", "docker", "linux", "async", "index"]
+
+
+def make_document(rng: random.Random, length: int) -> str:
+    chars = rng.choices(VOCABULARY, cum_weights=WEIGHTS, k=length)
+    for _ in range(length // 40):
+        chars.insert(rng.randrange(len(chars)), f" {rng.choice(WORDS)} ")
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200000)
+    parser.add_argument("--length", type=int, default=80, help="characters per document")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = SearchIndex()
+    samples = []
+    started = time.perf_counter()
+    for doc_id in range(1, args.docs + 1):
+        text = make_document(rng, args.length)
+        if doc_id % 3:
+            index.index_post(doc_id, text[:10], text)
+        else:
+            index.index_comment(doc_id, doc_id - 1, text)
+        if len(samples) < args.queries and rng.random() < args.queries * 2 / args.docs:
+            start = rng.randrange(args.length - 4)
+            samples.append(text[start:start + rng.randint(2, 4)])
+    build = time.perf_counter() - started
+
+    memory = index.memory_usage()
+    stats = index.stats()
+    print(f"{stats['documents']} documents, {stats['terms']} terms, built in {build:.1f}s "
+          f"({stats['documents'] / build:.0f} docs/s)")
+    print(f"memory: {memory / 2 ** 20:.1f} MiB, {memory / stats['documents']:.0f} B/doc, "
+          f"~{memory / stats['documents'] * 1e6 / 2 ** 30:.2f} GiB per million documents")
+
+    latencies, totals = [], []
+    for query in samples:
+        started = time.perf_counter()
+        total, _ = index.search(query, limit=20)
+        latencies.append(time.perf_counter() - started)
+        totals.append(total)
+    latencies.sort()
+    print(f"{len(samples)} queries: p50 {statistics.median(latencies) * 1000:.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms  "
+          f"median matches {statistics.median(totals):.0f}")
+
+
+if __name__ == "__main__":
+    main()
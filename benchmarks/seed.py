@@ -0,0 +1,166 @@
+# benchmarks/seed.py
+"""
+Synthetic forum data at a configurable scale: users, posts and comment trees.
+
+Rows are bulk inserted through Core with explicit ids continuing after the
+current maximum, so seeding an existing database only appends. Comment paths,
+``comment_count``, ``last_activity_at``, ``hot_score`` and the rendered HTML
+are computed here, the way the services would have left them. A comment
+replies to an earlier comment of the same post with probability
+``--reply-ratio``, preferring the newest one, which grows long reply chains up
+to ``--max-depth``.
+
+Every seeded user's password is ``SEED_PASSWORD``; the bcrypt hash is
+computed once and shared. The same ``--seed`` yields the same data.
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.seed \\
+        --users 10000 --posts 100000 --comments-per-post 20 --max-depth 32
+
+An in-memory database only lives as long as the process; ``benchmarks.load_test``
+seeds it itself.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+from app.database import async_engine, create_schema
+from app.models import deletion_job, user as user_model, user_stats  # noqa: F401  注册全部映射类，建表时需要
+from app.models.comment import Comment, MAX_COMMENT_DEPTH, path_segment
+from app.models.post import Post
+from app.models.user import User
+from app.services.post_activity import hot_score
+from app.utils.markdown import rendered_columns
+from app.utils.security import get_password_hash
+
+SEED_PASSWORD = "password123"
+BATCH_SIZE = 5000
+
+WORDS = (
+    "python fastapi async database index cache query latency thread forum reply post "
+    "design review release deploy server client token search ranking memory profile"
+).split()
+PHRASES = ("数据库", "性能优化", "缓存失效", "全文检索", "异步请求", "评论回复", "热门帖子", "连接池")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(PHRASES) if rng.random() < 0.2 else rng.choice(WORDS) for _ in range(words))
+
+
+async def next_id(model) -> int:
+    async with async_engine.connect() as conn:
+        return (await conn.scalar(select(func.max(model.id))) or 0) + 1
+
+
+async def insert_rows(table, rows: list[dict]):
+    for start in range(0, len(rows), BATCH_SIZE):
+        async with async_engine.begin() as conn:
+            await conn.execute(insert(table), rows[start:start + BATCH_SIZE])
+
+
+def comment_tree(rng: random.Random, post: dict, first_id: int, count: int, user_ids: range,
+                 max_depth: int, reply_ratio: float, now: datetime) -> list[dict]:
+    """Comments of one post in creation order, with materialized paths"""
+    comments, parents, depths = [], [], []
+    created_at = post["created_at"]
+    for comment_id in range(first_id, first_id + count):
+        parent = None
+        if comments and rng.random() < reply_ratio:
+            # 偏向回复最新一条评论，形成较深的回复链；到达深度上限时改为回复其上级
+            parent = len(comments) - 1 if rng.random() < 0.5 else rng.randrange(len(comments))
+            while depths[parent] >= max_depth:
+                parent = parents[parent]
+        created_at = min(now, created_at + timedelta(seconds=rng.randint(1, 3600)))
+        comments.append({
+            "id": comment_id, "content": sentence(rng, rng.randint(5, 40)), "post_id": post["id"],
+            "user_id": rng.choice(user_ids), "created_at": created_at,
+            "parent_id": None if parent is None else comments[parent]["id"],
+            "path": ("" if parent is None else comments[parent]["path"]) + path_segment(comment_id),
+        })
+        comments[-1].update(rendered_columns(comments[-1]["content"]))
+        parents.append(parent)
+        depths.append(1 if parent is None else depths[parent] + 1)
+    return comments
+
+
+async def seed(users: int, posts: int, comments_per_post: int, max_depth: int = 16, reply_ratio: float = 0.7,
+               days: int = 30, seed: int = 0) -> dict:
+    """Insert the data set and return the id ranges that were created"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    password_hash = get_password_hash(SEED_PASSWORD)
+
+    first_user = await next_id(User)
+    user_ids = range(first_user, first_user + users)
+    await insert_rows(User.__table__, [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": password_hash,
+         "is_active": True, "is_admin": False, "created_at": now - timedelta(days=days)}
+        for i in user_ids
+    ])
+
+    first_post, first_comment = await next_id(Post), await next_id(Comment)
+    comment_id = first_comment
+    post_ids = range(first_post, first_post + posts)
+    for start in range(0, posts, BATCH_SIZE):
+        post_rows, comment_rows = [], []
+        for post_id in post_ids[start:start + BATCH_SIZE]:
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            post = {
+                "id": post_id, "title": sentence(rng, rng.randint(3, 10))[:100],
+                "content": sentence(rng, rng.randint(20, 200)), "user_id": rng.choice(user_ids),
+                "created_at": created_at, "view_count": rng.randint(0, 500), "is_pinned": rng.random() < 0.001,
+                "version": 1,
+            }
+            post.update(rendered_columns(post["content"]))
+            count = rng.randint(0, 2 * comments_per_post)
+            comments = comment_tree(rng, post, comment_id, count, user_ids, max_depth, reply_ratio, now)
+            comment_id += count
+            post.update(comment_count=count, comments_version=count,
+                        last_activity_at=comments[-1]["created_at"] if comments else created_at)
+            post_rows.append(post)
+            comment_rows.extend(comments)
+
+        ages = np.array([(now - post["created_at"]).total_seconds() / 3600 for post in post_rows])
+        scores = hot_score(np.array([post["comment_count"] for post in post_rows], dtype=np.float64),
+                           np.array([post["view_count"] for post in post_rows], dtype=np.float64), ages)
+        for post, score in zip(post_rows, scores.tolist()):
+            post["hot_score"] = score
+        await insert_rows(Post.__table__, post_rows)
+        # 父评论 id 更小且先生成，按生成顺序插入即满足外键
+        await insert_rows(Comment.__table__, comment_rows)
+
+    return {"users": user_ids, "posts": post_ids, "comments": range(first_comment, comment_id)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--comments-per-post", type=int, default=10, help="mean; actual counts are uniform in [0, 2x]")
+    parser.add_argument("--max-depth", type=int, default=16, choices=range(1, MAX_COMMENT_DEPTH + 1),
+                        metavar=f"1..{MAX_COMMENT_DEPTH}")
+    parser.add_argument("--reply-ratio", type=float, default=0.7)
+    parser.add_argument("--days", type=int, default=30, help="spread of post creation times")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await create_schema()
+            started = time.perf_counter()
+            created = await seed(args.users, args.posts, args.comments_per_post, args.max_depth,
+                                 args.reply_ratio, args.days, args.seed)
+            return created, time.perf_counter() - started
+        finally:
+            await async_engine.dispose()
+
+    created, elapsed = asyncio.run(run())
+    print(", ".join(f"{len(ids)} {name}" for name, ids in created.items()) + f" in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
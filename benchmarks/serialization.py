@@ -0,0 +1,184 @@
+# benchmarks/serialization.py
+"""
+Serialization cost of 100-item list pages: the old ORM/response_model path
+versus row tuples encoded with the compiled pydantic-core serializer.
+
+``before`` reproduces the previous pipeline: ORM objects validated with
+``from_attributes`` into the old schemas (author as ``UserBase`` with
+``EmailStr``; comment authors as ``UserOut`` including their posts), then
+FastAPI's response_model pass (dump, re-validate, jsonable_encoder) and
+``json.dumps`` in JSONResponse.
+
+``after`` is the current path: row tuples to dicts, ``model_validate`` into
+the page model, then ``json_response``.
+
+Time is the mean over ``--rounds``; allocations are the tracemalloc peak of
+one round.
+
+    python -m benchmarks.serialization --rounds 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime
+from typing import List, Optional
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='forum-bench-')}/forum.db")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from pydantic import BaseModel, ConfigDict  # noqa: E402
+
+from app.models import comment as comment_model, post as post_model, user as user_model  # noqa: E402
+from app.schemas.comment import CommentPage  # noqa: E402
+from app.schemas.post import PostPage  # noqa: E402
+from app.schemas.user import UserBase  # noqa: E402
+from app.services.comment_service import COMMENT_ROW_COLUMNS, comment_from_row  # noqa: E402
+from app.services.post_service import POST_ROW_COLUMNS, post_from_row  # noqa: E402
+from app.utils.markdown import rendered_columns  # noqa: E402
+from app.utils.serialization import json_response  # noqa: E402
+
+PAGE_SIZE = 100
+AUTHOR_POSTS = 20
+
+
+# 改造前的响应模型
+class LegacyPostOut(BaseModel):
+    title: str
+    content: str
+    id: int
+    user_id: int
+    created_at: datetime
+    updated_at: Optional[datetime]
+    view_count: int
+    author: UserBase
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LegacyPostPage(BaseModel):
+    items: List[LegacyPostOut]
+    next_cursor: Optional[str] = None
+
+
+class LegacyUserOut(UserBase):
+    id: int
+    is_active: bool
+    created_at: datetime
+    posts: Optional[List[LegacyPostOut]] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LegacyCommentOut(BaseModel):
+    content: str
+    id: int
+    user_id: int
+    post_id: int
+    created_at: datetime
+    author: LegacyUserOut
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LegacyCommentPage(BaseModel):
+    items: List[LegacyCommentOut]
+    next_cursor: Optional[str] = None
+
+
+def build_fixtures():
+    now = datetime.now()
+    users = [
+        user_model.User(id=i, username=f"user{i}", email=f"user{i}@example.com", is_active=True, created_at=now)
+        for i in range(10)
+    ]
+    for user in users:
+        user.posts = [
+            post_model.Post(id=user.id * 1000 + n, title=f"post {n}", content="正文 " * 50, user_id=user.id,
+                            created_at=now, view_count=n, author=user, **rendered_columns("正文 " * 50))
+            for n in range(AUTHOR_POSTS)
+        ]
+    posts = [users[i % len(users)].posts[i // len(users)] for i in range(PAGE_SIZE)]
+    comments = [
+        comment_model.Comment(id=i, content="评论内容 " * 20, user_id=users[i % 10].id, post_id=1,
+                              created_at=now, author=users[i % 10], path=f"{i:08x}",
+                              **rendered_columns("评论内容 " * 20))
+        for i in range(PAGE_SIZE)
+    ]
+
+    PostRow = namedtuple("PostRow", [column.key for column in POST_ROW_COLUMNS])
+    CommentRow = namedtuple("CommentRow", [column.key for column in COMMENT_ROW_COLUMNS])
+    post_rows = [
+        PostRow(p.id, p.title, p.content, p.content_html, p.mentions, p.links, p.render_version, p.user_id,
+                p.created_at, None, p.view_count, 0, p.created_at, 0.0, False, p.author.username, p.author.email,
+                True, now)
+        for p in posts
+    ]
+    comment_rows = [
+        CommentRow(c.id, c.content, c.content_html, c.mentions, c.links, c.render_version, c.user_id, c.post_id,
+                   c.created_at, None, c.path, c.author.username, c.author.email, True, now)
+        for c in comments
+    ]
+    return posts, comments, post_rows, comment_rows
+
+
+def legacy(page_model, item_model, objects):
+    field = create_model_field("Response", page_model)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        page = page_model(items=[item_model.model_validate(obj, from_attributes=True) for obj in objects])
+        content = loop.run_until_complete(serialize_response(field=field, response_content=page))
+        return JSONResponse(content).body
+
+    return run
+
+
+def current(page_model, to_dict, rows):
+    def run():
+        page = page_model.model_validate({"items": [to_dict(row) for row in rows], "next_cursor": None})
+        return json_response(page).body
+
+    return run
+
+
+def measure(run, rounds: int) -> dict:
+    run()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = run()
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": elapsed * 1000, "peak_kib": peak / 1024, "bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    posts, comments, post_rows, comment_rows = build_fixtures()
+    cases = [
+        ("posts before", legacy(LegacyPostPage, LegacyPostOut, posts)),
+        ("posts after", current(PostPage, post_from_row, post_rows)),
+        ("comments before", legacy(LegacyCommentPage, LegacyCommentOut, comments)),
+        ("comments after", current(CommentPage, comment_from_row, comment_rows)),
+    ]
+    print(f"{PAGE_SIZE}-item pages, {args.rounds} rounds (comment authors carry {AUTHOR_POSTS} posts before)")
+    for name, run in cases:
+        result = measure(run, args.rounds)
+        print(f"{name:>16}: {result['ms']:7.3f} ms/page  peak {result['peak_kib']:8.1f} KiB  "
+              f"body {result['bytes'] / 1024:7.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
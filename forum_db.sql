@@ -28,10 +28,32 @@ CREATE TABLE `comments`  (
   `user_id` int(0) NOT NULL,
   `created_at` datetime(0) NULL DEFAULT NULL,
   `parent_id` int(0) UNSIGNED NULL DEFAULT NULL COMMENT '父评论ID',
+  `path` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '物化路径',
+  `content_html` text CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL COMMENT '渲染后的正文',
+  `mentions` json NULL COMMENT '正文中的 @提及用户名',
+  `links` json NULL COMMENT '正文中的链接地址',
+  `render_version` int(0) NOT NULL DEFAULT 0,
   PRIMARY KEY (`id`) USING BTREE,
-  INDEX `post_id`(`post_id`) USING BTREE,
   INDEX `user_id`(`user_id`) USING BTREE,
-  INDEX `ix_comments_id`(`id`) USING BTREE
+  INDEX `ix_comments_post_id_created_at_id`(`post_id`, `created_at`, `id`) USING BTREE,
+  INDEX `ix_comments_post_id_path`(`post_id`, `path`) USING BTREE
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for deletion_jobs
+-- ----------------------------
+DROP TABLE IF EXISTS `deletion_jobs`;
+CREATE TABLE `deletion_jobs`  (
+  `id` int(0) NOT NULL AUTO_INCREMENT,
+  `post_id` int(0) NOT NULL,
+  `comment_id` int(0) NULL DEFAULT NULL COMMENT '子树根评论ID，删除整帖时为空',
+  `path` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL,
+  `total` int(0) NOT NULL,
+  `deleted` int(0) NOT NULL DEFAULT 0,
+  `created_at` datetime(0) NULL DEFAULT NULL,
+  `finished_at` datetime(0) NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `ix_deletion_jobs_post_id_finished_at`(`post_id`, `finished_at`) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 -- ----------------------------
@@ -47,11 +69,57 @@ CREATE TABLE `posts`  (
   `updated_at` datetime(0) NULL DEFAULT NULL,
   `view_count` int(0) NULL DEFAULT NULL,
   `is_pinned` tinyint(1) NULL DEFAULT NULL,
+  `comment_count` int(0) NOT NULL DEFAULT 0,
+  `last_activity_at` datetime(0) NULL DEFAULT NULL,
+  `hot_score` double NOT NULL DEFAULT 0,
+  `version` int(0) NOT NULL DEFAULT 1,
+  `comments_version` int(0) NOT NULL DEFAULT 0,
+  `content_html` text CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL COMMENT '渲染后的正文',
+  `mentions` json NULL COMMENT '正文中的 @提及用户名',
+  `links` json NULL COMMENT '正文中的链接地址',
+  `render_version` int(0) NOT NULL DEFAULT 0,
   PRIMARY KEY (`id`) USING BTREE,
-  INDEX `user_id`(`user_id`) USING BTREE,
-  INDEX `ix_posts_id`(`id`) USING BTREE
+  INDEX `ix_posts_created_at_id`(`created_at`, `id`) USING BTREE,
+  INDEX `ix_posts_is_pinned_created_at_id`(`is_pinned`, `created_at`, `id`) USING BTREE,
+  INDEX `ix_posts_last_activity_at_id`(`last_activity_at`, `id`) USING BTREE,
+  INDEX `ix_posts_is_pinned_last_activity_at_id`(`is_pinned`, `last_activity_at`, `id`) USING BTREE,
+  INDEX `ix_posts_hot_score_id`(`hot_score`, `id`) USING BTREE,
+  INDEX `ix_posts_is_pinned_hot_score_id`(`is_pinned`, `hot_score`, `id`) USING BTREE,
+  INDEX `ix_posts_user_id_created_at_id`(`user_id`, `created_at`, `id`) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for schema_migrations
+-- ----------------------------
+DROP TABLE IF EXISTS `schema_migrations`;
+CREATE TABLE `schema_migrations`  (
+  `version` int(0) NOT NULL,
+  `name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL,
+  `applied_at` datetime(0) NOT NULL,
+  PRIMARY KEY (`version`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Records of schema_migrations
+-- ----------------------------
+INSERT INTO `schema_migrations` VALUES (0, 'activity_and_path_columns', '2026-10-18 00:00:00');
+INSERT INTO `schema_migrations` VALUES (1, 'composite_indexes', '2026-10-18 00:00:00');
+INSERT INTO `schema_migrations` VALUES (2, 'drop_redundant_indexes', '2026-10-18 00:00:00');
+INSERT INTO `schema_migrations` VALUES (3, 'rendered_content', '2026-10-18 00:00:00');
+INSERT INTO `schema_migrations` VALUES (4, 'content_mentions_links', '2026-10-18 00:00:00');
+
+-- ----------------------------
+-- Table structure for user_stats
+-- ----------------------------
+DROP TABLE IF EXISTS `user_stats`;
+CREATE TABLE `user_stats`  (
+  `user_id` int(0) NOT NULL,
+  `post_count` int(0) NOT NULL DEFAULT 0,
+  `comment_count` int(0) NOT NULL DEFAULT 0,
+  `view_count` int(0) NOT NULL DEFAULT 0 COMMENT '全部帖子的浏览量之和',
+  PRIMARY KEY (`user_id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for users
 -- ----------------------------
@@ -67,8 +135,7 @@ CREATE TABLE `users`  (
   `last_login` datetime(0) NULL DEFAULT NULL,
   PRIMARY KEY (`id`) USING BTREE,
   UNIQUE INDEX `username`(`username`) USING BTREE,
-  UNIQUE INDEX `ix_users_email`(`email`) USING BTREE,
-  INDEX `ix_users_id`(`id`) USING BTREE
+  UNIQUE INDEX `ix_users_email`(`email`) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 SET FOREIGN_KEY_CHECKS = 1;